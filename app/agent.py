@@ -1,6 +1,14 @@
 import os
-from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor, create_react_agent
+import json
+from typing import Optional, Type
+from pydantic import BaseModel, ValidationError
+from deadlines import DeadlineAwareChatOpenAI
+from hedging import HedgedChatOpenAI
+from langchain.agents import AgentExecutor, AgentOutputParser, create_react_agent
+from langchain.agents.format_scratchpad import format_log_to_str
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.exceptions import OutputParserException
+from langchain_core.runnables import RunnablePassthrough
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_community.chat_message_histories import ChatMessageHistory
@@ -8,6 +16,7 @@ from dotenv import load_dotenv
 from tool import GoogleCalendarCLIWrapper, VectorStoreSitemapTool
 from config_loader import get_config
 from langchain.tools.render import render_text_description
+from qualification_schema import strict_json_schema
 
 load_dotenv()
 
@@ -23,15 +32,93 @@ def get_session_history(session_id: str) -> ChatMessageHistory:
         message_history_store[session_id] = ChatMessageHistory()
     return message_history_store[session_id]
 
+# Action name used by structured agents to signal their final answer
+FINAL_ANSWER_ACTION = "final_answer"
+
+def react_step_response_format(tool_names: list, final_answer_model: Type[BaseModel]) -> dict:
+    """
+    OpenAI `response_format` for one ReAct step as a strict JSON schema:
+    {"thought", "action", "action_input", "final_answer"}, where final_answer follows
+    final_answer_model when action == FINAL_ANSWER_ACTION and is null otherwise.
+    """
+    final_answer_schema = strict_json_schema(final_answer_model)
+    definitions = final_answer_schema.pop("$defs", {})
+    schema = {
+        "type": "object",
+        "properties": {
+            "thought": {"type": "string"},
+            "action": {"type": "string", "enum": list(tool_names) + [FINAL_ANSWER_ACTION]},
+            "action_input": {"type": "string"},
+            "final_answer": {"anyOf": [final_answer_schema, {"type": "null"}]},
+        },
+        "required": ["thought", "action", "action_input", "final_answer"],
+        "additionalProperties": False,
+    }
+    if definitions:
+        schema["$defs"] = definitions
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "agent_step", "strict": True, "schema": schema},
+    }
+
+class StructuredReActOutputParser(AgentOutputParser):
+    """Turns a schema-enforced JSON ReAct step into an AgentAction / AgentFinish."""
+    final_answer_model: Type[BaseModel]
+
+    def parse(self, text: str):
+        try:
+            step = json.loads(text)
+            if step["action"] == FINAL_ANSWER_ACTION:
+                # Validated once here; main.py consumes the typed object directly
+                answer = self.final_answer_model.model_validate(step["final_answer"])
+                return AgentFinish(
+                    return_values={"output": answer.model_dump_json(), "structured_output": answer},
+                    log=text,
+                )
+            return AgentAction(tool=step["action"], tool_input=step["action_input"], log=text)
+        except (json.JSONDecodeError, KeyError, TypeError, ValidationError) as e:
+            # Only reachable on refusals/truncation since the schema is enforced by the model
+            raise OutputParserException(f"Could not parse structured agent step: {e}", llm_output=text)
+
+    @property
+    def _type(self) -> str:
+        return "structured-react"
+
+# Output of an AgentExecutor stopped by max_iterations / max_execution_time (early_stopping_method="force")
+AGENT_STOPPED_OUTPUT = "Agent stopped due to iteration limit or time limit."
+
+def agent_settings(agent_name: str) -> dict:
+    """Per-agent model and limits from config: `<agent>_model`, `<agent>_turn_budget_seconds` and `<agent>_max_iterations`."""
+    return {
+        "model": get_config(f"{agent_name}_model", "gpt-4o"),
+        "turn_budget_seconds": get_config(f"{agent_name}_turn_budget_seconds", None),
+        "max_iterations": get_config(f"{agent_name}_max_iterations", 15),
+    }
+
 # Renamed function and added parameters: system_prompt_template_str, tools_list
-def create_agent_executor_with_history(system_prompt_template_str: str, tools_list: list):
-    """Creates and returns a LangChain agent executor with message history, configured with the provided system prompt and tools."""
+def create_agent_executor_with_history(system_prompt_template_str: str, tools_list: list, response_model: Optional[Type[BaseModel]] = None,
+                                       agent_name: str = "scheduling", model: Optional[str] = None):
+    """
+    Creates and returns a LangChain agent executor with message history, configured with the provided system prompt and tools.
+
+    When response_model is given, every step is generated in the model's JSON-schema structured
+    output mode and the final answer is returned validated as `structured_output`.
+    The executor and its LLM calls are bounded by the agent's settings (see agent_settings).
+    `model` overrides the agent's configured model (the small model of a cascade, see model_cascade);
+    such executors also request token logprobs, from which the cascade judges its confidence.
+    """
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key or api_key == "YOUR_OPENAI_API_KEY_HERE":
         raise ValueError("OPENAI_API_KEY not found or not set in .env file.")
 
     # Initialize the LLM
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.2, openai_api_key=api_key)
+    # stream_usage: token counts are reported on streamed calls too (used by tracing)
+    # Deadline-aware: each request's timeout is capped by what is left of the turn budget
+    # Hedged (optional): a request slower than the recent latency percentile gets a duplicate
+    settings = agent_settings(agent_name)
+    llm_class = HedgedChatOpenAI if get_config("llm_hedging_enabled", False) else DeadlineAwareChatOpenAI
+    llm = llm_class(model=model or settings["model"], temperature=0.2, openai_api_key=api_key, stream_usage=True,
+                    logprobs=True if model else None)
 
     # --- Tools are now passed in via tools_list parameter ---
     # tools_list = [
@@ -46,7 +133,8 @@ def create_agent_executor_with_history(system_prompt_template_str: str, tools_li
     prompt = ChatPromptTemplate.from_messages([
         ("system", system_prompt_template_str),
         MessagesPlaceholder(variable_name="chat_history"),
-        ("human", "{input}"),
+        # turn_context: notes for this turn only (e.g. prefetched calendar events); unlike input, not kept in history
+        ("human", "{input}{turn_context}"),
         ("ai", "{agent_scratchpad}")
     ])
 
@@ -55,17 +143,32 @@ def create_agent_executor_with_history(system_prompt_template_str: str, tools_li
     prompt = prompt.partial(
         tools=render_text_description(tools_list),
         tool_names=", ".join([t.name for t in tools_list]),
+        turn_context="",
     )
 
-    # Create the ReAct agent
-    agent = create_react_agent(llm, tools_list, prompt)
+    if response_model is not None:
+        # ReAct loop with schema-enforced JSON steps instead of free-text "Thought/Action" parsing
+        response_format = react_step_response_format([t.name for t in tools_list], response_model)
+        agent = (
+            RunnablePassthrough.assign(agent_scratchpad=lambda x: format_log_to_str(x["intermediate_steps"]))
+            | prompt
+            | llm.bind(response_format=response_format)
+            | StructuredReActOutputParser(final_answer_model=response_model)
+        )
+    else:
+        # Create the ReAct agent
+        agent = create_react_agent(llm, tools_list, prompt)
 
     # Create the agent executor
     base_agent_executor = AgentExecutor(
         agent=agent, 
         tools=tools_list, 
-        verbose=True,
-        handle_parsing_errors=True
+        verbose=get_config("agent_verbose", False), # Step-by-step stdout printing, debugging only
+        handle_parsing_errors=True,
+        max_iterations=settings["max_iterations"],
+        # Backstop between steps; the turn deadline itself also bounds every LLM and tool call
+        max_execution_time=settings["turn_budget_seconds"],
+        early_stopping_method="force",
     )
 
     # Add message history capabilities
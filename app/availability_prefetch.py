@@ -0,0 +1,113 @@
+import json
+import time
+import asyncio
+import logging
+import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from config_loader import get_config
+
+logger = logging.getLogger(__name__)
+
+
+class AvailabilityPrefetcher:
+    """
+    Fetches the calendar events for the next `days` days in the background, per session,
+    so the first scheduling turn does not wait for a cold calendar lookup.
+
+    Results older than `ttl_seconds` are refetched when they are used.
+    """
+
+    def __init__(self, calendar_tool, days: int = 7, ttl_seconds: float = 120, timezone_id: str = "UTC"):
+        self._calendar_tool = calendar_tool
+        self.days = days
+        self.ttl_seconds = ttl_seconds
+        self.timezone_id = timezone_id
+        # session_id -> {"time_min", "time_max", "result", "fetched_at"}
+        self._results = {}
+        # session_id -> in-flight asyncio.Task
+        self._tasks = {}
+
+    def _time_range(self):
+        now = datetime.datetime.now(ZoneInfo(self.timezone_id)).replace(microsecond=0)
+        return now.isoformat(), (now + datetime.timedelta(days=self.days)).isoformat()
+
+    async def _fetch(self, session_id: str) -> Optional[dict]:
+        time_min, time_max = self._time_range()
+        command = json.dumps({
+            "name": "list-events",
+            # Multi-day window: let the MCP server expand recurring series locally instead of
+            # paging through every instance Google would return with singleEvents=true
+            "arguments": {"timeMin": time_min, "timeMax": time_max, "expandRecurring": True}
+        })
+        started = time.monotonic()
+        # The calendar tool talks to the MCP server through blocking pipes; keep it off the event loop
+        result = await asyncio.to_thread(self._calendar_tool._run, command)
+        if not isinstance(result, str) or result.startswith("Error"):
+            logger.warning(f"Availability prefetch failed for session {session_id}: {result}")
+            return None
+        entry = {
+            "time_min": time_min,
+            "time_max": time_max,
+            "result": result,
+            "fetched_at": time.monotonic(),
+        }
+        self._results[session_id] = entry
+        logger.info(f"Prefetched availability for session {session_id} ({self.days} days) in {time.monotonic() - started:.2f}s")
+        return entry
+
+    def start(self, session_id: str):
+        """Schedules a background prefetch for the session (no-op if one is already running)."""
+        task = self._tasks.get(session_id)
+        if task and not task.done():
+            return
+        task = asyncio.create_task(self._fetch(session_id))
+        task.add_done_callback(lambda t, sid=session_id: self._on_task_done(sid, t))
+        self._tasks[session_id] = task
+
+    def _on_task_done(self, session_id: str, task: asyncio.Task):
+        if self._tasks.get(session_id) is task:
+            del self._tasks[session_id]
+        if not task.cancelled() and task.exception():
+            logger.error(f"Availability prefetch task failed for session {session_id}: {task.exception()}")
+
+    async def get_fresh(self, session_id: str) -> Optional[dict]:
+        """
+        Returns the prefetched availability for the session, waiting for an in-flight
+        prefetch and refreshing stale data first. Returns None if nothing could be fetched.
+        """
+        task = self._tasks.get(session_id)
+        if task:
+            try:
+                await task
+            except Exception:
+                pass # Already logged by _on_task_done
+        entry = self._results.get(session_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["fetched_at"] > self.ttl_seconds:
+            logger.info(f"Prefetched availability for session {session_id} is stale, refreshing.")
+            try:
+                entry = await self._fetch(session_id)
+            except Exception as e:
+                logger.error(f"Availability refresh failed for session {session_id}: {e}")
+                entry = None
+        return entry
+
+    def discard(self, session_id: str):
+        task = self._tasks.pop(session_id, None)
+        if task and not task.done():
+            task.cancel()
+        self._results.pop(session_id, None)
+
+
+def create_availability_prefetcher_from_config(calendar_tool) -> Optional[AvailabilityPrefetcher]:
+    if not get_config("availability_prefetch_enabled", False):
+        return None
+    return AvailabilityPrefetcher(
+        calendar_tool,
+        days=get_config("availability_prefetch_days", 7),
+        ttl_seconds=get_config("availability_prefetch_ttl_seconds", 120),
+        timezone_id=get_config("internal_timezone_id", "UTC"),
+    )
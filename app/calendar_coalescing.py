@@ -0,0 +1,193 @@
+import json
+import time
+import asyncio
+import inspect
+import logging
+import datetime
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Read-only MCP tools whose identical concurrent calls can share one backend request
+COALESCED_TOOLS = {"list-events", "search-events"}
+# Tools that change a calendar: they bypass coalescing and invalidate cached reads
+WRITE_TOOLS = {"create-event", "update-event", "delete-event"}
+
+# Prefixes of the calendar tool's error strings; those results are never shared or cached
+_ERROR_PREFIXES = (
+    "Error",
+    "Calendar server finished",
+    "Received non-JSON",
+    "Received unexpected",
+    "An unexpected error",
+)
+
+
+def _normalize_value(key: str, value):
+    if isinstance(value, str):
+        value = value.strip()
+        if key in ("timeMin", "timeMax"):
+            # Same instant written with different offsets/suffixes -> same key
+            try:
+                parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+                if parsed.tzinfo is not None:
+                    return parsed.astimezone(datetime.timezone.utc).isoformat()
+            except ValueError:
+                pass
+        if key == "query":
+            return " ".join(value.lower().split())
+    return value
+
+
+async def _run_backend(execute) -> str:
+    if inspect.iscoroutinefunction(execute):
+        return await execute()
+    return await asyncio.to_thread(execute)
+
+
+def request_key(tool_name: str, tool_args: dict) -> str:
+    """Canonical key of a calendar request: tool name plus normalized, sorted arguments."""
+    normalized = {key: _normalize_value(key, value) for key, value in tool_args.items()}
+    return tool_name + ":" + json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class _FlightAbandoned(Exception):
+    """Set on a flight whose leader stopped for its own reasons; followers retry the call."""
+
+
+def _is_leader_specific(error: BaseException) -> bool:
+    # Cancellation (the leader's turn timed out or was handed off), the leader's own deadline
+    # (DeadlineExceeded is a TimeoutError) or interpreter exits say nothing about the request
+    return isinstance(error, TimeoutError) or not isinstance(error, Exception)
+
+
+def is_shareable_result(result) -> bool:
+    return isinstance(result, str) and not result.startswith(_ERROR_PREFIXES)
+
+
+class CalendarRequestCoalescer:
+    """
+    Single-flight coalescing for read-only calendar calls: identical in-flight requests
+    share one backend call and the result is kept for `result_ttl_seconds`. Writes bypass
+    it and invalidate everything cached or in flight for their calendar.
+
+    Thread-safe, so sync tool calls (worker threads) and async ones share the same flights.
+    A leader that is cancelled or runs out of its own turn budget does not pass that on: its
+    followers retry, one of them leading a new flight.
+    """
+
+    def __init__(self, result_ttl_seconds: float = 5.0, max_entries: int = 256):
+        self.result_ttl_seconds = result_ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._in_flight = {}  # key -> (calendar_id, Future)
+        self._results: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (calendar_id, expires_at, result)
+        self._generations = defaultdict(int)  # calendar_id -> bumped on every write
+        self.backend_calls = 0
+        self.shared_calls = 0
+
+    def _begin(self, tool_name: str, tool_args: dict):
+        """Returns (cached_result, future, is_leader, key, generation)."""
+        key = request_key(tool_name, tool_args)
+        calendar_id = tool_args.get("calendarId")
+        with self._lock:
+            cached = self._results.get(key)
+            if cached and cached[1] > time.monotonic():
+                self._results.move_to_end(key)
+                self.shared_calls += 1
+                return cached[2], None, False, key, None
+            in_flight = self._in_flight.get(key)
+            if in_flight:
+                self.shared_calls += 1
+                return None, in_flight[1], False, key, None
+            future = Future()
+            self._in_flight[key] = (calendar_id, future)
+            self.backend_calls += 1
+            return None, future, True, key, self._generations[calendar_id]
+
+    def _finish(self, key: str, calendar_id: Optional[str], generation: int, future: Future, result=None, error: BaseException = None):
+        with self._lock:
+            if self._in_flight.get(key, (None, None))[1] is future:
+                del self._in_flight[key]
+            # A write that landed while we were reading makes this result unsafe to keep
+            if error is None and is_shareable_result(result) and self._generations[calendar_id] == generation:
+                self._results[key] = (calendar_id, time.monotonic() + self.result_ttl_seconds, result)
+                self._results.move_to_end(key)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        if error is not None:
+            future.set_exception(_FlightAbandoned() if _is_leader_specific(error) else error)
+        else:
+            future.set_result(result)
+
+    def invalidate(self, calendar_id: Optional[str]):
+        with self._lock:
+            self._generations[calendar_id] += 1
+            for key in [k for k, entry in self._results.items() if entry[0] == calendar_id]:
+                del self._results[key]
+            # New readers must not join flights that started before the write
+            for key in [k for k, entry in self._in_flight.items() if entry[0] == calendar_id]:
+                del self._in_flight[key]
+
+    def call(self, tool_name: str, tool_args: dict, execute: Callable[[], str]) -> str:
+        """Runs execute() (a blocking backend call) through the coalescer."""
+        if tool_name in WRITE_TOOLS:
+            try:
+                return execute()
+            finally:
+                self.invalidate(tool_args.get("calendarId"))
+        if tool_name not in COALESCED_TOOLS:
+            return execute()
+
+        while True:
+            cached, future, is_leader, key, generation = self._begin(tool_name, tool_args)
+            if future is None:
+                return cached
+            if is_leader:
+                break
+            try:
+                return future.result()
+            except _FlightAbandoned:
+                continue # Join the next flight, or lead it
+        try:
+            result = execute()
+        except BaseException as e:
+            self._finish(key, tool_args.get("calendarId"), generation, future, error=e)
+            raise
+        self._finish(key, tool_args.get("calendarId"), generation, future, result=result)
+        return result
+
+    async def acall(self, tool_name: str, tool_args: dict, execute: Union[Callable[[], str], Callable[[], Awaitable[str]]]) -> str:
+        """
+        Async variant: the leader awaits execute() (or runs it in a worker thread when it is a
+        blocking function), followers just await its future.
+        """
+        if tool_name in WRITE_TOOLS:
+            try:
+                return await _run_backend(execute)
+            finally:
+                self.invalidate(tool_args.get("calendarId"))
+        if tool_name not in COALESCED_TOOLS:
+            return await _run_backend(execute)
+
+        while True:
+            cached, future, is_leader, key, generation = self._begin(tool_name, tool_args)
+            if future is None:
+                return cached
+            if is_leader:
+                break
+            try:
+                # Shielded: a cancelled follower must not cancel the flight the others wait on
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except _FlightAbandoned:
+                continue # Join the next flight, or lead it
+        try:
+            result = await _run_backend(execute)
+        except BaseException as e:
+            self._finish(key, tool_args.get("calendarId"), generation, future, error=e)
+            raise
+        self._finish(key, tool_args.get("calendarId"), generation, future, result=result)
+        return result
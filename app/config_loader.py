@@ -1,12 +1,59 @@
 import json
 import os
+import copy
+import asyncio
 import logging
 import string # Import string for custom formatter
+import threading
+import contextvars
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, List, Mapping, Optional
 
 logger = logging.getLogger(__name__)
 
 CONFIG = {}
 
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Immutable, compiled view of config.json (templates already formatted). A reload builds a
+    new snapshot and swaps the reference, so a reader never sees a half-updated config.
+    """
+    version: int
+    path: str
+    mtime: Optional[float]
+    values: Mapping[str, Any]
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    # Values that are swapped live on reload (see main.apply_config)
+    @property
+    def qualification_prompt(self) -> str:
+        return self.get("qualification_agent_system_prompt_template", "Error: Qual prompt missing")
+
+    @property
+    def scheduling_prompt(self) -> str:
+        return self.get("scheduling_agent_system_prompt_template", "Error: Sched prompt missing")
+
+    @property
+    def calendar_tool_description(self) -> str:
+        return self.get("calendar_tool_description", "Calendar tool.")
+
+    @property
+    def vector_store_tool_description(self) -> str:
+        return self.get("vector_store_tool_description", "Query a vector store based on website data.")
+
+
+_snapshot: Optional[ConfigSnapshot] = None
+# Compiled config of the tenant being served (see tenants.py); None -> the base snapshot.
+# Set per WebSocket connection / request and inherited by tool calls in worker threads.
+active_tenant_config: contextvars.ContextVar[Optional[Mapping[str, Any]]] = contextvars.ContextVar("active_tenant_config", default=None)
+_subscribers: List[Callable[[ConfigSnapshot], None]] = []
+_reload_lock = threading.Lock()
+
 # Custom Formatter to ignore missing keys
 class SafeFormatter(string.Formatter):
     def get_value(self, key, args, kwargs):
@@ -20,132 +67,172 @@ class SafeFormatter(string.Formatter):
 
 safe_formatter = SafeFormatter()
 
-def load_config():
-    global CONFIG
-    try:
-        config_path = '/usr/src/app/config.json'
-        with open(config_path, 'r', encoding='utf-8') as f:
-            raw_config = json.load(f)
-
-        # Start with raw values
-        CONFIG = raw_config.copy()
-
-        # Format calendar tool description safely
-        if isinstance(raw_config.get('calendar_tool_description_template'), list):
-            desc_template_list = raw_config['calendar_tool_description_template']
-            formatted_desc_list = [
-                safe_formatter.format(line, **raw_config) for line in desc_template_list
-            ]
-            CONFIG['calendar_tool_description'] = "\n".join(formatted_desc_list)
-        else:
-            CONFIG['calendar_tool_description'] = "Error loading calendar tool description."
-            logger.error("calendar_tool_description_template is not a list in config.json")
-
-        # Format qualification agent prompt template safely
-        if isinstance(raw_config.get('qualification_agent_prompt_template'), list):
-            qual_template_list = raw_config['qualification_agent_prompt_template']
-            formatted_qual_list = [
-                safe_formatter.format(line, **raw_config) for line in qual_template_list
-            ]
-            CONFIG['qualification_agent_system_prompt_template_list'] = formatted_qual_list
-            CONFIG['qualification_agent_system_prompt_template'] = "\n".join(formatted_qual_list)
-            logger.info(f"Formatted qualification agent prompt template: {CONFIG['qualification_agent_system_prompt_template'][:100]}...")
-        else:
-            CONFIG['qualification_agent_system_prompt_template_list'] = ["Error loading qualification prompt."]
-            CONFIG['qualification_agent_system_prompt_template'] = "Error loading qualification prompt."
-            logger.error("qualification_agent_prompt_template is not a list or not found in config.json")
-
-        # Format scheduling agent prompt template safely (renamed from agent_prompt_template)
-        if isinstance(raw_config.get('scheduling_agent_prompt_template'), list):
-            sched_template_list = raw_config['scheduling_agent_prompt_template']
-            # Format each line using safe_formatter and the entire raw_config
-            formatted_sched_list = [
-                safe_formatter.format(line, **raw_config) for line in sched_template_list
-            ]
-            # Store the list of formatted strings
-            CONFIG['scheduling_agent_system_prompt_template_list'] = formatted_sched_list
-            # Store the joined formatted string as well
-            CONFIG['scheduling_agent_system_prompt_template'] = "\n".join(formatted_sched_list)
-            logger.info(f"Formatted scheduling agent prompt template: {CONFIG['scheduling_agent_system_prompt_template'][:100]}...")
-        else:
-            # Use a sensible default if the scheduling template is missing
-            default_scheduling_prompt = "You are a helpful assistant designed to schedule meetings."
-            CONFIG['scheduling_agent_system_prompt_template_list'] = [default_scheduling_prompt]
-            CONFIG['scheduling_agent_system_prompt_template'] = default_scheduling_prompt # Fallback
-            logger.error("scheduling_agent_prompt_template is not a list or not found in config.json")
-
-        # Ensure required keys are present (adjust required keys)
-        required_keys = [
-            'initial_message',
-            'calendar_tool_description',
-            'qualification_agent_system_prompt_template',
-            'scheduling_agent_system_prompt_template',
-            'qualification_api_url',
-            'not_qualified_message',
-            'not_qualified_pdf_url',
-            'max_calendar_result_length',
-            'vector_store_tool_description',
-            'vector_store_data_url'
+def config_path() -> str:
+    # CONFIG_PATH lets tooling (e.g. loadtest/run.py) point the app at a derived config
+    return os.getenv('CONFIG_PATH', '/usr/src/app/config.json')
+
+def compile_config(raw_config: dict) -> dict:
+    """Raw config.json -> flat dict with the prompt / tool description templates formatted."""
+    # Start with raw values
+    compiled = copy.deepcopy(raw_config)
+
+    # Format calendar tool description safely
+    if isinstance(raw_config.get('calendar_tool_description_template'), list):
+        desc_template_list = raw_config['calendar_tool_description_template']
+        formatted_desc_list = [
+            safe_formatter.format(line, **raw_config) for line in desc_template_list
         ]
-        for key in required_keys:
-             if key not in CONFIG:
-                  logger.error(f"Missing required key '{key}' in loaded config.")
-                  # Handle missing essential config appropriately
-                  if key == 'qualification_agent_system_prompt_template': CONFIG[key] = "Error loading qualification prompt."
-                  if key == 'scheduling_agent_system_prompt_template': CONFIG[key] = "You are a helpful assistant designed to schedule meetings."
-                  if key == 'calendar_tool_description': CONFIG[key] = "Calendar tool."
-                  # Add handling for other new required keys if necessary
-                  if key == 'vector_store_tool_description': CONFIG[key] = "Vector store tool description missing."
-                  if key == 'vector_store_data_url': CONFIG[key] = ""
+        compiled['calendar_tool_description'] = "\n".join(formatted_desc_list)
+    else:
+        compiled['calendar_tool_description'] = "Error loading calendar tool description."
+        logger.error("calendar_tool_description_template is not a list in config.json")
 
-        logger.info("Configuration loaded successfully.")
+    # Format qualification agent prompt template safely
+    if isinstance(raw_config.get('qualification_agent_prompt_template'), list):
+        qual_template_list = raw_config['qualification_agent_prompt_template']
+        formatted_qual_list = [
+            safe_formatter.format(line, **raw_config) for line in qual_template_list
+        ]
+        compiled['qualification_agent_system_prompt_template_list'] = formatted_qual_list
+        compiled['qualification_agent_system_prompt_template'] = "\n".join(formatted_qual_list)
+        logger.info(f"Formatted qualification agent prompt template: {compiled['qualification_agent_system_prompt_template'][:100]}...")
+    else:
+        compiled['qualification_agent_system_prompt_template_list'] = ["Error loading qualification prompt."]
+        compiled['qualification_agent_system_prompt_template'] = "Error loading qualification prompt."
+        logger.error("qualification_agent_prompt_template is not a list or not found in config.json")
+
+    # Format scheduling agent prompt template safely (renamed from agent_prompt_template)
+    if isinstance(raw_config.get('scheduling_agent_prompt_template'), list):
+        sched_template_list = raw_config['scheduling_agent_prompt_template']
+        # Format each line using safe_formatter and the entire raw_config
+        formatted_sched_list = [
+            safe_formatter.format(line, **raw_config) for line in sched_template_list
+        ]
+        # Store the list of formatted strings
+        compiled['scheduling_agent_system_prompt_template_list'] = formatted_sched_list
+        # Store the joined formatted string as well
+        compiled['scheduling_agent_system_prompt_template'] = "\n".join(formatted_sched_list)
+        logger.info(f"Formatted scheduling agent prompt template: {compiled['scheduling_agent_system_prompt_template'][:100]}...")
+    else:
+        # Use a sensible default if the scheduling template is missing
+        default_scheduling_prompt = "You are a helpful assistant designed to schedule meetings."
+        compiled['scheduling_agent_system_prompt_template_list'] = [default_scheduling_prompt]
+        compiled['scheduling_agent_system_prompt_template'] = default_scheduling_prompt # Fallback
+        logger.error("scheduling_agent_prompt_template is not a list or not found in config.json")
+
+    # Ensure required keys are present (adjust required keys)
+    required_keys = [
+        'initial_message',
+        'calendar_tool_description',
+        'qualification_agent_system_prompt_template',
+        'scheduling_agent_system_prompt_template',
+        'qualification_api_url',
+        'not_qualified_message',
+        'not_qualified_pdf_url',
+        'max_calendar_result_length',
+        'vector_store_tool_description',
+        'vector_store_data_url'
+    ]
+    for key in required_keys:
+         if key not in compiled:
+              logger.error(f"Missing required key '{key}' in loaded config.")
+              # Handle missing essential config appropriately
+              if key == 'qualification_agent_system_prompt_template': compiled[key] = "Error loading qualification prompt."
+              if key == 'scheduling_agent_system_prompt_template': compiled[key] = "You are a helpful assistant designed to schedule meetings."
+              if key == 'calendar_tool_description': compiled[key] = "Calendar tool."
+              # Add handling for other new required keys if necessary
+              if key == 'vector_store_tool_description': compiled[key] = "Vector store tool description missing."
+              if key == 'vector_store_data_url': compiled[key] = ""
+
+    return compiled
+
+
+FALLBACK_CONFIG = {
+    'agent_system_prompt_template': "You are a helpful assistant.",
+    'qualification_agent_system_prompt_template': "Error loading qualification prompt.",
+    'scheduling_agent_system_prompt_template': "You are a helpful assistant designed to schedule meetings.",
+    'calendar_tool_description': "Calendar tool.",
+    'initial_message': "Error loading config.",
+    'qualification_api_url': '',
+    'not_qualified_message': 'Could not qualify.',
+    'not_qualified_pdf_url': '',
+    'vector_store_tool_description': 'Vector store tool description missing.',
+    'vector_store_data_url': ''
+}
+
+def _read_snapshot(path: str, version: int) -> ConfigSnapshot:
+    """Reads and compiles the file; raises OSError / ValueError when it can't be used."""
+    mtime = os.stat(path).st_mtime
+    with open(path, 'r', encoding='utf-8') as f:
+        raw_config = json.load(f)
+    if not isinstance(raw_config, dict):
+        raise ValueError("config.json must contain a JSON object")
+    return ConfigSnapshot(version=version, path=path, mtime=mtime, values=MappingProxyType(compile_config(raw_config)))
 
+def _install(snapshot: ConfigSnapshot):
+    global _snapshot, CONFIG
+    _snapshot = snapshot
+    CONFIG = snapshot.values
+
+def load_config():
+    """Initial load: falls back to safe defaults when the file is missing or broken."""
+    path = config_path()
+    try:
+        snapshot = _read_snapshot(path, version=1)
+        logger.info("Configuration loaded successfully.")
     except FileNotFoundError:
-        logger.error(f"Configuration file not found at {config_path}")
-        CONFIG = {
-            'agent_system_prompt_template': "You are a helpful assistant.",
-            'qualification_agent_system_prompt_template': "Error loading qualification prompt.",
-            'scheduling_agent_system_prompt_template': "You are a helpful assistant designed to schedule meetings.",
-            'calendar_tool_description': "Calendar tool.",
-            'initial_message': "Error loading config.",
-            'qualification_api_url': '',
-            'not_qualified_message': 'Could not qualify.',
-            'not_qualified_pdf_url': '',
-            'vector_store_tool_description': 'Vector store tool description missing.',
-            'vector_store_data_url': ''
-        }
+        logger.error(f"Configuration file not found at {path}")
+        snapshot = ConfigSnapshot(version=1, path=path, mtime=None, values=MappingProxyType(dict(FALLBACK_CONFIG)))
     except json.JSONDecodeError:
-        logger.error(f"Error decoding JSON from {config_path}")
-        CONFIG = {
-            'agent_system_prompt_template': "You are a helpful assistant.",
-            'qualification_agent_system_prompt_template': "Error loading qualification prompt.",
-            'scheduling_agent_system_prompt_template': "You are a helpful assistant designed to schedule meetings.",
-            'calendar_tool_description': "Calendar tool.",
-            'initial_message': "Error loading config.",
-            'qualification_api_url': '',
-            'not_qualified_message': 'Could not qualify.',
-            'not_qualified_pdf_url': '',
-            'vector_store_tool_description': 'Vector store tool description missing.',
-            'vector_store_data_url': ''
-        }
+        logger.error(f"Error decoding JSON from {path}")
+        snapshot = ConfigSnapshot(version=1, path=path, mtime=None, values=MappingProxyType(dict(FALLBACK_CONFIG)))
     except Exception as e:
         logger.exception(f"An unexpected error occurred loading configuration: {e}")
-        CONFIG = {
-            'agent_system_prompt_template': "You are a helpful assistant.",
-            'qualification_agent_system_prompt_template': "Error loading qualification prompt.",
-            'scheduling_agent_system_prompt_template': "You are a helpful assistant designed to schedule meetings.",
-            'calendar_tool_description': "Calendar tool.",
-            'initial_message': "Error loading config.",
-            'qualification_api_url': '',
-            'not_qualified_message': 'Could not qualify.',
-            'not_qualified_pdf_url': '',
-            'vector_store_tool_description': 'Vector store tool description missing.',
-            'vector_store_data_url': ''
-        }
+        snapshot = ConfigSnapshot(version=1, path=path, mtime=None, values=MappingProxyType(dict(FALLBACK_CONFIG)))
+    _install(snapshot)
+
+def current_config() -> ConfigSnapshot:
+    return _snapshot
+
+def subscribe(callback: Callable[[ConfigSnapshot], None]):
+    """Registers a callback run with the new snapshot after every successful reload."""
+    _subscribers.append(callback)
+
+def reload_config(force: bool = False) -> bool:
+    """
+    Re-reads config.json if its mtime changed (or force). A file that fails to parse is
+    ignored and the current snapshot stays active. Returns True when a new snapshot was installed.
+    """
+    with _reload_lock:
+        path = config_path()
+        try:
+            if not force and _snapshot is not None and os.stat(path).st_mtime == _snapshot.mtime:
+                return False
+            snapshot = _read_snapshot(path, version=_snapshot.version + 1 if _snapshot else 1)
+        except (OSError, ValueError) as e: # json.JSONDecodeError is a ValueError
+            logger.error(f"Config reload from {path} failed, keeping version {_snapshot.version if _snapshot else None}: {e}")
+            return False
+        _install(snapshot)
+    logger.info(f"Configuration reloaded from {path} (version {snapshot.version})")
+    for callback in list(_subscribers):
+        try:
+            callback(snapshot)
+        except Exception:
+            logger.exception(f"Config subscriber {getattr(callback, '__name__', callback)} failed")
+    return True
+
+async def watch_config(interval_seconds: float = 2.0):
+    """Polls config.json's mtime; subscribers run on the event loop, between turns."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        reload_config()
 
 # Load config when module is imported
 load_config()
 
-# Function to get config values
+# Function to get config values (the current tenant's, when one is active)
 def get_config(key, default=None):
-    return CONFIG.get(key, default) 
\ No newline at end of file
+    tenant_values = active_tenant_config.get()
+    if tenant_values is not None:
+        return tenant_values.get(key, default)
+    return _snapshot.get(key, default)
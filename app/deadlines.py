@@ -0,0 +1,64 @@
+import time
+import contextvars
+from typing import Optional
+
+from langchain_openai import ChatOpenAI
+
+# Below this, starting another LLM call or external request is pointless: it cannot finish in time
+MIN_CALL_SECONDS = 0.5
+
+
+class DeadlineExceeded(TimeoutError):
+    """The turn's latency budget ran out before the next call could start."""
+
+
+class Deadline:
+    """Absolute end of a chat turn, measured on the monotonic clock."""
+
+    def __init__(self, budget_seconds: float):
+        self.budget_seconds = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() < MIN_CALL_SECONDS
+
+
+# Deadline of the turn being processed; set per turn in main.py and inherited by the agent's
+# LLM calls and tool calls (asyncio tasks and to_thread copy the context)
+current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("current_deadline", default=None)
+
+
+def start_turn_deadline(budget_seconds: Optional[float]) -> Optional[Deadline]:
+    """Installs a new deadline for the current context (None / 0 -> no budget)."""
+    deadline = Deadline(budget_seconds) if budget_seconds else None
+    current_deadline.set(deadline)
+    return deadline
+
+
+def remaining_timeout(default_seconds: float) -> float:
+    """
+    Timeout for one call: the call's own default, capped by what is left of the turn budget.
+    Raises DeadlineExceeded when the budget is already spent.
+    """
+    deadline = current_deadline.get()
+    if deadline is None:
+        return default_seconds
+    if deadline.expired:
+        raise DeadlineExceeded(f"Turn budget of {deadline.budget_seconds}s exhausted")
+    return min(default_seconds, deadline.remaining())
+
+
+class DeadlineAwareChatOpenAI(ChatOpenAI):
+    """ChatOpenAI whose every request times out when the current turn's budget runs out."""
+
+    def _get_request_payload(self, input_, *, stop=None, **kwargs) -> dict:
+        payload = super()._get_request_payload(input_, stop=stop, **kwargs)
+        if current_deadline.get() is not None:
+            # Per-request timeout of the openai client, on top of the client-wide request_timeout
+            payload["timeout"] = remaining_timeout(self.request_timeout if isinstance(self.request_timeout, (int, float)) else 600.0)
+        return payload
+
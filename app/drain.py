@@ -0,0 +1,130 @@
+import os
+import time
+import signal
+import asyncio
+import logging
+import contextvars
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config_loader import get_config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class LiveSession:
+    """
+    One open chat connection. While a turn runs, `pending_message` is its message and `turn_task`
+    the task running it; `turn_wrote` is set once the turn sent a calendar write.
+    """
+    session_id: str
+    websocket: Any
+    pending_message: Optional[str] = None
+    turn_task: Optional[asyncio.Task] = None
+    turn_wrote: bool = False
+    handed_off: bool = False
+    closed: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+# The connection the current turn belongs to (set by the websocket handler, inherited by tool calls)
+current_live_session: contextvars.ContextVar[Optional[LiveSession]] = contextvars.ContextVar("current_live_session", default=None)
+
+
+def note_calendar_write():
+    """Called before a calendar write is sent: the turn is no longer safe to replay elsewhere."""
+    live = current_live_session.get()
+    if live is not None:
+        live.turn_wrote = True
+
+
+class DrainController:
+    """
+    Drain mode for zero-downtime deploys: stop taking new sessions and turns, let in-flight turns
+    finish for up to `timeout_seconds`, then hand every open session off (snapshot + reconnect
+    message) so the client resumes on another worker without redoing LLM work. Turns still running
+    at the deadline are cancelled by the hand-off before the client is told to resend them.
+    """
+
+    def __init__(self, timeout_seconds: float = 25, poll_seconds: float = 0.1):
+        self.timeout_seconds = timeout_seconds
+        self.poll_seconds = poll_seconds
+        self.draining = False
+        self._sessions: Dict[int, LiveSession] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, session_id: str, websocket) -> LiveSession:
+        live = LiveSession(session_id, websocket)
+        self._sessions[id(live)] = live
+        return live
+
+    def unregister(self, live: LiveSession):
+        self._sessions.pop(id(live), None)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(1 for live in self._sessions.values() if live.pending_message is not None and not live.handed_off)
+
+    @property
+    def open_sessions(self) -> int:
+        return len(self._sessions)
+
+    async def _drain(self, hand_off: Callable[[LiveSession], Awaitable[None]]) -> dict:
+        started = time.monotonic()
+        logger.warning(f"Draining: {self.open_sessions} open sessions, {self.in_flight} turns in flight")
+        while self.in_flight and time.monotonic() - started < self.timeout_seconds:
+            await asyncio.sleep(self.poll_seconds)
+        cut_turns = self.in_flight
+        sessions = list(self._sessions.values())
+        results = await asyncio.gather(*(hand_off(live) for live in sessions), return_exceptions=True)
+        for live, result in zip(sessions, results):
+            if isinstance(result, Exception):
+                logger.error(f"Hand-off failed for session {live.session_id}: {result!r}")
+        summary = {
+            "handed_off": len(sessions),
+            "cut_turns": cut_turns, # Cancelled at the deadline; their clients resend the message unless it wrote
+            "seconds": round(time.monotonic() - started, 2),
+        }
+        logger.warning(f"Drain complete: {summary}")
+        return summary
+
+    async def drain(self, hand_off: Callable[[LiveSession], Awaitable[None]]) -> dict:
+        """Starts draining (idempotent: later callers wait for the same drain) and returns its summary."""
+        self.draining = True
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain(hand_off))
+        return await asyncio.shield(self._task)
+
+    def install_sigterm_handler(self, hand_off: Callable[[LiveSession], Awaitable[None]]):
+        """
+        Drains on SIGTERM, then passes the signal on to the previous handler (uvicorn's graceful
+        shutdown), so the process exits only after every session was handed off.
+        """
+        loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGTERM)
+
+        async def drain_then_exit(signum, frame):
+            try:
+                await self.drain(hand_off)
+            finally:
+                if callable(previous):
+                    previous(signum, frame)
+                else:
+                    signal.signal(signal.SIGTERM, previous)
+                    os.kill(os.getpid(), signal.SIGTERM)
+
+        received = []
+
+        def on_sigterm(signum, frame):
+            received.append(signum)
+            if len(received) > 1 and callable(previous):
+                previous(signum, frame) # Repeated SIGTERM: stop waiting for the drain
+                return
+            # Also after a POST /admin/drain (preStop): waits for that drain, then exits
+            loop.call_soon_threadsafe(lambda: asyncio.ensure_future(drain_then_exit(signum, frame)))
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+
+
+def create_drain_controller_from_config() -> DrainController:
+    return DrainController(timeout_seconds=get_config("drain_timeout_seconds", 25))
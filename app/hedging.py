@@ -0,0 +1,168 @@
+import time
+import asyncio
+import logging
+import threading
+import contextlib
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from config_loader import get_config
+from deadlines import DeadlineAwareChatOpenAI, current_deadline
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+llm_requests = registry.counter(
+    "llm_requests_total",
+    "Agent LLM requests by hedging outcome: none (answered before the hedge delay), capped (hedge "
+    "skipped by the rate cap), primary_won / backup_won (a duplicate request was sent).",
+    labels=("model", "hedge"),
+)
+
+
+class HedgingPolicy:
+    """
+    When to send a duplicate LLM request: once the first one has been waiting longer than the
+    `percentile` of recent latencies, and only while hedges stay under `max_rate` of recent calls.
+    """
+
+    def __init__(self, percentile: float = 95, window: int = 200, min_samples: int = 20,
+                 initial_delay: float = 4.0, min_delay: float = 0.5, max_rate: float = 0.1):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_rate = max_rate
+        self._latencies = deque(maxlen=window)
+        self._hedged = deque(maxlen=window)  # one bool per call: was it hedged
+        self._lock = threading.Lock()
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < self.min_samples:
+            return self.initial_delay
+        rank = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+        return max(self.min_delay, latencies[rank])
+
+    def record(self, latency: float, hedged: bool):
+        with self._lock:
+            self._latencies.append(latency)
+            self._hedged.append(hedged)
+
+    def allow_hedge(self) -> bool:
+        with self._lock:
+            return (sum(self._hedged) + 1) / (len(self._hedged) + 1) <= self.max_rate
+
+
+# (model, "stream" | "generate") -> policy; latencies of different models or modes are not comparable
+_policies: Dict[Tuple[str, str], HedgingPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def hedging_policy(model: str, mode: str) -> HedgingPolicy:
+    with _policies_lock:
+        policy = _policies.get((model, mode))
+        if policy is None:
+            policy = _policies[(model, mode)] = HedgingPolicy(
+                percentile=get_config("llm_hedging_percentile", 95),
+                window=get_config("llm_hedging_window", 200),
+                min_samples=get_config("llm_hedging_min_samples", 20),
+                initial_delay=get_config("llm_hedging_initial_delay_seconds", 4.0),
+                min_delay=get_config("llm_hedging_min_delay_seconds", 0.5),
+                max_rate=get_config("llm_hedging_max_rate", 0.1),
+            )
+        return policy
+
+
+async def _first_of(primary: asyncio.Task, backup: asyncio.Task) -> asyncio.Task:
+    """The first task to succeed; a failure only counts once both have finished."""
+    pending = {primary, backup}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception() is None:
+                return task
+    return primary  # Both failed: the primary's error is raised
+
+
+async def hedged_call(model: str, policy: HedgingPolicy, start: Callable[[int], Awaitable[Any]]) -> Tuple[Any, int]:
+    """
+    Awaits start(0); if it is still pending after the policy's delay (and the rate cap allows),
+    also start(1) and take whichever succeeds first. Returns (result, index of the winning attempt);
+    the other attempt is cancelled.
+    """
+    started = time.monotonic()
+    delay = policy.hedge_delay()
+    deadline = current_deadline.get()
+    if deadline is not None and delay >= deadline.remaining():
+        delay = None  # A duplicate could not answer within the turn anyway
+    tasks = [asyncio.ensure_future(start(0))]
+    hedge = "none"
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        winner = tasks[0]
+        if not done:
+            if policy.allow_hedge():
+                tasks.append(asyncio.ensure_future(start(1)))
+                winner = await _first_of(*tasks)
+                hedge = "primary_won" if winner is tasks[0] else "backup_won"
+                logger.info(f"LLM request to {model} hedged after {delay:.2f}s: {hedge}")
+            else:
+                hedge = "capped"
+        result = await winner
+        policy.record(time.monotonic() - started, hedged=len(tasks) > 1)
+        return result, tasks.index(winner)
+    finally:
+        llm_requests.inc(model=model, hedge=hedge)
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await task
+
+
+class HedgedChatOpenAI(DeadlineAwareChatOpenAI):
+    """
+    ChatOpenAI that hedges slow async requests: past the policy's delay a duplicate request is
+    sent, the first to answer (first streamed chunk, or full response) is used and the other is
+    cancelled. Streams are hedged on time to first chunk, which is where slow responses stall.
+    """
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        streams = []
+
+        def start(index: int):
+            streams.append(super(HedgedChatOpenAI, self)._astream(messages, stop=stop, **kwargs))
+            return anext(streams[index])
+
+        try:
+            try:
+                chunk, index = await hedged_call(self.model_name, hedging_policy(self.model_name, "stream"), start)
+            except StopAsyncIteration:
+                return
+            stream = streams[index]
+            while True:
+                # Token callbacks come from here, for the winning stream only
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+                try:
+                    chunk = await anext(stream)
+                except StopAsyncIteration:
+                    break
+        finally:
+            for stream in streams:
+                with contextlib.suppress(Exception):
+                    await stream.aclose()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.streaming:
+            # Goes through _astream, which is hedged
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        def start(index: int):
+            return super(HedgedChatOpenAI, self)._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        result, _ = await hedged_call(self.model_name, hedging_policy(self.model_name, "generate"), start)
+        return result
@@ -0,0 +1,168 @@
+from typing import Awaitable, Callable, List, Tuple
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_WHITESPACE = " \t\r\n"
+
+
+class StreamingJSONString:
+    """
+    Incremental JSON scanner that returns the decoded characters of one string field, given by its
+    key path (e.g. ("final_answer", "chat_output")), while the document is still arriving.
+    Everything else is skipped without being materialized; `done` is set once the string closed.
+    """
+
+    def __init__(self, path: Tuple[str, ...]):
+        self.path = tuple(path)
+        self.done = False
+        self._stack: List[list] = []  # [container type, current key (object) or index (array)]
+        self._state = "value"  # value | key | colon | string | literal | after_value | end
+        self._in_key = False
+        self._capturing = False
+        self._key: List[str] = []
+        self._escape = None  # None, "" right after a backslash, or "u" + hex digits read so far
+        self._high_surrogate = None
+
+    def feed(self, text: str) -> str:
+        out: List[str] = []
+        for ch in text:
+            self._step(ch, out)
+        return "".join(out)
+
+    def _current_path(self) -> tuple:
+        return tuple(frame[1] for frame in self._stack)
+
+    def _emit(self, ch: str, out: List[str]):
+        if self._in_key:
+            self._key.append(ch)
+        elif self._capturing:
+            out.append(ch)
+
+    def _start_string(self, in_key: bool):
+        self._state = "string"
+        self._in_key = in_key
+        self._capturing = not in_key and not self.done and self._current_path() == self.path
+        self._key = []
+
+    def _end_value(self):
+        self._state = "after_value" if self._stack else "end"
+
+    def _step(self, ch: str, out: List[str]):
+        state = self._state
+        if state == "string":
+            if self._escape is not None:
+                self._step_escape(ch, out)
+            elif ch == "\\":
+                self._escape = ""
+            elif ch == '"':
+                if self._in_key:
+                    self._stack[-1][1] = "".join(self._key)
+                    self._in_key = False
+                    self._state = "colon"
+                else:
+                    if self._capturing:
+                        self.done = True
+                        self._capturing = False
+                    self._end_value()
+            else:
+                self._emit(ch, out)
+        elif state == "value":
+            if ch in _WHITESPACE:
+                return
+            if ch == "{":
+                self._stack.append(["object", None])
+                self._state = "key"
+            elif ch == "[":
+                self._stack.append(["array", 0])
+            elif ch == "]" and self._stack and self._stack[-1][0] == "array":
+                self._stack.pop() # Empty array
+                self._end_value()
+            elif ch == '"':
+                self._start_string(in_key=False)
+            else:
+                self._state = "literal" # Number, true, false or null
+        elif state == "key":
+            if ch == '"':
+                self._start_string(in_key=True)
+            elif ch == "}":
+                self._stack.pop() # Empty object
+                self._end_value()
+        elif state == "colon":
+            if ch == ":":
+                self._state = "value"
+        elif state == "literal":
+            if ch in _WHITESPACE or ch in ",]}":
+                self._state = "after_value"
+                self._step(ch, out)
+        elif state == "after_value":
+            if ch == ",":
+                frame = self._stack[-1]
+                if frame[0] == "object":
+                    self._state = "key"
+                else:
+                    frame[1] += 1
+                    self._state = "value"
+            elif ch in "]}":
+                self._stack.pop()
+                self._end_value()
+
+    def _step_escape(self, ch: str, out: List[str]):
+        if self._escape == "":
+            if ch == "u":
+                self._escape = "u"
+                return
+            self._escape = None
+            self._emit(_ESCAPES.get(ch, ch), out)
+            return
+        self._escape += ch
+        if len(self._escape) < 5:
+            return
+        code = int(self._escape[1:], 16)
+        self._escape = None
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code # First half of a pair: wait for the second
+            return
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        self._emit(chr(code), out)
+
+
+class ChatOutputStreamer(AsyncCallbackHandler):
+    """
+    Forwards the `chat_output` of a structured agent's final answer to the client while the step
+    is still being generated: {"type": "answer_chunk", "message": <new text>} per token. When an
+    attempt that already streamed text is not used after all (a retried step, a cascade escalation)
+    the client gets {"type": "answer_reset"} and the next attempt streams from scratch.
+    """
+
+    def __init__(self, send: Callable[[dict], Awaitable], path: Tuple[str, ...] = ("final_answer", "chat_output")):
+        self._send = send
+        self.path = path
+        self._parsers = {}  # LLM run_id -> StreamingJSONString
+        self.streamed = False
+
+    async def reset(self):
+        if self.streamed:
+            self.streamed = False
+            await self._send({"type": "answer_reset"})
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        await self.reset() # A new LLM call: whatever the previous one streamed was not the answer
+        self._parsers[run_id] = StreamingJSONString(self.path)
+
+    async def on_llm_new_token(self, token: str, *, run_id, **kwargs):
+        parser = self._parsers.get(run_id)
+        if parser is None or parser.done or not token:
+            return
+        fragment = parser.feed(token)
+        if fragment:
+            self.streamed = True
+            await self._send({"type": "answer_chunk", "message": fragment})
+
+    async def on_llm_end(self, response, *, run_id, **kwargs):
+        self._parsers.pop(run_id, None)
+
+    async def on_llm_error(self, error, *, run_id, **kwargs):
+        self._parsers.pop(run_id, None)
@@ -0,0 +1,404 @@
+import re
+import json
+import math
+import asyncio
+import logging
+import datetime
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Optional, List
+from zoneinfo import ZoneInfo
+
+from config_loader import get_config
+from qualification_schema import CollectedData, QualificationOutput
+from tenants import calendar_scope
+
+logger = logging.getLogger(__name__)
+
+INTENT_CONFIRMATION = "confirmation"
+INTENT_GREETING = "greeting"
+INTENT_OTHER = "other"
+
+# Seed phrases for the local classifier (accents are stripped before training/prediction)
+DEFAULT_INTENT_EXAMPLES = {
+    INTENT_CONFIRMATION: [
+        "sim", "ok", "okay", "isso", "isso mesmo", "correto", "esta correto", "ta certo", "certo",
+        "pode ser", "pode", "pode agendar", "pode marcar", "confirmo", "confirmado", "perfeito",
+        "fechado", "combinado", "beleza", "claro", "com certeza", "sim pode", "sim esta certo",
+        "tudo certo", "exato", "positivo", "pode confirmar", "esta otimo", "otimo pode ser",
+    ],
+    INTENT_GREETING: [
+        "oi", "ola", "oie", "bom dia", "boa tarde", "boa noite", "oi tudo bem", "ola tudo bem",
+        "e ai", "opa", "oi boa tarde", "ola bom dia", "tudo bem", "tudo bom", "hey", "oi de novo",
+    ],
+    INTENT_OTHER: [
+        "nao", "nao posso", "nao quero", "prefiro outro dia", "tem horario amanha", "quanto custa",
+        "qual o valor do curso", "quais horarios voce tem", "pode ser na sexta", "prefiro de manha",
+        "tem a tarde", "quero mudar o horario", "outro horario", "nenhum desses", "e na semana que vem",
+        "quanto tempo dura", "como funciona", "quero cancelar", "nao tenho email", "depois eu vejo",
+        "qual a duracao do curso", "tem bolsa", "pode ser mais tarde", "nao consigo nesse dia",
+    ],
+}
+
+CONFIRMATION_PATTERN = re.compile(
+    r"^(sim|ok|okay|isso( mesmo)?|(esta |ta )?corret[oa]|(ta |esta )?certo|pode( ser| agendar| marcar| confirmar)?|"
+    r"confirm(o|ado|ada)|perfeito|fechado|combinado|beleza|claro|com certeza|exato|positivo|tudo certo)"
+    r"( sim| pode| obrigad[oa])?$"
+)
+GREETING_PATTERN = re.compile(
+    r"^(oi+e?|ola|opa|hey|e ai|bom dia|boa tarde|boa noite)( (tudo bem|tudo bom|bom dia|boa tarde|boa noite))?$"
+)
+NEGATION_PATTERN = re.compile(r"\b(nao|nunca|nenhum|nenhuma)\b")
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+DATE_PATTERN = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b")
+TIME_PATTERN = re.compile(r"\b(\d{1,2})(?:h(\d{2})?|:(\d{2}))(?!\d)")
+USER_HOUR_PATTERN = re.compile(r"\bas (\d{1,2})\b")
+OPTION_NUMBER_PATTERN = re.compile(r"\b(?:opcao|numero|n) ?(\d)\b|^(\d)$")
+ORDINAL_PATTERNS = [
+    (re.compile(r"\bprimeir[oa]\b"), 0),
+    (re.compile(r"\bsegundo\b|\bsegunda opcao\b"), 1),
+    (re.compile(r"\bterceir[oa]\b"), 2),
+    (re.compile(r"\bultim[oa]\b"), -1),
+]
+WEEKDAY_NAMES_PT = ["segunda-feira", "terça-feira", "quarta-feira", "quinta-feira", "sexta-feira", "sábado", "domingo"]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w@.:/+-]+", " ", text)
+    text = re.sub(r"[.!?]+(\s|$)", " ", text)
+    return " ".join(text.split())
+
+
+class NaiveBayesIntentClassifier:
+    """Tiny multinomial naive Bayes over word unigrams and bigrams; trains in microseconds."""
+
+    def __init__(self, examples: dict):
+        self._word_counts = defaultdict(Counter)
+        self._class_counts = Counter()
+        self._vocabulary = set()
+        for intent, phrases in examples.items():
+            for phrase in phrases:
+                features = self._features(normalize_text(phrase))
+                self._word_counts[intent].update(features)
+                self._class_counts[intent] += 1
+                self._vocabulary.update(features)
+        self._totals = {intent: sum(counts.values()) for intent, counts in self._word_counts.items()}
+        self._num_examples = sum(self._class_counts.values())
+
+    @staticmethod
+    def _features(text: str) -> List[str]:
+        words = text.split()
+        return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+    def predict(self, text: str):
+        """Returns (intent, posterior probability)."""
+        features = self._features(normalize_text(text))
+        vocabulary_size = len(self._vocabulary) + 1
+        log_scores = {}
+        for intent, class_count in self._class_counts.items():
+            score = math.log(class_count / self._num_examples)
+            for feature in features:
+                score += math.log((self._word_counts[intent][feature] + 1) / (self._totals[intent] + vocabulary_size))
+            log_scores[intent] = score
+        best_score = max(log_scores.values())
+        normalizer = sum(math.exp(score - best_score) for score in log_scores.values())
+        intent = max(log_scores, key=log_scores.get)
+        return intent, 1.0 / normalizer
+
+
+@dataclass
+class RouterSessionState:
+    """What the router knows about a session's scheduling conversation."""
+    offered_slots: List[datetime.datetime] = field(default_factory=list)
+    pending_slot: Optional[datetime.datetime] = None
+    email: Optional[str] = None
+    awaiting_confirmation: bool = False
+
+
+@dataclass
+class RoutedReply:
+    """Reply produced by the fast path; structured_output is set for qualification turns."""
+    message: str
+    intent: str
+    structured_output: Optional[QualificationOutput] = None
+
+
+class IntentRouter:
+    """
+    Lightweight router that runs before the ReAct agent. Rules plus a local classifier
+    recognize greetings, confirmations and slot selections, which are answered with
+    templated replies or direct calendar tool calls. Everything else returns None and
+    goes to the full agent.
+    """
+
+    def __init__(self, calendar_tool, templates: dict, max_words: int = 6, min_confidence: float = 0.8,
+                 timezone_id: str = "UTC", duration_minutes: int = 30, event_title: str = "", examples: dict = None,
+                 slot_holds=None, calendar_id: str = "primary", offer_lease_seconds: float = 60):
+        self._calendar_tool = calendar_tool
+        self._slot_holds = slot_holds
+        self.offer_lease_seconds = offer_lease_seconds
+        self.calendar_id = calendar_id
+        self.templates = templates
+        self.max_words = max_words
+        self.min_confidence = min_confidence
+        self.timezone = ZoneInfo(timezone_id)
+        self.timezone_id = timezone_id
+        self.duration = datetime.timedelta(minutes=duration_minutes)
+        self.event_title = event_title
+        self._classifier = NaiveBayesIntentClassifier(examples or DEFAULT_INTENT_EXAMPLES)
+        self._sessions = {}
+
+    # --- Session bookkeeping ---
+
+    def session_state(self, session_id: str) -> RouterSessionState:
+        if session_id not in self._sessions:
+            self._sessions[session_id] = RouterSessionState()
+        return self._sessions[session_id]
+
+    def discard(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    async def observe_agent_reply(self, session_id: str, reply: str):
+        """
+        Called after a turn handled by the full agent: picks up offered slots, resets pending
+        steps and briefly leases the offered slots to the session so other sessions see them as busy.
+        """
+        state = self.session_state(session_id)
+        state.pending_slot = None
+        state.awaiting_confirmation = False
+        slots = self.extract_offered_slots(reply)
+        if slots:
+            state.offered_slots = slots
+            logger.debug(f"Router picked up {len(slots)} offered slots for session {session_id}")
+            if self._slot_holds:
+                held = await asyncio.to_thread(
+                    lambda: [slot for slot in slots if self._hold(session_id, slot, self.offer_lease_seconds)]
+                )
+                if len(held) < len(slots):
+                    logger.info(f"{len(slots) - len(held)} slots offered to session {session_id} are held by other sessions")
+
+    # --- Parsing helpers ---
+
+    def extract_offered_slots(self, text: str) -> List[datetime.datetime]:
+        """Finds 'dd/mm ... HH:MM' style slots in an agent reply (a line without date reuses the previous one)."""
+        now = datetime.datetime.now(self.timezone)
+        slots = []
+        current_date = None
+        for line in text.splitlines():
+            line_norm = normalize_text(line)
+            date_match = DATE_PATTERN.search(line_norm)
+            if date_match:
+                day, month, year = int(date_match.group(1)), int(date_match.group(2)), date_match.group(3)
+                year = int(year) + (2000 if len(year) == 2 else 0) if year else now.year
+                try:
+                    current_date = datetime.date(year, month, day)
+                except ValueError:
+                    current_date = None
+                    continue
+                if not date_match.group(3) and current_date < now.date() - datetime.timedelta(days=1):
+                    current_date = current_date.replace(year=year + 1)
+            if current_date is None:
+                continue
+            line_without_dates = DATE_PATTERN.sub(" ", line_norm)
+            for time_match in TIME_PATTERN.finditer(line_without_dates):
+                hour = int(time_match.group(1))
+                minute = int(time_match.group(2) or time_match.group(3) or 0)
+                if hour > 23 or minute > 59:
+                    continue
+                slot = datetime.datetime.combine(current_date, datetime.time(hour, minute), tzinfo=self.timezone)
+                if slot not in slots:
+                    slots.append(slot)
+        return slots
+
+    def match_slot_selection(self, text: str, offered_slots: List[datetime.datetime]) -> Optional[datetime.datetime]:
+        """Resolves the user's pick to exactly one offered slot, or None if it is ambiguous."""
+        if not offered_slots:
+            return None
+        option = OPTION_NUMBER_PATTERN.search(text)
+        if option:
+            index = int(option.group(1) or option.group(2)) - 1
+            return offered_slots[index] if 0 <= index < len(offered_slots) else None
+        for pattern, index in ORDINAL_PATTERNS:
+            if pattern.search(text) and -len(offered_slots) <= index < len(offered_slots):
+                return offered_slots[index]
+
+        candidates = offered_slots
+        date_match = DATE_PATTERN.search(text)
+        if date_match:
+            day, month = int(date_match.group(1)), int(date_match.group(2))
+            candidates = [slot for slot in candidates if (slot.day, slot.month) == (day, month)]
+            text = DATE_PATTERN.sub(" ", text)
+        time_match = TIME_PATTERN.search(text)
+        hour_match = USER_HOUR_PATTERN.search(text)
+        if time_match:
+            hour = int(time_match.group(1))
+            minute = time_match.group(2) or time_match.group(3)
+            candidates = [slot for slot in candidates if slot.hour == hour and (minute is None or slot.minute == int(minute))]
+        elif hour_match:
+            candidates = [slot for slot in candidates if slot.hour == int(hour_match.group(1))]
+        elif not date_match:
+            return None
+        return candidates[0] if len(candidates) == 1 else None
+
+    def classify(self, text: str) -> str:
+        """Rules first, then the local classifier for short messages."""
+        if NEGATION_PATTERN.search(text):
+            return INTENT_OTHER
+        if CONFIRMATION_PATTERN.match(text):
+            return INTENT_CONFIRMATION
+        if GREETING_PATTERN.match(text):
+            return INTENT_GREETING
+        if len(text.split()) > self.max_words:
+            return INTENT_OTHER
+        intent, confidence = self._classifier.predict(text)
+        return intent if confidence >= self.min_confidence else INTENT_OTHER
+
+    def format_slot(self, slot: datetime.datetime) -> str:
+        return f"{WEEKDAY_NAMES_PT[slot.weekday()]}, {slot.strftime('%d/%m')} às {slot.strftime('%H:%M')}"
+
+    def _render(self, template_key: str, **values) -> str:
+        values.setdefault("display_timezone_short", get_config("display_timezone_short", ""))
+        return self.templates[template_key].format(**values)
+
+    # --- Calendar access ---
+
+    def _hold(self, session_id: str, slot: datetime.datetime, lease_seconds: Optional[float] = None) -> bool:
+        """Leases the slot to the session (blocking); True when nobody else holds it."""
+        return self._slot_holds.acquire(
+            self.calendar_id, slot.timestamp(), (slot + self.duration).timestamp(), session_id, lease_seconds
+        )
+
+    def _hold_pick(self, session_id: str, selected: datetime.datetime, offered_slots: List[datetime.datetime]) -> bool:
+        """Leases the picked slot for the full booking lease and drops the session's other offers (blocking)."""
+        if not self._hold(session_id, selected):
+            return False
+        for slot in offered_slots:
+            if slot != selected:
+                self._slot_holds.release(self.calendar_id, slot.timestamp(), session_id)
+        return True
+
+    async def _call_calendar(self, name: str, arguments: dict) -> str:
+        command = json.dumps({"name": name, "arguments": arguments})
+        # The calendar tool talks to the MCP server through blocking pipes; keep it off the event loop
+        return await asyncio.to_thread(self._calendar_tool._run, command)
+
+    async def _is_slot_free(self, slot: datetime.datetime) -> Optional[bool]:
+        """True/False when the calendar answered clearly, None when the agent should decide."""
+        result = await self._call_calendar("list-events", {
+            "timeMin": slot.isoformat(),
+            "timeMax": (slot + self.duration).isoformat(),
+        })
+        if not isinstance(result, str):
+            return None
+        if result.strip() == "":
+            return True
+        if "Start:" in result:
+            return False
+        return None
+
+    # --- Routing ---
+
+    async def route(self, session_id: str, state_name: str, message: str,
+                    collected_data: Optional[dict] = None) -> Optional[RoutedReply]:
+        """Returns a RoutedReply when the fast path handled the message, None to run the full agent."""
+        text = normalize_text(message)
+        if not text:
+            return None
+
+        if state_name == "qualification":
+            # Confirmations answer qualification questions, only the agent can interpret them.
+            # The greeting reply is the first question: only before anything was collected
+            # ("tudo bem" mid-qualification often just means "ok")
+            started = any(str(value).strip() for value in (collected_data or {}).values())
+            if not started and self.classify(text) == INTENT_GREETING:
+                reply = self._render("qualification_greeting")
+                return RoutedReply(reply, INTENT_GREETING, QualificationOutput(
+                    chat_output=reply,
+                    collected_data=CollectedData.model_validate(collected_data or {}),
+                    done=False,
+                ))
+            return None
+
+        if state_name != "scheduling":
+            return None
+
+        state = self.session_state(session_id)
+        email_match = EMAIL_PATTERN.search(message)
+
+        # Final confirmation of a reviewed booking -> re-check and create the event directly
+        if state.awaiting_confirmation and state.pending_slot and state.email:
+            if self.classify(text) != INTENT_CONFIRMATION:
+                return None
+            return await self._book(session_id, state)
+
+        # E-mail given after a slot was picked -> review step
+        if state.pending_slot and email_match and len(text.split()) <= self.max_words:
+            state.email = email_match.group(0)
+            state.awaiting_confirmation = True
+            return RoutedReply(self._render("review", slot=self.format_slot(state.pending_slot), email=state.email), "email")
+
+        # Pick among the slots offered in the last agent reply
+        selected = self.match_slot_selection(text, state.offered_slots) if len(text.split()) <= self.max_words else None
+        if selected:
+            is_free = await self._is_slot_free(selected)
+            if not is_free:
+                return None # Taken or unknown: let the agent propose alternatives
+            if self._slot_holds and not await asyncio.to_thread(self._hold_pick, session_id, selected, state.offered_slots):
+                return None # Another session is booking it
+            state.pending_slot = selected
+            if email_match:
+                state.email = email_match.group(0)
+            if state.email:
+                state.awaiting_confirmation = True
+                return RoutedReply(self._render("review", slot=self.format_slot(selected), email=state.email), "slot_selection")
+            return RoutedReply(self._render("ask_email", slot=self.format_slot(selected)), "slot_selection")
+
+        if self.classify(text) == INTENT_GREETING:
+            return RoutedReply(self._render("scheduling_greeting"), INTENT_GREETING)
+        return None
+
+    async def _book(self, session_id: str, state: RouterSessionState) -> Optional[RoutedReply]:
+        slot, email = state.pending_slot, state.email
+        is_free = await self._is_slot_free(slot)
+        if is_free is None:
+            return None
+        if not is_free:
+            state.pending_slot = None
+            state.awaiting_confirmation = False
+            return RoutedReply(self._render("slot_taken", slot=self.format_slot(slot)), "booking")
+        result = await self._call_calendar("create-event", {
+            "summary": self.event_title,
+            "start": slot.isoformat(),
+            "end": (slot + self.duration).isoformat(),
+            "timeZone": self.timezone_id,
+            "attendees": [{"email": email}],
+        })
+        if not (isinstance(result, str) and result.startswith("Event created")):
+            logger.warning(f"Router booking failed for session {session_id}, falling back to agent: {result}")
+            return None
+        state.pending_slot = None
+        state.awaiting_confirmation = False
+        state.offered_slots = []
+        logger.info(f"Router booked {slot.isoformat()} for session {session_id}")
+        return RoutedReply(self._render("booked", slot=self.format_slot(slot), email=email), "booking")
+
+
+def create_intent_router_from_config(calendar_tool, slot_holds=None) -> Optional[IntentRouter]:
+    if not get_config("intent_router_enabled", False):
+        return None
+    return IntentRouter(
+        calendar_tool,
+        templates=get_config("intent_router_templates", {}),
+        max_words=get_config("intent_router_max_words", 6),
+        min_confidence=get_config("intent_router_min_confidence", 0.8),
+        timezone_id=get_config("internal_timezone_id", "UTC"),
+        duration_minutes=get_config("consultation_duration_minutes", 30),
+        event_title=get_config("default_event_title", ""),
+        slot_holds=slot_holds,
+        calendar_id=calendar_scope(get_config("default_calendar_id") or "primary"),
+        offer_lease_seconds=get_config("slot_offer_lease_seconds", 60),
+    )
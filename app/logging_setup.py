@@ -0,0 +1,127 @@
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+import datetime
+
+# Attribute names present on every LogRecord; anything else came in through `extra=`
+_STANDARD_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+def log_payload(**fields) -> dict:
+    """
+    `extra=` helper for request/response bodies. The values are only serialized by the
+    background listener, and only when payload logging is enabled.
+    """
+    return {"payload": fields}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, component, message plus any `extra=` fields."""
+
+    def __init__(self, log_payloads: bool = False):
+        super().__init__()
+        self.log_payloads = log_payloads
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "component": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key in _STANDARD_RECORD_ATTRS or key.startswith("_"):
+                continue
+            if key == "payload" and not self.log_payloads:
+                continue
+            entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of the records below WARNING for the configured components."""
+
+    def __init__(self, sample_rates: dict):
+        super().__init__()
+        # Longest prefix first so "tool.calendar" wins over "tool"
+        self._rates = sorted(sample_rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for component, rate in self._rates:
+            if record.name == component or record.name.startswith(component + "."):
+                return rate >= 1 or random.random() < rate
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks or formats on the caller's thread: records are handed
+    over as-is (formatting happens in the listener) and dropped when the queue is full.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def configure_logging(settings: dict = None):
+    """
+    Installs the queue-based logging pipeline on the root logger.
+
+    settings (the "logging" block of config.json):
+      level         default level for every component
+      components    {"logger name": "LEVEL"} overrides, e.g. {"tool": "WARNING"}
+      sample_rates  {"logger name": 0.1} fraction of sub-WARNING records kept
+      log_payloads  include message/prompt/response bodies (off by default)
+      queue_size    max records buffered before new ones are dropped
+    """
+    global _listener
+    settings = settings or {}
+
+    _stop_listener()
+
+    log_queue = queue.Queue(maxsize=settings.get("queue_size", 10000))
+    output_handler = logging.StreamHandler(sys.stdout)
+    output_handler.setFormatter(JsonFormatter(log_payloads=settings.get("log_payloads", False)))
+
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    if settings.get("sample_rates"):
+        queue_handler.addFilter(SamplingFilter(settings["sample_rates"]))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.get("level", "INFO"))
+    for component, level in settings.get("components", {}).items():
+        logging.getLogger(component).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop() # Flushes whatever is still queued
+        _listener = None
+
+
+atexit.register(_stop_listener)
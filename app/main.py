@@ -1,6 +1,6 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 import uvicorn
 import os
@@ -10,19 +10,64 @@ from starlette.websockets import WebSocketState # Import needed for finally bloc
 import datetime # <<< ADDED
 import json # Add json import
 import asyncio # Add asyncio import
+import contextlib
 from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessage
+import openai
 import httpx # <-- Add httpx for API calls
 
 # Import config loader (use absolute import)
-from config_loader import get_config
+from config_loader import get_config, current_config, subscribe, watch_config, active_tenant_config
+
+# Queue-based structured logging (configured before anything else logs)
+from logging_setup import configure_logging, log_payload
+configure_logging(get_config("logging", {}))
 
 # Assuming agent.py is in the same package directory (use absolute import)
-from agent import create_agent_executor_with_history, get_session_history
+from agent import create_agent_executor_with_history, get_session_history, agent_settings, AGENT_STOPPED_OUTPUT
+
+# Per-turn latency budget propagated to LLM, tool and API calls
+from deadlines import start_turn_deadline, remaining_timeout, DeadlineExceeded
+
+# Typed output of the qualification agent
+from qualification_schema import CollectedData, QualificationOutput
 
 # Import tools
-from tool import GoogleCalendarCLIWrapper, VectorStoreSitemapTool # Changed to VectorStoreSitemapTool
+from tool import GoogleCalendarCLIWrapper, VectorStoreSitemapTool, slot_holds # Changed to VectorStoreSitemapTool
+from slot_holds import current_session_id
+
+# Semantic cache for repeated qualification (FAQ) answers
+from semantic_cache import create_semantic_cache_from_config
+
+# Background availability prefetch when a user qualifies
+from availability_prefetch import create_availability_prefetcher_from_config
+
+# Fast path for trivial messages (greetings, confirmations, slot picks)
+from intent_router import create_intent_router_from_config
+
+# Deterministic pt-BR date/time resolution for scheduling turns
+from temporal_pt import create_temporal_resolver_from_config, format_resolved_ranges
+
+# Per-session spans with LLM token / latency accounting
+from tracing import create_tracer_from_config
+
+# Fingerprinted, precompressed UI assets and the pre-rendered index page
+from static_assets import StaticAssetBundle, PrecomputedResponse, PAGE_CACHE_CONTROL
+
+# Several brands (tenants) served by one deployment, routed by host or /t/<tenant>
+from tenants import TenantRegistry, TenantContext, DEFAULT_TENANT, session_key
+
+# Graceful drain for rolling deploys: sessions are snapshotted and resumed on another worker
+from drain import create_drain_controller_from_config, LiveSession, current_live_session
+from session_snapshots import SessionSnapshot, create_session_snapshot_store_from_config
+
+# Simple turns try a smaller model first and escalate to the agent's main model when needed
+from model_cascade import CascadeSettings, cascade_astream
+from metrics import registry as metrics_registry, PROMETHEUS_CONTENT_TYPE
+
+# chat_output of the qualification answer is streamed while its JSON is still being generated
+from incremental_json import ChatOutputStreamer
 
-logging.basicConfig(level=logging.DEBUG) # Set to DEBUG
 logger = logging.getLogger(__name__)
 
 app = FastAPI()
@@ -30,7 +75,7 @@ app = FastAPI()
 # Mount static files (HTML, CSS, JS)
 # Get directory containing main.py and join with 'static'
 static_dir = os.path.join(os.path.dirname(__file__), "static") 
-logger.info(f"Calculated static directory: {static_dir}") # Log the path
+logger.debug(f"Calculated static directory: {static_dir}") # Log the path
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
 # Use Jinja2Templates for rendering index.html potentially (optional here)
@@ -50,6 +95,7 @@ SCHEDULING_PROMPT = get_config("scheduling_agent_system_prompt_template", "Error
 QUALIFICATION_API_URL = get_config("qualification_api_url", "")
 NOT_QUALIFIED_MESSAGE_TEMPLATE = get_config("not_qualified_message", "Not qualified.")
 NOT_QUALIFIED_PDF_URL = get_config("not_qualified_pdf_url", "")
+TURN_BUDGET_EXCEEDED_MESSAGE = get_config("turn_budget_exceeded_message", "Sorry, this is taking longer than expected. Could you repeat or rephrase your last message?")
 
 # --- Define Tool Lists ---
 # Qualification agent only needs the vector store tool
@@ -68,30 +114,313 @@ scheduling_tools = [GoogleCalendarCLIWrapper()]
 session_states = {}
 # Dictionary to store agent executors per session
 session_executors = {}
+# Last collected_data reported by the qualification agent per session
+session_collected_data = {}
+
+# Qualification answers cache (None when disabled in config)
+qualification_answer_cache = create_semantic_cache_from_config()
+
+# Prefetches calendar availability as soon as a session switches to scheduling (None when disabled)
+availability_prefetcher = create_availability_prefetcher_from_config(scheduling_tools[0])
+
+# Answers trivial messages without running the ReAct agent (None when disabled)
+intent_router = create_intent_router_from_config(scheduling_tools[0], slot_holds)
+
+# Resolves pt-BR date/time expressions of scheduling messages locally (None when disabled)
+temporal_resolver = create_temporal_resolver_from_config()
+
+# Session tracer: spans per turn, LLM call, tool call and external call (None when disabled)
+tracer = create_tracer_from_config()
+
+# Where draining workers leave sessions for the worker the client reconnects to (None = disabled)
+session_snapshot_store = create_session_snapshot_store_from_config()
+drain_controller = create_drain_controller_from_config()
+
+def trace_span(session_id: str, name: str, parent, **attributes):
+    """Child span of the current turn, or a no-op context when tracing is disabled."""
+    if tracer is None:
+        return contextlib.nullcontext()
+    return tracer.span(session_id, name, parent=parent, **attributes)
+
+def qualification_cache_stage(collected_data: dict) -> str:
+    """
+    Qualification stage used as part of the cache key: which fields were already collected.
+    Leads with the same number of answers but different ones get different follow-up questions.
+    """
+    filled = sorted(name for name, value in (collected_data or {}).items() if value not in ("", None))
+    return "qualification:" + ",".join(filled)
+
+def reply_is_shareable(chat_output: str, collected_data: dict) -> bool:
+    """A reply can be served to other sessions only if it quotes none of this lead's answers."""
+    reply = chat_output.casefold()
+    return not any(
+        str(value).strip().casefold() in reply
+        for value in (collected_data or {}).values() if str(value or "").strip()
+    )
+
+# script.js / style.css under content-hash URLs, gzip/brotli compressed once at startup
+# (/static keeps serving the plain files for old pages still open in browsers)
+static_assets = StaticAssetBundle(static_dir)
+
+def render_index_page(initial_message: str = None, chat_title: str = None, input_placeholder: str = None,
+                      ws_base: str = "") -> PrecomputedResponse:
+    """The page only depends on configuration: rendered with Jinja2 once per config version (and tenant)."""
+    return PrecomputedResponse.build(
+        templates.get_template("index.html").render(
+            initial_message=initial_message or INITIAL_BOT_MESSAGE,
+            chat_title=chat_title or CHAT_TITLE,
+            input_placeholder=input_placeholder or INPUT_PLACEHOLDER, # Pass placeholder to template
+            static_url=static_assets.url,
+            ws_base=ws_base, # WebSocket path prefix of path-routed tenants
+        ).encode("utf-8"),
+        media_type="text/html; charset=utf-8",
+        cache_control=PAGE_CACHE_CONTROL,
+    )
+
+index_page = render_index_page()
+
+def render_tenant_index_page(tenant: TenantContext, ws_base: str) -> PrecomputedResponse:
+    return render_index_page(
+        initial_message=tenant.config.get("initial_message", "Connected! How can I help?"),
+        chat_title=tenant.config.get("chat_title", "Chat with Calendar"),
+        input_placeholder=tenant.config.get("input_placeholder", "Type your message..."),
+        ws_base=ws_base,
+    )
+
+def build_tenant_context(tenant_id: str, config) -> TenantContext:
+    """
+    Called by the tenant registry with `config` active. The default tenant reuses the module's
+    tools and components; every other tenant gets its own, created from its compiled config.
+    """
+    if tenant_id == DEFAULT_TENANT:
+        return TenantContext(
+            tenant_id=tenant_id,
+            config=config,
+            config_version=0,
+            qualification_tools=qualification_tools,
+            scheduling_tools=scheduling_tools,
+            intent_router=intent_router,
+            qualification_answer_cache=qualification_answer_cache,
+            availability_prefetcher=availability_prefetcher,
+            temporal_resolver=temporal_resolver,
+        )
+    data_url = config.get("vector_store_data_url", "")
+    calendar_tool = GoogleCalendarCLIWrapper(description=config["calendar_tool_description"])
+    return TenantContext(
+        tenant_id=tenant_id,
+        config=config,
+        config_version=0,
+        qualification_tools=[VectorStoreSitemapTool(
+            description=config["vector_store_tool_description"],
+            data_url=data_url,
+            # The shared offline / BM25 indexes only cover the base config's data URL
+            use_offline_index=data_url == current_config().get("vector_store_data_url", ""),
+        )],
+        scheduling_tools=[calendar_tool],
+        intent_router=create_intent_router_from_config(calendar_tool, slot_holds),
+        qualification_answer_cache=create_semantic_cache_from_config(),
+        availability_prefetcher=create_availability_prefetcher_from_config(calendar_tool),
+        temporal_resolver=create_temporal_resolver_from_config(),
+    )
+
+# Built tenant contexts: the default one is pinned, the others kept in a bounded LRU
+tenant_registry = TenantRegistry(build_tenant_context, max_cached=get_config("tenant_cache_size", 32))
 
 @app.get("/")
 async def get(request: Request):
-    """Serve the index.html file using Jinja2 to inject configuration."""
-    return templates.TemplateResponse(
-        "index.html",
-        {
-            "request": request,
-            "initial_message": INITIAL_BOT_MESSAGE,
-            "chat_title": CHAT_TITLE,
-            "input_placeholder": INPUT_PLACEHOLDER # Pass placeholder to template
-        }
+    """Serve the pre-rendered index page (compressed to what the client accepts)."""
+    tenant_id = tenant_registry.resolve(host=request.headers.get("host"))
+    if tenant_id == DEFAULT_TENANT:
+        return index_page.to_response(request)
+    return tenant_registry.get(tenant_id).index_page("", render_tenant_index_page).to_response(request)
+
+@app.get("/t/{tenant_id}/")
+async def get_tenant_page(tenant_id: str, request: Request):
+    """Index page of a path-routed tenant; its WebSocket lives under the same prefix."""
+    if tenant_registry.resolve(path_tenant=tenant_id) is None:
+        return JSONResponse({"detail": "Unknown tenant."}, status_code=404)
+    return tenant_registry.get(tenant_id).index_page(f"/t/{tenant_id}", render_tenant_index_page).to_response(request)
+
+@app.get("/assets/{name}")
+async def get_asset(name: str, request: Request):
+    """Serve a fingerprinted static asset with immutable cache headers."""
+    asset = static_assets.get(name)
+    if asset is None:
+        return JSONResponse({"detail": "Not Found"}, status_code=404)
+    return asset.to_response(request)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics of this worker (model cascade outcomes, ...)."""
+    return PlainTextResponse(metrics_registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/sessions/{session_id}/trace-summary")
+@app.get("/t/{tenant_id}/sessions/{session_id}/trace-summary")
+async def trace_summary(request: Request, session_id: str, tenant_id: str = None):
+    """LLM calls, tokens, tool calls and time spent per stage for one conversation (of the request's tenant)."""
+    tenant_id = tenant_registry.resolve(host=request.headers.get("host"), path_tenant=tenant_id)
+    if tenant_id is None:
+        return JSONResponse({"detail": "Unknown tenant."}, status_code=404)
+    summary = tracer.summary(session_key(tenant_id, session_id)) if tracer else None
+    if summary is None:
+        return JSONResponse({"detail": "No trace data for this session."}, status_code=404)
+    return JSONResponse({"session_id": session_id, **summary})
+
+def build_agent_executor(tenant: TenantContext, key: str):
+    """`key` is the agent state, suffixed with ":small" for the small model of its cascade."""
+    state, _, tier = key.partition(":")
+    model = CascadeSettings.for_agent(state).small_model if tier == "small" else None
+    logger.info(f"Creating {state.upper()} agent executor ({model or 'main model'}) for tenant '{tenant.tenant_id}', config version {tenant.config_version}...")
+    if state == "qualification":
+        return create_agent_executor_with_history(
+            system_prompt_template_str=tenant.config["qualification_agent_system_prompt_template"],
+            tools_list=tenant.qualification_tools,
+            response_model=QualificationOutput,
+            agent_name="qualification",
+            model=model
+        )
+    return create_agent_executor_with_history(
+        system_prompt_template_str=tenant.config["scheduling_agent_system_prompt_template"],
+        tools_list=tenant.scheduling_tools,
+        agent_name="scheduling",
+        model=model
     )
 
-async def initialize_session(session_id: str):
+def executor_for_state(state: str, tenant: TenantContext):
+    """
+    Executors hold no per-session state (history is looked up by the session_id in the run
+    config), so one per agent and tenant is shared; tenant contexts are rebuilt after a reload.
+    """
+    return tenant.executor(state, build_agent_executor)
+
+def small_executor_for_state(state: str, tenant: TenantContext):
+    """Executor on the agent's cascade model, or None when `<agent>_cascade_model` is not set."""
+    if not CascadeSettings.for_agent(state).enabled:
+        return None
+    return tenant.executor(f"{state}:small", build_agent_executor)
+
+def apply_config(snapshot):
+    """
+    Config reload subscriber: swaps the values this module copied at import. Runs on the event
+    loop between awaits, so a turn sees either the old or the new values, never a mix; executors
+    pick up the new prompts on their session's next turn.
+    """
+    global INITIAL_BOT_MESSAGE, CHAT_TITLE, INPUT_PLACEHOLDER, QUALIFICATION_PROMPT, SCHEDULING_PROMPT
+    global QUALIFICATION_API_URL, NOT_QUALIFIED_MESSAGE_TEMPLATE, NOT_QUALIFIED_PDF_URL, TURN_BUDGET_EXCEEDED_MESSAGE, index_page
+    INITIAL_BOT_MESSAGE = snapshot.get("initial_message", "Connected! How can I help?")
+    CHAT_TITLE = snapshot.get("chat_title", "Chat with Calendar")
+    INPUT_PLACEHOLDER = snapshot.get("input_placeholder", "Type your message...")
+    QUALIFICATION_PROMPT = snapshot.qualification_prompt
+    SCHEDULING_PROMPT = snapshot.scheduling_prompt
+    QUALIFICATION_API_URL = snapshot.get("qualification_api_url", "")
+    NOT_QUALIFIED_MESSAGE_TEMPLATE = snapshot.get("not_qualified_message", "Not qualified.")
+    NOT_QUALIFIED_PDF_URL = snapshot.get("not_qualified_pdf_url", "")
+    TURN_BUDGET_EXCEEDED_MESSAGE = snapshot.get("turn_budget_exceeded_message", TURN_BUDGET_EXCEEDED_MESSAGE)
+    for tool in scheduling_tools:
+        tool.description = snapshot.calendar_tool_description
+    for tool in qualification_tools:
+        tool.description = snapshot.vector_store_tool_description
+        tool.data_url = snapshot.get("vector_store_data_url", "") # tool.py drops its BM25 index on reload too
+    if intent_router:
+        intent_router.templates = snapshot.get("intent_router_templates", {})
+    index_page = render_index_page()
+
+subscribe(apply_config)
+
+@app.on_event("startup")
+async def start_config_watcher():
+    if get_config("config_hot_reload_enabled", True):
+        app.state.config_watcher = asyncio.create_task(watch_config(get_config("config_reload_interval_seconds", 2)))
+
+@app.on_event("startup")
+async def install_drain_handler():
+    if not get_config("drain_on_sigterm", True):
+        return
+    try:
+        drain_controller.install_sigterm_handler(hand_off_session)
+    except ValueError as e: # Not the main thread (e.g. an embedding server): rely on POST /admin/drain
+        logger.warning(f"Could not install the SIGTERM drain handler: {e}")
+
+@app.get("/healthz")
+async def healthz():
+    """Readiness probe: 503 while draining, so load balancers stop routing new sessions here."""
+    status = {"open_sessions": drain_controller.open_sessions, "in_flight": drain_controller.in_flight}
+    if drain_controller.draining:
+        return JSONResponse({"status": "draining", **status}, status_code=503)
+    return JSONResponse({"status": "ok", **status})
+
+@app.post("/admin/drain")
+async def admin_drain(request: Request):
+    """Drains this worker (e.g. from a preStop hook) and answers once every session was handed off."""
+    token = os.getenv("ADMIN_TOKEN")
+    if token and request.headers.get("authorization") != f"Bearer {token}":
+        return JSONResponse({"detail": "Unauthorized"}, status_code=401)
+    summary = await drain_controller.drain(hand_off_session)
+    return JSONResponse(summary)
+
+def reconnect_notice(pending_message: str = None) -> str:
+    """Tells the client to reconnect (to another worker) and resend the message whose turn was cut off."""
+    return json.dumps({
+        "type": "reconnect",
+        "message": get_config("drain_reconnect_message", "Reconnecting..."),
+        "pending_message": pending_message,
+        "retry_after_ms": get_config("drain_retry_after_ms", 1000),
+    })
+
+async def hand_off_session(live: LiveSession):
+    """
+    Sends a session to the worker its client reconnects to. A turn still running is cancelled
+    first; its connection handler then completes the hand-off (see complete_hand_off).
+    """
+    if live.handed_off:
+        return
+    live.handed_off = True
+    if live.turn_task is not None and live.turn_task is not asyncio.current_task():
+        live.turn_task.cancel()
+        await live.closed.wait()
+        return
+    await complete_hand_off(live)
+
+async def complete_hand_off(live: LiveSession):
+    """Snapshots the session, then sends the client elsewhere with the message to resend, if any."""
+    session_id = live.session_id
+    if session_snapshot_store and session_id in session_states:
+        snapshot = SessionSnapshot.capture(
+            session_id, session_states[session_id], session_collected_data.get(session_id, {}), get_session_history(session_id)
+        )
+        try:
+            await asyncio.to_thread(session_snapshot_store.save, snapshot)
+            logger.info(f"Saved snapshot of session {session_id} ({len(snapshot.messages)} messages)")
+        except Exception as e:
+            logger.error(f"Could not snapshot session {session_id}: {e}", exc_info=True)
+    # A cut-off turn that already sent a calendar write is not replayed (it could book twice)
+    pending_message = None if live.turn_wrote else live.pending_message
+    try:
+        await live.websocket.send_text(reconnect_notice(pending_message))
+        await live.websocket.close(code=1012) # Service Restart
+    except Exception as e:
+        logger.warning(f"Could not send reconnect notice to {session_id}: {e}")
+
+async def resume_session(session_id: str, tenant: TenantContext) -> bool:
+    """Continues a session handed off by a draining worker, if there is a snapshot for it."""
+    if not session_snapshot_store:
+        return False
+    snapshot = await asyncio.to_thread(session_snapshot_store.pop, session_id)
+    if snapshot is None:
+        return False
+    session_states[session_id] = snapshot.state
+    session_collected_data[session_id] = snapshot.collected_data
+    snapshot.restore_history(get_session_history(session_id))
+    session_executors[session_id] = executor_for_state(snapshot.state, tenant)
+    logger.info(f"Resumed session {session_id} in {snapshot.state.upper()} state with {len(snapshot.messages)} messages")
+    return True
+
+async def initialize_session(session_id: str, tenant: TenantContext):
     """Initializes the state and agent executor for a new session."""
     logger.info(f"Initializing session {session_id}...")
     session_states[session_id] = "qualification" # Start in qualification mode
     try:
-        logger.info(f"Creating QUALIFICATION agent executor for session {session_id}...")
-        agent_executor = create_agent_executor_with_history(
-            system_prompt_template_str=QUALIFICATION_PROMPT,
-            tools_list=qualification_tools
-        )
+        agent_executor = executor_for_state("qualification", tenant)
         session_executors[session_id] = agent_executor
         logger.info(f"Qualification agent executor created successfully for session {session_id}.")
         return agent_executor
@@ -99,15 +428,93 @@ async def initialize_session(session_id: str):
         logger.error(f"Failed to initialize QUALIFICATION agent executor for session {session_id}: {init_error}", exc_info=True)
         raise # Re-raise the exception to be caught by the websocket handler
 
+async def resolved_dates_note(message: str, resolver, calendar_tool, prefetched, session_id: str, turn_span) -> str:
+    """
+    Turn context note with the message's dates/times resolved to ISO ranges and, unless the
+    prefetched availability already covers them, the calendar events of those ranges: the agent
+    neither computes dates nor spends a ReAct step on list-events.
+    """
+    ranges = resolver.resolve(message)
+    if not ranges:
+        return ""
+    timezone_id = get_config("internal_timezone_id", "UTC")
+    note = format_resolved_ranges(ranges, timezone_id)
+    time_min, time_max = ranges[0].start, max(r.end for r in ranges)
+    if prefetched and (datetime.datetime.fromisoformat(prefetched["time_min"]) <= time_min
+                       and time_max <= datetime.datetime.fromisoformat(prefetched["time_max"])):
+        return note
+    if not get_config("temporal_resolver_fetch_availability", True):
+        return note
+    command = json.dumps({
+        "name": "list-events",
+        "arguments": {"timeMin": time_min.isoformat(), "timeMax": time_max.isoformat(), "expandRecurring": True},
+    })
+    with trace_span(session_id, "temporal_availability", turn_span, kind="CLIENT"):
+        events = await calendar_tool._arun(command)
+    if isinstance(events, str) and not events.startswith("Error"):
+        note += (
+            f"\n(Calendar events already fetched for {time_min.isoformat()} to {time_max.isoformat()}; "
+            f"use them to check these ranges without calling list-events again:\n{events})"
+        )
+    return note
+
+def record_partial_turn(session_id: str, state: str, enhanced_input: str, collected_data: dict):
+    """
+    Reply for a turn cut short by its latency budget (or iteration limit), recorded in the
+    session history in place of the executor's stop message. Returns (final_output, structured_output).
+    """
+    structured_output = None
+    budget_message = get_config("turn_budget_exceeded_message", TURN_BUDGET_EXCEEDED_MESSAGE) # Tenant's wording
+    final_output = budget_message
+    if state == "qualification":
+        # Keep what was collected so far; the next turn continues from there
+        structured_output = QualificationOutput(
+            chat_output=budget_message,
+            collected_data=CollectedData.model_validate(collected_data or {}),
+            done=False,
+        )
+        final_output = structured_output.model_dump_json()
+    history = get_session_history(session_id)
+    if history.messages and isinstance(history.messages[-1], AIMessage) and history.messages[-1].content == AGENT_STOPPED_OUTPUT:
+        history.messages.pop()
+    else:
+        # The executor was interrupted before the history wrapper could record the turn
+        history.add_user_message(enhanced_input)
+    history.add_ai_message(final_output)
+    return final_output, structured_output
+
 @app.websocket("/ws/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str):
+@app.websocket("/t/{tenant_id}/ws/{session_id}")
+async def websocket_endpoint(websocket: WebSocket, session_id: str, tenant_id: str = None):
     """Handles WebSocket connections for chat, supporting streaming."""
+    tenant_id = tenant_registry.resolve(host=websocket.headers.get("host"), path_tenant=tenant_id)
+    if tenant_id is None:
+        await websocket.close(code=4404) # Unknown tenant
+        return
     await websocket.accept()
-    logger.info(f"WebSocket connection accepted for session: {session_id}")
+    if drain_controller.draining:
+        # Shutting down: send the client to another worker before any session state exists here
+        await websocket.send_text(reconnect_notice())
+        await websocket.close(code=1012)
+        return
+    logger.info(f"WebSocket connection accepted for session: {session_id} (tenant: {tenant_id})")
 
     # Initialize session state and the first (qualification) agent executor
     try:
-        agent_executor = await initialize_session(session_id)
+        # Tenant components for the whole connection; executors and settings are refreshed per turn
+        tenant = await asyncio.to_thread(tenant_registry.get, tenant_id)
+        intent_router = tenant.intent_router
+        qualification_answer_cache = tenant.qualification_answer_cache
+        availability_prefetcher = tenant.availability_prefetcher
+        temporal_resolver = tenant.temporal_resolver
+        session_id = tenant.session_key(session_id)
+        # get_config() answers with the tenant's values for everything this connection runs
+        active_tenant_config.set(tenant.config)
+        # Calendar tool calls made on behalf of this connection lease slots to this session
+        current_session_id.set(session_id)
+        agent_executor = await initialize_session(session_id, tenant)
+        # Picks up where a drained worker left off (state, collected data and history)
+        await resume_session(session_id, tenant)
     except Exception as init_error:
         # Handle initialization error - inform client and close
         error_message = f"Failed to initialize agent session: {str(init_error)}"
@@ -118,104 +525,205 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
             logger.error(f"Could not send agent initialization error to client {session_id}: {send_err}")
         return # Stop processing if agent fails to initialize
 
+    live = drain_controller.register(session_id, websocket)
+    # Calendar writes made by this connection's turns are recorded on it (see drain.note_calendar_write)
+    current_live_session.set(live)
     try: # Top-level try block now starts AFTER agent initialization
         # Ensure session history exists
         get_session_history(session_id)
-        logger.info(f"Session history check complete for {session_id}")
+        logger.debug(f"Session history check complete for {session_id}")
 
         while True:
             data = await websocket.receive_text()
-            logger.info(f"Received message from {session_id}: {data}")
+            logger.info("Received message", extra={"session_id": session_id, **log_payload(message=data)})
+            live.pending_message = data
+            if drain_controller.draining:
+                # Not started here: the client resends it to the worker it reconnects to
+                await hand_off_session(live)
+                break
 
             # Get the current agent executor for the session
             # It might change if the state transitions
             current_executor = session_executors.get(session_id)
+            # Rebuilt after a config reload (or LRU eviction): new prompts apply, the session's history is kept
+            current_tenant = tenant_registry.get(tenant_id)
+            active_tenant_config.set(current_tenant.config)
+            if current_executor:
+                current_executor = session_executors[session_id] = executor_for_state(session_states.get(session_id, "qualification"), current_tenant)
             if not current_executor:
                  logger.error(f"Agent executor not found for session {session_id}. Reinitializing.")
                  try:
                      # Attempt re-initialization (might default to qualification)
-                     current_executor = await initialize_session(session_id)
+                     current_executor = await initialize_session(session_id, current_tenant)
                  except Exception as reinit_error:
                      error_message = f"Failed to re-initialize agent: {str(reinit_error)}"
                      await websocket.send_text(json.dumps({"type": "error", "message": error_message}))
                      await websocket.close(code=1011)
                      return
 
+            # From here on a drain cancels the turn instead of waiting for it past its deadline
+            live.turn_task = asyncio.current_task()
+            live.turn_wrote = False
+            turn_span = None # Root span of this turn (tracing)
+            turn_error = None
+            handled_by = None
             try: # Inner try for processing a single message
+                # Latency budget for the whole turn, inherited by every LLM / tool / API call below
+                turn_deadline = start_turn_deadline(
+                    agent_settings(session_states.get(session_id, "qualification"))["turn_budget_seconds"]
+                )
                 # <<< ADD Current Date/Time to input >>>
                 now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S %Z%z")
                 enhanced_input = f"(Current date and time: {now})\nUser query: {data}"
-                logger.info(f"Enhanced input for agent {session_id}: {enhanced_input}")
+                logger.debug("Enhanced input for agent", extra={"session_id": session_id, **log_payload(enhanced_input=enhanced_input)})
                 # <<< END ADD Current Date/Time >>>
 
                 # Prepare agent configuration for this specific session
                 config = {"configurable": {"session_id": session_id}}
-                logger.info(f"Prepared config for agent {session_id}")
+
+                if tracer:
+                    turn_span = tracer.start_span(session_id, "turn", kind="SERVER", state=session_states.get(session_id, "qualification"))
 
                 # Signal start of response generation
                 await websocket.send_text(json.dumps({"type": "start"}))
-                logger.info(f"Sent 'start' signal for {session_id}")
+                logger.debug(f"Sent 'start' signal for {session_id}")
 
                 # --- Agent Invocation and State Handling --- 
                 final_output = "(No output generated)" 
-                agent_response_json = None # To store parsed JSON if applicable
+                structured_output = None # Validated QualificationOutput (qualification state only)
                 
                 try:
-                    logger.info(f"Streaming/invoking {session_states.get(session_id, 'unknown')} agent for session {session_id}...")
-                    async for chunk in current_executor.astream({"input": enhanced_input}, config=config):
-                        if "output" in chunk and isinstance(chunk["output"], str):
-                            final_output = chunk["output"]
-                            
-                    logger.info(f"Agent execution finished for session {session_id}. Raw output length: {len(final_output)}")
+                    current_state = session_states.get(session_id, "qualification")
+
+                    previous_collected_data = session_collected_data.get(session_id, {})
+                    cache_stage = None
+                    cache_vector = None
+                    handled_without_agent = False
+
+                    # --- Fast path: greetings, confirmations and slot picks skip the ReAct agent ---
+                    if intent_router:
+                        with trace_span(session_id, "intent_router", turn_span):
+                            routed_reply = await intent_router.route(session_id, current_state, data, previous_collected_data)
+                        if routed_reply:
+                            if routed_reply.structured_output is not None:
+                                structured_output = routed_reply.structured_output
+                                final_output = structured_output.model_dump_json()
+                            else:
+                                final_output = routed_reply.message
+                            session_history = get_session_history(session_id)
+                            session_history.add_user_message(enhanced_input)
+                            session_history.add_ai_message(final_output)
+                            handled_without_agent = True
+                            handled_by = "intent_router"
+                            logger.info(f"Intent router handled '{routed_reply.intent}' turn for session {session_id}")
+
+                    # --- Semantic cache lookup (qualification FAQ turns) ---
+                    if not handled_without_agent and current_state == "qualification" and qualification_answer_cache:
+                        cache_stage = qualification_cache_stage(previous_collected_data)
+                        with trace_span(session_id, "semantic_cache_lookup", turn_span):
+                            cached_reply, cache_vector = await qualification_answer_cache.lookup(data, cache_stage)
+                        if cached_reply is not None:
+                            structured_output = QualificationOutput(
+                                chat_output=cached_reply,
+                                collected_data=CollectedData.model_validate(previous_collected_data),
+                                done=False
+                            )
+                            final_output = structured_output.model_dump_json()
+                            # Keep the conversation history coherent for the next agent turn
+                            session_history = get_session_history(session_id)
+                            session_history.add_user_message(enhanced_input)
+                            session_history.add_ai_message(final_output)
+                            handled_without_agent = True
+                            handled_by = "semantic_cache"
+                            logger.info(f"Served qualification turn from semantic cache for session {session_id}")
+
+                    if not handled_without_agent:
+                        handled_by = "agent"
+                        turn_context = "" # Appended to this turn's prompt only, not to the session history
+                        prefetched = None
+                        # First scheduling turn: answer from the availability prefetched on qualification
+                        if current_state == "scheduling" and availability_prefetcher:
+                            with trace_span(session_id, "availability_prefetch_wait", turn_span):
+                                prefetched = await availability_prefetcher.get_fresh(session_id)
+                            availability_prefetcher.discard(session_id)
+                            if prefetched:
+                                turn_context += (
+                                    f"\n(Calendar events already fetched for {prefetched['time_min']} to {prefetched['time_max']}; "
+                                    f"use them to propose available slots without calling list-events again:\n{prefetched['result']})"
+                                )
+                        # "amanhã às 15h", "próxima terça de manhã": resolved locally, with their availability
+                        if current_state == "scheduling" and temporal_resolver:
+                            turn_context += await resolved_dates_note(
+                                data, temporal_resolver, current_tenant.scheduling_tools[0], prefetched, session_id, turn_span
+                            )
+                        logger.info(f"Streaming/invoking {current_state} agent for session {session_id}...")
+                        if tracer:
+                            config["callbacks"] = [tracer.callback_handler(session_id, turn_span)]
+                        answer_streamer = None
+                        if current_state == "qualification" and get_config("stream_chat_output", True):
+                            answer_streamer = ChatOutputStreamer(lambda message: websocket.send_text(json.dumps(message)))
+                            config["callbacks"] = [*config.get("callbacks", []), answer_streamer]
+                        try:
+                            # Hard stop at the deadline even if a step ignores its timeout
+                            async with asyncio.timeout(turn_deadline.remaining() if turn_deadline else None):
+                                turn_stream = cascade_astream(
+                                    current_state, data, small_executor_for_state(current_state, current_tenant), current_executor,
+                                    {"input": enhanced_input, "turn_context": turn_context}, config, get_session_history(session_id),
+                                    response_model=QualificationOutput if current_state == "qualification" else None,
+                                    on_escalate=answer_streamer.reset if answer_streamer else None,
+                                )
+                                async for chunk in turn_stream:
+                                    if "output" in chunk and isinstance(chunk["output"], str):
+                                        final_output = chunk["output"]
+                                    if isinstance(chunk.get("structured_output"), QualificationOutput):
+                                        structured_output = chunk["structured_output"]
+                        except (TimeoutError, openai.APITimeoutError) as budget_error:
+                            if turn_deadline is None:
+                                raise
+                            logger.warning(f"Turn budget of {turn_deadline.budget_seconds}s exhausted for session {session_id}: {budget_error!r}")
+                            final_output = AGENT_STOPPED_OUTPUT
+                        if final_output == AGENT_STOPPED_OUTPUT and structured_output is None:
+                            # Budget or iteration limit hit: answer gracefully instead of failing the turn
+                            final_output, structured_output = record_partial_turn(
+                                session_id, current_state, enhanced_input, previous_collected_data
+                            )
+                            handled_without_agent = True # Nothing from this turn is cached or routed on
+                            handled_by = "turn_budget"
+
+                    logger.info("Agent turn finished", extra={"session_id": session_id, "state": current_state, "output_length": len(final_output)})
                     
                     # --- State-Specific Output Processing ---
-                    current_state = session_states.get(session_id, "qualification")
                     
                     if current_state == "qualification":
-                        # Log the raw output *before* trying to parse, adding markers for clarity
-                        logger.info(f"Processing QUALIFICATION agent output for {session_id}. Raw output:\n>>>\n{final_output}\n<<<" )
+                        # Output is schema-enforced and already validated by the agent's output parser
+                        logger.debug("Processing QUALIFICATION agent output", extra={"session_id": session_id, **log_payload(output=final_output)})
                         
-                        parsed_json = None
-                        try:
-                            # Attempt 1: Direct parse
-                            parsed_json = json.loads(final_output)
-                            logger.info(f"Direct JSON parse successful for {session_id}")
-                        except json.JSONDecodeError:
-                            logger.warning(f"Direct JSON parse failed for {session_id}. Trying markdown extraction...")
-                            try:
-                                # Attempt 2: Extract from markdown
-                                import re
-                                # Added re.IGNORECASE just in case
-                                match = re.search(r"```json\s*({.*?})\s*```", final_output, re.DOTALL | re.IGNORECASE)
-                                if match:
-                                    json_str = match.group(1)
-                                    parsed_json = json.loads(json_str) # Assign result here
-                                    logger.info(f"Successfully parsed JSON extracted from markdown for {session_id}")
-                                else:
-                                    logger.warning(f"Markdown extraction failed for {session_id}. No ```json block found.")
-                                    # parsed_json remains None
-                            except Exception as e_extract: # Catch potential regex or inner parse errors
-                                 logger.error(f"Error during markdown extraction/parsing for {session_id}: {e_extract}")
-                                 # parsed_json remains None
-
-                        # --- Check results of parsing attempts --- 
-                        if parsed_json and "chat_output" in parsed_json:
-                            # Ideal Path: Send extracted chat_output
-                            await websocket.send_text(json.dumps({"type": "final_answer", "message": parsed_json["chat_output"]}))
-                            logger.info(f"Sent 'chat_output' from qualification agent for {session_id}")
-
-                            # Check if qualification is done (only if parsing succeeded and chat_output present)
-                            if parsed_json.get("done") is True:
+                        if structured_output is not None:
+                            await websocket.send_text(json.dumps({"type": "final_answer", "message": structured_output.chat_output}))
+                            logger.debug(f"Sent 'chat_output' from qualification agent for {session_id}")
+
+                            # Only answers that collected nothing new (FAQ-style turns) are safe to reuse across sessions
+                            collected_now = structured_output.collected_data.model_dump()
+                            if (not handled_without_agent and qualification_answer_cache
+                                    and not structured_output.done
+                                    and collected_now == CollectedData.model_validate(previous_collected_data).model_dump()
+                                    and reply_is_shareable(structured_output.chat_output, collected_now)):
+                                qualification_answer_cache.store(cache_stage, cache_vector, structured_output.chat_output)
+                            session_collected_data[session_id] = collected_now
+
+                            # Check if qualification is done
+                            if structured_output.done:
                                 logger.info(f"Qualification marked as 'done' for session {session_id}. Calling API.")
-                                collected_data = parsed_json.get("collected_data", {})
+                                collected_data = collected_now
                                 
                                 # Call the qualification API
                                 async with httpx.AsyncClient() as client:
                                     try:
-                                        api_response = await client.post(QUALIFICATION_API_URL, json=collected_data, timeout=30.0) # Added timeout
-                                        api_response.raise_for_status() # Raise HTTP errors
+                                        with trace_span(session_id, "qualification_api", turn_span, kind="CLIENT"):
+                                            api_response = await client.post(get_config("qualification_api_url", QUALIFICATION_API_URL), json=collected_data, timeout=remaining_timeout(30.0)) # Capped by the turn budget
+                                            api_response.raise_for_status() # Raise HTTP errors
                                         qualification_result = api_response.json() # Assuming API returns JSON
-                                        logger.info(f"Qualification API call successful for {session_id}. Result: {qualification_result}")
+                                        logger.info("Qualification API call successful", extra={"session_id": session_id, **log_payload(result=qualification_result)})
                                         
                                         # --- Check qualification based on API response structure ---
                                         # Old: Assume API returns {'qualified': True/False}
@@ -228,13 +736,11 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                                             logger.info(f"User {session_id} QUALIFIED. Transitioning to scheduling agent.")
                                             session_states[session_id] = "scheduling"
                                             # Create and store the scheduling agent executor
-                                            logger.info(f"Creating SCHEDULING agent executor for session {session_id}...")
-                                            scheduling_executor = create_agent_executor_with_history(
-                                                system_prompt_template_str=SCHEDULING_PROMPT,
-                                                tools_list=scheduling_tools
-                                            )
+                                            scheduling_executor = executor_for_state("scheduling", current_tenant)
                                             session_executors[session_id] = scheduling_executor
                                             logger.info(f"Scheduling agent executor created and stored for session {session_id}.")
+                                            if availability_prefetcher:
+                                                availability_prefetcher.start(session_id)
                                             # Optionally send a transition message to the client
                                             # await websocket.send_text(json.dumps({"type": "info", "message": "Ótimo! Agora podemos verificar a agenda..."}))
                                             # Let the scheduling agent handle the next interaction naturally
@@ -242,12 +748,16 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                                         else:
                                             logger.info(f"User {session_id} NOT QUALIFIED. Sending message and closing.")
                                             # Format the 'not qualified' message
-                                            formatted_nq_message = NOT_QUALIFIED_MESSAGE_TEMPLATE.format(not_qualified_pdf_url=NOT_QUALIFIED_PDF_URL)
+                                            formatted_nq_message = get_config("not_qualified_message", NOT_QUALIFIED_MESSAGE_TEMPLATE).format(
+                                                not_qualified_pdf_url=get_config("not_qualified_pdf_url", NOT_QUALIFIED_PDF_URL)
+                                            )
                                             await websocket.send_text(json.dumps({"type": "final_answer", "message": formatted_nq_message}))
+                                            if tracer:
+                                                tracer.end_span(turn_span, **{"turn.handled_by": handled_by, "qualification.qualified": False})
                                             await websocket.close(code=1000) # Normal closure
                                             return # End the handler for this session
                                             
-                                    except httpx.RequestError as api_req_err:
+                                    except (httpx.RequestError, DeadlineExceeded) as api_req_err:
                                         logger.error(f"Qualification API request error for session {session_id}: {api_req_err}", exc_info=True)
                                         await websocket.send_text(json.dumps({"type": "error", "message": "Could not reach qualification service."}))
                                     except httpx.HTTPStatusError as api_stat_err:
@@ -256,12 +766,18 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                                     except json.JSONDecodeError as api_json_err:
                                         logger.error(f"Qualification API response JSON decode error for {session_id}: {api_json_err}", exc_info=True)
                                         await websocket.send_text(json.dumps({"type": "error", "message": "Invalid response from qualification service."}))
+                        else:
+                            # Only happens when the executor stopped early (iteration limit, refusal)
+                            logger.error(f"Qualification agent finished without a structured answer for {session_id}")
+                            await websocket.send_text(json.dumps({"type": "error", "message": "Could not process the qualification answer."}))
                                 
                     elif current_state == "scheduling":
-                        logger.info(f"Processing SCHEDULING agent output for {session_id}")
+                        logger.debug(f"Processing SCHEDULING agent output for {session_id}")
                         # Send the complete final answer from scheduling agent
                         await websocket.send_text(json.dumps({"type": "final_answer", "message": final_output}))
-                        logger.info(f"Sent final answer from scheduling agent for {session_id}")
+                        logger.debug(f"Sent final answer from scheduling agent for {session_id}")
+                        if intent_router and not handled_without_agent:
+                            await intent_router.observe_agent_reply(session_id, final_output)
                         
                     else: # Should not happen
                          logger.error(f"Invalid session state '{current_state}' for session {session_id}")
@@ -270,16 +786,21 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                 except Exception as agent_error:
                     logger.error(f"Agent execution error for session {session_id}: {agent_error}", exc_info=True)
                     error_message = f"An error occurred during processing: {str(agent_error)}"
+                    turn_error = error_message
                     await websocket.send_text(json.dumps({"type": "error", "message": error_message}))
                 
                 # Always send end signal regardless of success or error
                 await websocket.send_text(json.dumps({"type": "end"}))
-                logger.info(f"Sent 'end' signal for {session_id}")
+                logger.debug(f"Sent 'end' signal for {session_id}")
+                if tracer:
+                    tracer.end_span(turn_span, error=turn_error, **{"turn.handled_by": handled_by})
 
             except Exception as processing_error:
                 # Catch errors during message processing BEFORE streaming starts
                 logger.error(f"Error processing message for session {session_id}: {processing_error}", exc_info=True)
                 error_message = f"Failed to process message: {str(processing_error)}"
+                if tracer:
+                    tracer.end_span(turn_span, error=error_message)
                 # Try to send error to client, even if 'start' wasn't sent
                 try:
                     await websocket.send_text(json.dumps({"type": "error", "message": error_message}))
@@ -288,8 +809,22 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                 except Exception as send_err:
                     logger.error(f"Could not send processing error to client {session_id}: {send_err}")
 
+            live.turn_task = None
+            live.pending_message = None
+            if live.handed_off:
+                break # Handed off between the turn's last await and here; the client already reconnected elsewhere
+
     except WebSocketDisconnect:
         logger.info(f"Client disconnected for session: {session_id}")
+    except asyncio.CancelledError:
+        if not live.handed_off or live.turn_task is None:
+            raise
+        # The drain cancelled the turn at its deadline: finish the hand-off before the state is dropped
+        asyncio.current_task().uncancel()
+        live.turn_task = None
+        if tracer:
+            tracer.end_span(turn_span, error="Cancelled by drain")
+        await complete_hand_off(live)
     except Exception as e:
         # Catch errors happening outside the main message loop (e.g., during accept, get_session_history)
         logger.error(f"WebSocket error for session {session_id} (outside main loop): {e}", exc_info=True)
@@ -303,6 +838,8 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         except Exception as ws_send_error:
             logger.error(f"Could not send initial error to client {session_id}: {ws_send_error}")
     finally:
+        drain_controller.unregister(live)
+        live.closed.set()
         # Clean up session state and executor when client disconnects
         if session_id in session_states:
             del session_states[session_id]
@@ -310,9 +847,16 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         if session_id in session_executors:
             del session_executors[session_id]
             logger.info(f"Removed agent executor for session {session_id}")
+        session_collected_data.pop(session_id, None)
+        if availability_prefetcher:
+            availability_prefetcher.discard(session_id)
+        if intent_router:
+            intent_router.discard(session_id)
+        if slot_holds and not live.handed_off: # Handed-off sessions keep their holds (shared with Redis)
+            await asyncio.to_thread(slot_holds.release_session, session_id)
             
         # Ensure websocket is closed if it's still open
-        if websocket.client_state != WebSocketState.DISCONNECTED:
+        if websocket.client_state != WebSocketState.DISCONNECTED and not live.handed_off:
              logger.info(f"Closing WebSocket connection for session {session_id} in finally block.")
              await websocket.close()
 
@@ -0,0 +1,105 @@
+import os
+import uuid
+import asyncio
+import logging
+import itertools
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from config_loader import get_config
+from logging_setup import log_payload
+
+logger = logging.getLogger(__name__)
+
+
+class MCPHttpClient:
+    """
+    Pooled JSON-RPC client for MCP servers running as a service (MCP_TRANSPORT=http).
+
+    Keeps warm keep-alive connections to a few server instances and spreads calls over them
+    round-robin; a server that refuses connections is skipped for that call. The sync client is
+    used from worker threads (calendar tool, coalescer), the async one from the event loop.
+    Both are shared by every session of the process.
+    """
+
+    def __init__(self, urls: List[str], max_connections: int = 20, token: Optional[str] = None):
+        self.urls = [url.rstrip("/") + "/mcp" for url in urls]
+        self._next = itertools.count()
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self._client = httpx.Client(limits=self._limits, headers=self._headers)
+        self._async_clients: Dict[int, httpx.AsyncClient] = {}  # id(event loop) -> client
+        self._async_lock = threading.Lock()
+
+    def _ordered_urls(self) -> List[str]:
+        start = next(self._next) % len(self.urls)
+        return self.urls[start:] + self.urls[:start]
+
+    def _async_client(self) -> httpx.AsyncClient:
+        # An AsyncClient's connections belong to the loop that opened them
+        loop_id = id(asyncio.get_running_loop())
+        with self._async_lock:
+            client = self._async_clients.get(loop_id)
+            if client is None:
+                client = self._async_clients[loop_id] = httpx.AsyncClient(limits=self._limits, headers=self._headers)
+            return client
+
+    @staticmethod
+    def _request(tool_name: str, tool_args: dict) -> dict:
+        return {
+            "jsonrpc": "2.0",
+            "method": "tools/call",
+            "id": str(uuid.uuid4()),
+            "params": {"name": tool_name, "arguments": tool_args},
+        }
+
+    def call_tool(self, tool_name: str, tool_args: dict, timeout: float) -> dict:
+        """Blocking tools/call; returns the JSON-RPC response. Raises httpx errors when no server answers."""
+        request = self._request(tool_name, tool_args)
+        logger.debug("Sending MCP Request (http)", extra=log_payload(request=request))
+        last_error = None
+        for url in self._ordered_urls():
+            try:
+                response = self._client.post(url, json=request, timeout=timeout)
+                response.raise_for_status()
+                return response.json()
+            except httpx.ConnectError as e:
+                logger.warning(f"MCP server {url} unreachable, trying the next one: {e}")
+                last_error = e
+        raise last_error
+
+    async def acall_tool(self, tool_name: str, tool_args: dict, timeout: float) -> dict:
+        request = self._request(tool_name, tool_args)
+        logger.debug("Sending MCP Request (http)", extra=log_payload(request=request))
+        client = self._async_client()
+        last_error = None
+        for url in self._ordered_urls():
+            try:
+                response = await client.post(url, json=request, timeout=timeout)
+                response.raise_for_status()
+                return response.json()
+            except httpx.ConnectError as e:
+                logger.warning(f"MCP server {url} unreachable, trying the next one: {e}")
+                last_error = e
+        raise last_error
+
+
+# (urls, pool size) -> client; tenants pointing at the same servers share one pool
+_clients: Dict[Tuple[Tuple[str, ...], int], MCPHttpClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_mcp_http_client() -> Optional[MCPHttpClient]:
+    """Client for the current tenant's `mcp_server_urls`, or None to spawn stdio subprocesses."""
+    urls = get_config("mcp_server_urls", [])
+    if not urls:
+        return None
+    key = (tuple(urls), get_config("mcp_http_max_connections", 20))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = MCPHttpClient(list(urls), max_connections=key[1], token=os.getenv("MCP_HTTP_TOKEN"))
+            logger.info(f"Created pooled MCP HTTP client for {len(urls)} server(s)")
+        return client
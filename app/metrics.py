@@ -0,0 +1,62 @@
+import threading
+from typing import Dict, Iterable, Tuple
+
+
+class Counter:
+    """Monotonic counter with labels, exposed in the Prometheus text format."""
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            label_text = ",".join(f'{label}="{_escape(v)}"' for label, v in zip(self.labels, key))
+            lines.append(f"{self.name}{{{label_text}}} {value:g}" if label_text else f"{self.name} {value:g}")
+        return "\n".join(lines)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """Process-wide metrics; `GET /metrics` renders them for a Prometheus scraper."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str, labels: Iterable[str] = ()) -> Counter:
+        """Returns the counter registered under `name`, creating it on first use."""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Counter(name, description, labels)
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
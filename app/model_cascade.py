@@ -0,0 +1,151 @@
+import json
+import math
+import logging
+import contextlib
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+import openai
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config_loader import get_config
+from agent import AGENT_STOPPED_OUTPUT
+from deadlines import DeadlineExceeded
+from calendar_coalescing import WRITE_TOOLS
+from intent_router import normalize_text
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+cascade_turns = registry.counter(
+    "llm_cascade_turns_total",
+    "Agent turns by the model tier that answered them (small, escalated, large) and escalation reason.",
+    labels=("agent", "outcome", "reason"),
+)
+
+
+@dataclass
+class CascadeSettings:
+    """Per-agent cascade config: `<agent>_cascade_model` and `<agent>_cascade_*` thresholds."""
+    small_model: str = ""
+    max_words: int = 30
+    complex_keywords: List[str] = field(default_factory=list)
+    max_tool_calls: int = 1
+    min_confidence: float = 0.0
+
+    @classmethod
+    def for_agent(cls, agent_name: str) -> "CascadeSettings":
+        return cls(
+            small_model=get_config(f"{agent_name}_cascade_model", ""),
+            max_words=get_config(f"{agent_name}_cascade_max_words", 30),
+            complex_keywords=[normalize_text(k) for k in get_config(f"{agent_name}_cascade_complex_keywords", [])],
+            max_tool_calls=get_config(f"{agent_name}_cascade_max_tool_calls", 1),
+            min_confidence=get_config(f"{agent_name}_cascade_min_confidence", 0.0),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.small_model)
+
+    def is_simple(self, message: str) -> bool:
+        """Short messages without a complexity keyword (reschedule, cancel, ...) try the small model first."""
+        text = normalize_text(message)
+        if len(text.split()) > self.max_words:
+            return False
+        padded = f" {text} "
+        return not any(f" {keyword} " in padded for keyword in self.complex_keywords)
+
+
+class ConfidenceProbe(BaseCallbackHandler):
+    """Keeps the mean token probability of the last LLM call (the one that produced the answer)."""
+
+    def __init__(self):
+        self.confidence: Optional[float] = None
+
+    def on_llm_end(self, response, **kwargs):
+        logprobs = []
+        for generations in response.generations or []:
+            for generation in generations:
+                info = (generation.generation_info or {}).get("logprobs") \
+                    or getattr(getattr(generation, "message", None), "response_metadata", {}).get("logprobs") or {}
+                logprobs.extend(token["logprob"] for token in info.get("content") or [])
+        # Geometric mean of the token probabilities; None when the API returned no logprobs
+        self.confidence = math.exp(sum(logprobs) / len(logprobs)) if logprobs else None
+
+
+def _is_write(tool_input) -> bool:
+    try:
+        return json.loads(tool_input).get("name") in WRITE_TOOLS
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+async def _try_small(executor, inputs: dict, config: dict, settings: CascadeSettings,
+                     response_model) -> Tuple[List[dict], Optional[str]]:
+    """
+    Runs the small-model executor, buffering its chunks. Returns (chunks, escalation reason or None).
+    Stops before a tool runs when the turn proves complex, so nothing the large model redoes has side effects.
+    """
+    probe = ConfidenceProbe()
+    small_config = {**config, "callbacks": [*config.get("callbacks", []), probe]}
+    chunks, tool_calls = [], 0
+    final_output, structured_output = None, None
+    try:
+        async with contextlib.aclosing(executor.astream(inputs, config=small_config)) as stream:
+            async for chunk in stream:
+                for step in chunk.get("steps", []):
+                    if step.action.tool == "_Exception": # Unparseable step (handle_parsing_errors)
+                        return chunks, "parse_error"
+                for action in chunk.get("actions", []):
+                    tool_calls += 1
+                    if tool_calls > settings.max_tool_calls:
+                        return chunks, "tool_calls"
+                    if _is_write(action.tool_input):
+                        return chunks, "write_action" # Bookings are left to the large model
+                if isinstance(chunk.get("output"), str):
+                    final_output = chunk["output"]
+                if chunk.get("structured_output") is not None:
+                    structured_output = chunk["structured_output"]
+                chunks.append(chunk)
+    except (TimeoutError, DeadlineExceeded, openai.APITimeoutError):
+        raise # The turn budget is gone: no time left to escalate
+    except (openai.APIError, ValueError) as e:
+        logger.warning(f"Small model failed, escalating: {e!r}")
+        return chunks, "error"
+    if final_output is None or final_output == AGENT_STOPPED_OUTPUT:
+        return chunks, "stopped"
+    if response_model is not None and not isinstance(structured_output, response_model):
+        return chunks, "schema"
+    if probe.confidence is not None and probe.confidence < settings.min_confidence:
+        return chunks, "low_confidence"
+    return chunks, None
+
+
+async def cascade_astream(agent_name: str, message: str, small_executor, large_executor, inputs: dict, config: dict,
+                          history, response_model=None, on_escalate: Optional[Callable[[], Awaitable]] = None) -> AsyncIterator[dict]:
+    """
+    Streams one agent turn. Simple turns run on the small model first; its answer is used unless it
+    stopped early, failed the output schema, had low confidence or needed complex tool use. Then
+    the history entries it wrote are rolled back and the turn reruns on the large model
+    (`on_escalate` is awaited first, e.g. to retract text already streamed to the client).
+    """
+    settings = CascadeSettings.for_agent(agent_name)
+    if small_executor is None or not settings.enabled or not settings.is_simple(message):
+        cascade_turns.inc(agent=agent_name, outcome="large", reason="")
+        async for chunk in large_executor.astream(inputs, config=config):
+            yield chunk
+        return
+    history_length = len(history.messages)
+    chunks, reason = await _try_small(small_executor, inputs, config, settings, response_model)
+    if reason is None:
+        cascade_turns.inc(agent=agent_name, outcome="small", reason="")
+        for chunk in chunks:
+            yield chunk
+        return
+    logger.info(f"Escalating {agent_name} turn to the large model: {reason}")
+    cascade_turns.inc(agent=agent_name, outcome="escalated", reason=reason)
+    del history.messages[history_length:] # The large model answers the same turn from the same history
+    if on_escalate:
+        await on_escalate()
+    async for chunk in large_executor.astream(inputs, config=config):
+        yield chunk
@@ -0,0 +1,49 @@
+from pydantic import BaseModel, ConfigDict
+
+
+class CollectedData(BaseModel):
+    """Lead data collected by the qualification agent (empty string == not collected yet)."""
+    model_config = ConfigDict(extra="forbid")
+
+    acesso_computador: str = ""
+    nivel_ingles: str = ""
+    area_atuacao: str = ""
+    renda_mensal: str = ""
+    plano_estudo: str = ""
+    idade: str = ""
+    satisfacao_emprego: str = ""
+    experiencia_em_tecnologia: str = ""
+
+
+class QualificationOutput(BaseModel):
+    """Final answer of the qualification agent for one turn."""
+    model_config = ConfigDict(extra="forbid")
+
+    # chat_output comes first so it is generated (and can be shown) before the metadata
+    chat_output: str
+    collected_data: CollectedData
+    done: bool
+
+
+def strict_json_schema(model: type) -> dict:
+    """
+    JSON schema of a pydantic model in the shape required by OpenAI's strict
+    structured output mode: every property required, no additional properties,
+    and no unsupported keywords (title, default).
+    """
+    def _strictify(node):
+        if isinstance(node, dict):
+            if isinstance(node.get("title"), str):
+                node.pop("title")
+            node.pop("default", None)
+            if node.get("type") == "object" and "properties" in node:
+                node["required"] = list(node["properties"].keys())
+                node["additionalProperties"] = False
+            for value in node.values():
+                _strictify(value)
+        elif isinstance(node, list):
+            for value in node:
+                _strictify(value)
+        return node
+
+    return _strictify(model.model_json_schema())
@@ -0,0 +1,185 @@
+import time
+import hashlib
+import logging
+import asyncio
+import weakref
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import httpx
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+
+from config_loader import get_config
+
+logger = logging.getLogger(__name__)
+
+# Caches that want to hear about fresh sitemap content (see notify_source_content). Weak: a cache
+# dropped with its tenant context (config reload, LRU eviction) leaves the set with it
+_registered_caches: "weakref.WeakSet[SemanticResponseCache]" = weakref.WeakSet()
+
+
+class SemanticResponseCache:
+    """
+    Semantic cache of agent replies keyed on the embedding of the user query plus
+    a conversation stage label.
+
+    A lookup is a hit when a non-expired entry of the same stage has a cosine
+    similarity >= similarity_threshold with the query. The cache is bounded (LRU
+    eviction) and is cleared whenever the content behind source_url changes.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        similarity_threshold: float = 0.93,
+        ttl_seconds: float = 3600,
+        max_entries: int = 512,
+        min_query_words: int = 3,
+        source_url: str = "",
+        source_check_interval_seconds: float = 300,
+    ):
+        self._embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.min_query_words = min_query_words
+        self.source_url = source_url
+        self.source_check_interval_seconds = source_check_interval_seconds
+
+        # entry_id -> {"stage", "vector", "response", "created_at"}; order == LRU order
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._next_entry_id = 0
+        self._source_digest: Optional[str] = None
+        self._source_etag: Optional[str] = None
+        self._last_source_check = 0.0
+        self._source_check_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        _registered_caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def is_cacheable_query(self, query: str) -> bool:
+        """Very short messages ("sim", "ok") only make sense in context, never cache them."""
+        return len(self._normalize_query(query).split()) >= self.min_query_words
+
+    async def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(await self._embeddings.aembed_query(self._normalize_query(query)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _prune_expired(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry["created_at"] < cutoff]
+        for entry_id in expired:
+            del self._entries[entry_id]
+
+    async def lookup(self, query: str, stage: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Returns (cached_response, query_vector). cached_response is None on a miss;
+        query_vector can be handed back to store() so a miss costs a single embedding call.
+        """
+        if not self.is_cacheable_query(query):
+            return None, None
+        try:
+            await self.refresh_source_digest()
+            vector = await self._embed(query)
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup skipped, embedding/source check failed: {e}")
+            return None, None
+
+        self._prune_expired()
+        candidates = [(entry_id, entry) for entry_id, entry in self._entries.items() if entry["stage"] == stage]
+        if candidates:
+            matrix = np.stack([entry["vector"] for _, entry in candidates])
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                entry_id, entry = candidates[best]
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                logger.info(f"Semantic cache hit (stage={stage}, similarity={scores[best]:.3f})")
+                return entry["response"], vector
+
+        self.misses += 1
+        return None, vector
+
+    def store(self, stage: str, vector: Optional[np.ndarray], response: str):
+        if vector is None:
+            return
+        self._entries[self._next_entry_id] = {
+            "stage": stage,
+            "vector": vector,
+            "response": response,
+            "created_at": time.monotonic(),
+        }
+        self._next_entry_id += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        if self._entries:
+            logger.info(f"Semantic cache invalidated ({len(self._entries)} entries dropped)")
+        self._entries.clear()
+
+    def observe_source_content(self, content: bytes):
+        """Records the digest of the source data, clearing the cache if it changed."""
+        digest = hashlib.sha256(content).hexdigest()
+        if self._source_digest is not None and digest != self._source_digest:
+            logger.info("Sitemap source content changed, invalidating semantic cache.")
+            self.invalidate()
+        self._source_digest = digest
+        self._last_source_check = time.monotonic()
+
+    async def refresh_source_digest(self):
+        """Re-validates the source URL at most once per source_check_interval_seconds."""
+        if not self.source_url:
+            return
+        if time.monotonic() - self._last_source_check < self.source_check_interval_seconds:
+            return
+        async with self._source_check_lock:
+            if time.monotonic() - self._last_source_check < self.source_check_interval_seconds:
+                return
+            headers = {"If-None-Match": self._source_etag} if self._source_etag else {}
+            async with httpx.AsyncClient() as client:
+                response = await client.get(self.source_url, headers=headers, timeout=10.0)
+            if response.status_code == 304:
+                self._last_source_check = time.monotonic()
+                return
+            response.raise_for_status()
+            self._source_etag = response.headers.get("etag")
+            self.observe_source_content(response.content)
+
+
+def notify_source_content(source_url: str, content: bytes):
+    """Called by tools that fetched source_url, so caches built on it stay in sync for free."""
+    for cache in list(_registered_caches):
+        if cache.source_url == source_url:
+            cache.observe_source_content(content)
+
+
+def create_semantic_cache_from_config() -> Optional[SemanticResponseCache]:
+    """Builds the qualification answer cache from config.json, or None if disabled."""
+    if not get_config("semantic_cache_enabled", False):
+        return None
+    try:
+        embeddings = OpenAIEmbeddings(model=get_config("semantic_cache_embedding_model", "text-embedding-3-small"))
+    except Exception as e:
+        logger.error(f"Could not create embeddings client for semantic cache, cache disabled: {e}")
+        return None
+    return SemanticResponseCache(
+        embeddings,
+        similarity_threshold=get_config("semantic_cache_similarity_threshold", 0.93),
+        ttl_seconds=get_config("semantic_cache_ttl_seconds", 3600),
+        max_entries=get_config("semantic_cache_max_entries", 512),
+        min_query_words=get_config("semantic_cache_min_query_words", 3),
+        source_url=get_config("vector_store_data_url", ""),
+        source_check_interval_seconds=get_config("semantic_cache_source_check_interval_seconds", 300),
+    )
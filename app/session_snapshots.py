@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+from config_loader import get_config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SessionSnapshot:
+    """What a new worker needs to continue a conversation: agent state, collected data and history."""
+    session_id: str
+    state: str
+    collected_data: dict = field(default_factory=dict)
+    messages: List[dict] = field(default_factory=list)  # langchain messages_to_dict() form
+    saved_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def capture(cls, session_id: str, state: str, collected_data: dict, history) -> "SessionSnapshot":
+        return cls(session_id=session_id, state=state, collected_data=dict(collected_data or {}),
+                   messages=messages_to_dict(history.messages))
+
+    def restore_history(self, history):
+        """Refills an empty history (a fresh worker); a history that survived is left alone."""
+        if not history.messages:
+            history.add_messages(messages_from_dict(self.messages))
+
+
+class FileSessionSnapshotStore:
+    """
+    Snapshots as JSON files in a directory shared by the workers (e.g. a volume). Files are
+    written to a temp name and renamed, so a reader never sees a partial snapshot.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float = 3600):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        # Session keys may contain ':' (tenants) or anything the client sent: hash them
+        return os.path.join(self.directory, hashlib.sha256(session_id.encode("utf-8")).hexdigest() + ".json")
+
+    def save(self, snapshot: SessionSnapshot):
+        path = self._path(snapshot.session_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(snapshot), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def pop(self, session_id: str) -> Optional[SessionSnapshot]:
+        """Loads and deletes the session's snapshot (None when missing or expired)."""
+        path = self._path(session_id)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            os.remove(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"Unreadable session snapshot for {session_id}: {e}")
+            return None
+        if time.time() - data.get("saved_at", 0) > self.ttl_seconds:
+            return None
+        return SessionSnapshot(**data)
+
+
+class RedisSessionSnapshotStore:
+    """Same interface, in Redis with a TTL: for replicas that share no filesystem."""
+
+    def __init__(self, client, ttl_seconds: float = 3600, prefix: str = "session_snapshot"):
+        self._client = client
+        self.ttl_seconds = ttl_seconds
+        self._prefix = prefix
+
+    def save(self, snapshot: SessionSnapshot):
+        self._client.set(f"{self._prefix}:{snapshot.session_id}", json.dumps(asdict(snapshot), ensure_ascii=False),
+                         ex=int(self.ttl_seconds))
+
+    def pop(self, session_id: str) -> Optional[SessionSnapshot]:
+        key = f"{self._prefix}:{session_id}"
+        pipeline = self._client.pipeline()
+        pipeline.get(key)
+        pipeline.delete(key)
+        raw, _ = pipeline.execute()
+        return SessionSnapshot(**json.loads(raw)) if raw else None
+
+
+def create_session_snapshot_store_from_config():
+    """Snapshot store for drain hand-offs, or None when disabled."""
+    if not get_config("session_snapshots_enabled", True):
+        return None
+    ttl_seconds = get_config("session_snapshot_ttl_seconds", 3600)
+    redis_url = get_config("session_snapshots_redis_url", "")
+    if redis_url:
+        try:
+            import redis  # optional: only needed when replicas share no filesystem
+            return RedisSessionSnapshotStore(redis.Redis.from_url(redis_url), ttl_seconds=ttl_seconds)
+        except ImportError:
+            logger.error("session_snapshots_redis_url is set but the redis package is not installed; using session_snapshots_dir")
+    return FileSessionSnapshotStore(get_config("session_snapshots_dir", "/usr/src/app/.sessions"), ttl_seconds=ttl_seconds)
@@ -0,0 +1,300 @@
+"""
+Offline vector index for the sitemap tool.
+
+Build (offline, e.g. in CI or an init container):
+
+    python sitemap_index.py build --out /usr/src/app/sitemap_index
+    python sitemap_index.py build --sitemap https://tripleten.com.br/sitemap.xml --out ./sitemap_index
+
+Each build writes a new version next to the previous ones:
+
+    index-<version>.f32   float32 matrix (count x dim), row-normalized, C order
+    index-<version>.json  sidecar: model, dim, count, source and the chunk metadata/text
+    current.json          {"version": ...}, replaced atomically when the build finishes
+
+At runtime SitemapVectorIndex opens the current version with numpy.memmap, so the matrix
+lives in the OS page cache and is shared by every worker on the node, and startup does not
+depend on fetching vector_store_data_url.
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import datetime
+from html.parser import HTMLParser
+from typing import List, Optional
+from xml.etree import ElementTree
+
+import httpx
+import numpy as np
+
+from config_loader import get_config
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+CURRENT_POINTER = "current.json"
+
+
+# --- Runtime ---
+
+class SitemapVectorIndex:
+    """Read-only, memory-mapped view of one index version."""
+
+    def __init__(self, directory: str, version: str, metadata: dict, matrix: np.ndarray):
+        self.directory = directory
+        self.version = version
+        self.metadata = metadata
+        self.matrix = matrix
+        self.chunks = metadata["chunks"]
+        self.model = metadata["model"]
+
+    @classmethod
+    def open(cls, directory: str) -> "SitemapVectorIndex":
+        with open(os.path.join(directory, CURRENT_POINTER), encoding="utf-8") as f:
+            version = json.load(f)["version"]
+        with open(os.path.join(directory, f"index-{version}.json"), encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format {metadata.get('format_version')} in {directory}")
+        matrix = np.memmap(
+            os.path.join(directory, f"index-{version}.f32"),
+            dtype=np.float32,
+            mode="r",
+            shape=(metadata["count"], metadata["dim"]),
+        )
+        return cls(directory, version, metadata, matrix)
+
+    def scores(self, query_vector) -> np.ndarray:
+        """Cosine similarity of every chunk with the query (rows are stored normalized)."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(len(self.chunks), dtype=np.float32)
+        return self.matrix @ (query / norm)
+
+    def search(self, query_vector, top_k: int = 5) -> List[dict]:
+        """Top-k chunks by cosine similarity."""
+        if len(self.chunks) == 0:
+            return []
+        scores = self.scores(query_vector)
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [{**self.chunks[i], "score": round(float(scores[i]), 4)} for i in best]
+
+
+def load_sitemap_index_from_config() -> Optional[SitemapVectorIndex]:
+    """Opens the index configured in vector_store_index_dir, or None (live fetch is used instead)."""
+    directory = get_config("vector_store_index_dir", "")
+    if not directory:
+        return None
+    try:
+        index = SitemapVectorIndex.open(directory)
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Could not open sitemap index in {directory}, falling back to live fetch: {e}")
+        return None
+    logger.info(f"Opened sitemap index {index.version} ({len(index.chunks)} chunks, model {index.model})")
+    return index
+
+
+# --- Ingestion ---
+
+class _TextExtractor(HTMLParser):
+    """Visible text and <title> of an HTML page."""
+
+    SKIPPED_TAGS = {"script", "style", "noscript", "svg", "nav", "footer", "header"}
+    BLOCK_TAGS = {"p", "div", "section", "article", "li", "h1", "h2", "h3", "h4", "br", "tr"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.title = ""
+        self._skip_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data.strip()
+        elif not self._skip_depth:
+            self.parts.append(data)
+
+    def text(self) -> str:
+        lines = (re.sub(r"\s+", " ", line).strip() for line in "".join(self.parts).split("\n"))
+        return "\n".join(line for line in lines if line)
+
+
+def documents_from_json(data, url: str = "") -> List[dict]:
+    """
+    Pulls {"url", "title", "text"} documents out of the vector_store_data_url payload, whatever
+    its nesting: any object with a text-like field is a document.
+    """
+    documents = []
+    if isinstance(data, dict):
+        text = next((data[key] for key in ("text", "content", "chunk", "page_content") if isinstance(data.get(key), str)), None)
+        if text:
+            metadata = data.get("metadata") if isinstance(data.get("metadata"), dict) else {}
+            documents.append({
+                "url": data.get("url") or data.get("source") or metadata.get("url") or metadata.get("source") or url,
+                "title": data.get("title") or metadata.get("title") or "",
+                "text": text,
+            })
+        else:
+            for value in data.values():
+                documents.extend(documents_from_json(value, url))
+    elif isinstance(data, list):
+        for item in data:
+            documents.extend(documents_from_json(item, url))
+    return documents
+
+
+def documents_from_sitemap(sitemap_url: str, max_pages: int) -> List[dict]:
+    documents = []
+    with httpx.Client(timeout=30.0, follow_redirects=True) as client:
+        pending, page_urls = [sitemap_url], []
+        while pending and len(page_urls) < max_pages:
+            root = ElementTree.fromstring(client.get(pending.pop()).content)
+            for loc in root.iter("{http://www.sitemaps.org/schemas/sitemap/0.9}loc"):
+                target = (loc.text or "").strip()
+                # Sitemap indexes point at further sitemaps
+                (pending if target.endswith(".xml") else page_urls).append(target)
+        for page_url in page_urls[:max_pages]:
+            try:
+                response = client.get(page_url)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                logger.warning(f"Skipping {page_url}: {e}")
+                continue
+            extractor = _TextExtractor()
+            extractor.feed(response.text)
+            if extractor.text():
+                documents.append({"url": page_url, "title": extractor.title, "text": extractor.text()})
+    return documents
+
+
+def chunk_text(text: str, max_chars: int = 1200, overlap_chars: int = 150) -> List[str]:
+    """Packs paragraphs (split into sentences when too long) into chunks of at most max_chars."""
+    pieces = []
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= max_chars:
+            if paragraph:
+                pieces.append(paragraph)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            # Sentences that are still too long are cut hard
+            pieces.extend(sentence[start:start + max_chars] for start in range(0, len(sentence), max_chars))
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            # Carry the tail of the previous chunk so answers spanning a boundary stay retrievable
+            tail = current[-overlap_chars:].split(" ", 1)[-1] if overlap_chars else ""
+            current = f"{tail} {piece}".strip() if len(tail) + 1 + len(piece) <= max_chars else piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_documents(documents: List[dict]) -> List[dict]:
+    return [
+        {"url": document["url"], "title": document.get("title", ""), "text": text}
+        for document in documents
+        for text in chunk_text(document["text"])
+    ]
+
+
+def build_index(documents: List[dict], out_dir: str, model: str, source: str, batch_size: int = 128) -> str:
+    from langchain_openai import OpenAIEmbeddings  # only needed when building
+
+    chunks = chunk_documents(documents)
+    if not chunks:
+        raise ValueError("No text found to index")
+
+    embeddings = OpenAIEmbeddings(model=model)
+    vectors = []
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start:start + batch_size]
+        vectors.extend(embeddings.embed_documents([f"{c['title']}\n{c['text']}".strip() for c in batch]))
+        logger.info(f"Embedded {min(start + batch_size, len(chunks))}/{len(chunks)} chunks")
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    os.makedirs(out_dir, exist_ok=True)
+    version = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    matrix_path = os.path.join(out_dir, f"index-{version}.f32")
+    mapped = np.memmap(matrix_path, dtype=np.float32, mode="w+", shape=matrix.shape)
+    mapped[:] = matrix
+    mapped.flush()
+    del mapped
+    with open(os.path.join(out_dir, f"index-{version}.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "format_version": INDEX_FORMAT_VERSION,
+            "version": version,
+            "created_at": time.time(),
+            "model": model,
+            "dim": int(matrix.shape[1]),
+            "count": int(matrix.shape[0]),
+            "source": source,
+            "chunks": chunks,
+        }, f, ensure_ascii=False)
+
+    # Readers only ever see a complete version
+    pointer_tmp = os.path.join(out_dir, CURRENT_POINTER + ".tmp")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version}, f)
+    os.replace(pointer_tmp, os.path.join(out_dir, CURRENT_POINTER))
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the memory-mapped sitemap vector index.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="ingest, chunk, embed and write a new index version")
+    build.add_argument("--out", default=get_config("vector_store_index_dir", "") or "sitemap_index")
+    build.add_argument("--data-url", default=get_config("vector_store_data_url", ""),
+                       help="JSON document to ingest (default: vector_store_data_url)")
+    build.add_argument("--sitemap", help="crawl this sitemap.xml instead of --data-url")
+    build.add_argument("--max-pages", type=int, default=500)
+    build.add_argument("--model", default=get_config("vector_store_embedding_model", "text-embedding-3-small"))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.sitemap:
+        source = args.sitemap
+        documents = documents_from_sitemap(args.sitemap, args.max_pages)
+    elif args.data_url:
+        source = args.data_url
+        response = httpx.get(args.data_url, timeout=60.0)
+        response.raise_for_status()
+        documents = documents_from_json(response.json(), url=args.data_url)
+    else:
+        parser.error("no source: pass --sitemap or --data-url (or set vector_store_data_url)")
+    logger.info(f"Ingested {len(documents)} documents from {source}")
+
+    version = build_index(documents, args.out, args.model, source)
+    print(f"Wrote index version {version} to {args.out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+import json
+import time
+import bisect
+import logging
+import datetime
+import threading
+import contextvars
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from config_loader import get_config
+
+logger = logging.getLogger(__name__)
+
+# Session whose turn is running; set once per WebSocket connection in main.py and inherited by
+# tool calls (asyncio tasks and to_thread copy the context)
+current_session_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_session_id", default=None)
+
+
+@dataclass(frozen=True)
+class SlotHold:
+    """A short lease on [start, end) (epoch seconds) of one calendar for one session."""
+    calendar_id: str
+    start: float
+    end: float
+    session_id: str
+    expires_at: float
+
+
+def parse_slot_time(value: str, timezone_id: str = "UTC") -> float:
+    """ISO date-time (with or without offset) -> epoch seconds; naive values use timezone_id."""
+    parsed = datetime.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=ZoneInfo(timezone_id))
+    return parsed.timestamp()
+
+
+def format_holds_as_events(holds: List[SlotHold], timezone_id: str = "UTC") -> str:
+    """Held slots in the MCP server's event list format, so readers treat them as busy."""
+    timezone = ZoneInfo(timezone_id)
+    entries = []
+    for hold in holds:
+        start = datetime.datetime.fromtimestamp(hold.start, timezone).isoformat()
+        end = datetime.datetime.fromtimestamp(hold.end, timezone).isoformat()
+        entries.append(f"Horário reservado em outra conversa (hold)\nStart: {start}\nEnd: {end}\n")
+    return "\n".join(entries)
+
+
+class _CalendarHolds:
+    """Holds of one calendar, sorted by start. Live holds never overlap each other."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.starts: List[float] = []
+        self.holds: List[SlotHold] = []
+        self.next_sweep = 0.0
+
+    def overlapping(self, start: float, end: float) -> range:
+        # The only hold starting before `start` that can overlap is the one right before it
+        first = max(bisect.bisect_left(self.starts, start) - 1, 0)
+        last = bisect.bisect_left(self.starts, end, lo=first)
+        return range(first, last)
+
+
+class SlotHoldTable:
+    """
+    In-process slot-hold table: a slot offered to (or being booked by) one session is leased to
+    it for `lease_seconds` (or the lease given to acquire), and other sessions see it as busy
+    until the lease expires, is renewed or is released.
+
+    Each calendar keeps its holds in a start-sorted list guarded by its own lock, so a conflict
+    check is a bisect (O(log n)) plus the few neighbours that can overlap, and sessions booking
+    on different calendars never contend. Expired leases are dropped lazily.
+    """
+
+    def __init__(self, lease_seconds: float = 300):
+        self.lease_seconds = lease_seconds
+        self._calendars: Dict[str, _CalendarHolds] = defaultdict(_CalendarHolds)
+        self._calendars_lock = threading.Lock()
+        # session_id -> {(calendar_id, start)}, for release_session
+        self._by_session = defaultdict(set)
+        self._sessions_lock = threading.Lock()
+
+    def _calendar(self, calendar_id: str) -> _CalendarHolds:
+        with self._calendars_lock:
+            return self._calendars[calendar_id]
+
+    def _remove_at(self, holds: _CalendarHolds, index: int):
+        hold = holds.holds.pop(index)
+        del holds.starts[index]
+        with self._sessions_lock:
+            self._by_session[hold.session_id].discard((hold.calendar_id, hold.start))
+
+    def _sweep(self, holds: _CalendarHolds, now: float):
+        """Drops every expired hold of the calendar, at most once per lease period."""
+        if now < holds.next_sweep:
+            return
+        holds.next_sweep = now + self.lease_seconds
+        for index in range(len(holds.holds) - 1, -1, -1):
+            if holds.holds[index].expires_at <= now:
+                self._remove_at(holds, index)
+
+    def acquire(self, calendar_id: str, start: float, end: float, session_id: str,
+                lease_seconds: Optional[float] = None) -> bool:
+        """
+        Leases [start, end) to the session. Renews (or replaces) the session's own overlapping
+        holds; returns False without changes if another session holds an overlapping slot.
+        """
+        now = time.time()
+        lease_seconds = self.lease_seconds if lease_seconds is None else lease_seconds
+        holds = self._calendar(calendar_id)
+        with holds.lock:
+            self._sweep(holds, now)
+            stale = []
+            for index in holds.overlapping(start, end):
+                hold = holds.holds[index]
+                if hold.end <= start:
+                    continue
+                if hold.expires_at > now and hold.session_id != session_id:
+                    return False
+                stale.append(index)
+            for index in reversed(stale):
+                self._remove_at(holds, index)
+            hold = SlotHold(calendar_id, start, end, session_id, now + lease_seconds)
+            index = bisect.bisect_left(holds.starts, start)
+            holds.starts.insert(index, start)
+            holds.holds.insert(index, hold)
+            with self._sessions_lock:
+                self._by_session[session_id].add((calendar_id, start))
+        return True
+
+    def holds_between(self, calendar_id: str, start: float, end: float,
+                      exclude_session: Optional[str] = None) -> List[SlotHold]:
+        """Live holds overlapping [start, end), optionally without the given session's own."""
+        now = time.time()
+        holds = self._calendar(calendar_id)
+        with holds.lock:
+            return [
+                hold for hold in (holds.holds[index] for index in holds.overlapping(start, end))
+                if hold.end > start and hold.expires_at > now and hold.session_id != exclude_session
+            ]
+
+    def _release(self, calendar_id: str, start: float, session_id: str):
+        holds = self._calendar(calendar_id)
+        with holds.lock:
+            index = bisect.bisect_left(holds.starts, start)
+            if index < len(holds.holds) and holds.holds[index].session_id == session_id:
+                hold = holds.holds.pop(index)
+                del holds.starts[index]
+                logger.debug(f"Released hold {hold.start}-{hold.end} on {calendar_id} for session {session_id}")
+
+    def release(self, calendar_id: str, start: float, session_id: str):
+        """Drops the session's hold starting at `start`, if it still has one."""
+        with self._sessions_lock:
+            self._by_session[session_id].discard((calendar_id, start))
+        self._release(calendar_id, start, session_id)
+
+    def release_session(self, session_id: str):
+        with self._sessions_lock:
+            owned = self._by_session.pop(session_id, set())
+        for calendar_id, start in owned:
+            self._release(calendar_id, start, session_id)
+
+
+# Atomic check-and-lease. Members are JSON holds scored by their end time, so the holds that
+# can overlap [start, end) are the first ones scored above `start`.
+_REDIS_ACQUIRE_SCRIPT = """
+local key, start, finish, session, now = KEYS[1], tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3], tonumber(ARGV[4])
+local done = false
+while not done do
+  local members = redis.call('ZRANGEBYSCORE', key, '(' .. ARGV[1], '+inf', 'LIMIT', 0, 32)
+  done = #members < 32
+  for _, member in ipairs(members) do
+    local hold = cjson.decode(member)
+    if hold.start >= finish then
+      done = true
+      break
+    end
+    if hold.expires_at > now and hold.session_id ~= session then
+      return 0
+    end
+    redis.call('ZREM', key, member)
+  end
+end
+redis.call('ZADD', key, finish, ARGV[5])
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - 86400)
+return 1
+"""
+
+
+class RedisSlotHoldTable:
+    """
+    Same interface as SlotHoldTable, shared by every worker through Redis: one sorted set per
+    calendar (O(log n) range lookups) and an atomic Lua check-and-lease.
+    """
+
+    def __init__(self, client, lease_seconds: float = 300, prefix: str = "slot_holds"):
+        self._client = client
+        self.lease_seconds = lease_seconds
+        self._prefix = prefix
+        self._acquire = client.register_script(_REDIS_ACQUIRE_SCRIPT)
+
+    def _key(self, calendar_id: str) -> str:
+        return f"{self._prefix}:{calendar_id}"
+
+    def _session_key(self, session_id: str) -> str:
+        return f"{self._prefix}:session:{session_id}"
+
+    def _members_between(self, calendar_id: str, start: float, end: float, page_size: int = 32):
+        offset = 0
+        while True:
+            page = self._client.zrangebyscore(self._key(calendar_id), f"({start}", "+inf", start=offset, num=page_size)
+            for member in page:
+                hold = SlotHold(calendar_id=calendar_id, **json.loads(member))
+                if hold.start >= end:
+                    return
+                yield member, hold
+            if len(page) < page_size:
+                return
+            offset += page_size
+
+    def acquire(self, calendar_id: str, start: float, end: float, session_id: str,
+                lease_seconds: Optional[float] = None) -> bool:
+        now = time.time()
+        lease_seconds = self.lease_seconds if lease_seconds is None else lease_seconds
+        member = json.dumps({"start": start, "end": end, "session_id": session_id, "expires_at": now + lease_seconds})
+        if not self._acquire(keys=[self._key(calendar_id)], args=[start, end, session_id, now, member]):
+            return False
+        session_key = self._session_key(session_id)
+        self._client.sadd(session_key, json.dumps([calendar_id, member]))
+        self._client.expire(session_key, int(max(lease_seconds, self.lease_seconds)) + 60)
+        return True
+
+    def holds_between(self, calendar_id: str, start: float, end: float,
+                      exclude_session: Optional[str] = None) -> List[SlotHold]:
+        now = time.time()
+        return [hold for _, hold in self._members_between(calendar_id, start, end)
+                if hold.expires_at > now and hold.session_id != exclude_session]
+
+    def release(self, calendar_id: str, start: float, session_id: str):
+        session_key = self._session_key(session_id)
+        pipeline = self._client.pipeline()
+        for entry in self._client.smembers(session_key):
+            entry_calendar_id, member = json.loads(entry)
+            if entry_calendar_id == calendar_id and json.loads(member)["start"] == start:
+                pipeline.zrem(self._key(calendar_id), member)
+                pipeline.srem(session_key, entry)
+        pipeline.execute()
+
+    def release_session(self, session_id: str):
+        session_key = self._session_key(session_id)
+        pipeline = self._client.pipeline()
+        for entry in self._client.smembers(session_key):
+            calendar_id, member = json.loads(entry)
+            pipeline.zrem(self._key(calendar_id), member)
+        pipeline.delete(session_key)
+        pipeline.execute()
+
+
+def create_slot_hold_table_from_config():
+    if not get_config("slot_holds_enabled", True):
+        return None
+    lease_seconds = get_config("slot_hold_lease_seconds", 300)
+    redis_url = get_config("slot_holds_redis_url", "")
+    if redis_url:
+        try:
+            import redis  # optional: only needed to share holds between workers/replicas
+            return RedisSlotHoldTable(redis.Redis.from_url(redis_url), lease_seconds=lease_seconds)
+        except ImportError:
+            logger.error("slot_holds_redis_url is set but the redis package is not installed; using in-process slot holds")
+    return SlotHoldTable(lease_seconds=lease_seconds)
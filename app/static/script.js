@@ -15,6 +15,8 @@ document.addEventListener('DOMContentLoaded', (event) => {
 
     let currentBotMessageDiv = null; // To hold the div being streamed into
     let typingInterval = null; // Interval ID for typing effect
+    let handOff = null; // Set when the server drains: { pendingMessage, retryAfterMs }
+    let streamedAnswer = ''; // Reply text received so far as 'answer_chunk' messages
 
     function generateUUID() { // Public Domain/MIT
         let d = new Date().getTime();//Timestamp
@@ -34,7 +36,10 @@ document.addEventListener('DOMContentLoaded', (event) => {
 
     function connectWebSocket() {
         const wsProtocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
-        const wsUrl = `${wsProtocol}${window.location.host}/ws/${sessionId}`;
+        // Path-routed tenants serve their socket under /t/<tenant> (empty for host-routed ones)
+        const wsBaseDiv = document.getElementById('initial-message');
+        const wsBase = wsBaseDiv ? (wsBaseDiv.getAttribute('data-ws-base') || '') : '';
+        const wsUrl = `${wsProtocol}${window.location.host}${wsBase}/ws/${sessionId}`;
 
         console.log(`Connecting to WebSocket: ${wsUrl}`);
         ws = new WebSocket(wsUrl);
@@ -42,6 +47,14 @@ document.addEventListener('DOMContentLoaded', (event) => {
         ws.onopen = function(event) {
             console.log('WebSocket connection opened');
             const initialMessageDiv = document.getElementById('initial-message');
+            if (handOff) {
+                // Resumed on another server: same conversation, resend the message that was cut off
+                const pendingMessage = handOff.pendingMessage;
+                handOff = null;
+                if (pendingMessage) ws.send(pendingMessage);
+                setButtonState(!pendingMessage); // Input stays disabled until the resent turn ends
+                return;
+            }
             const initialMessage = initialMessageDiv ? initialMessageDiv.getAttribute('data-message') : "Connected! How can I help?";
             addMessage(initialMessage, 'bot-message');
             setButtonState(true); // Enable input now
@@ -58,10 +71,30 @@ document.addEventListener('DOMContentLoaded', (event) => {
                     currentBotMessageDiv = document.createElement('div');
                     currentBotMessageDiv.classList.add('message', 'bot-message', 'streaming'); // Add streaming for loader
                     messagesDiv.appendChild(currentBotMessageDiv);
+                    streamedAnswer = '';
                     setButtonState(false); 
+                } else if (data.type === 'answer_chunk') {
+                    // Reply text arriving while the server is still generating the rest of the answer
+                    if (currentBotMessageDiv) {
+                        currentBotMessageDiv.classList.remove('streaming');
+                        streamedAnswer += data.message;
+                        currentBotMessageDiv.innerHTML = streamedAnswer.replace(/\n/g, '<br>');
+                        messagesDiv.scrollTop = messagesDiv.scrollHeight;
+                    }
+                } else if (data.type === 'answer_reset') {
+                    // The streamed text was not the final reply after all: back to the loader
+                    streamedAnswer = '';
+                    if (currentBotMessageDiv) {
+                        currentBotMessageDiv.innerHTML = '';
+                        currentBotMessageDiv.classList.add('streaming');
+                    }
                 } else if (data.type === 'final_answer') {
                     // Received the complete answer, stop loader and type it out
-                    if (currentBotMessageDiv) {
+                    if (currentBotMessageDiv && streamedAnswer) {
+                        // Already on screen: just settle on the final text
+                        currentBotMessageDiv.innerHTML = data.message.replace(/\n/g, '<br>');
+                        streamedAnswer = '';
+                    } else if (currentBotMessageDiv) {
                         currentBotMessageDiv.classList.remove('streaming'); // Remove loader
                         typeMessage(currentBotMessageDiv, data.message);
                     } else {
@@ -108,6 +141,19 @@ document.addEventListener('DOMContentLoaded', (event) => {
                     }
                     statusDiv.textContent = data.message;
                     messagesDiv.scrollTop = messagesDiv.scrollHeight;
+                } else if (data.type === 'reconnect') {
+                    // Server is restarting: drop the unfinished reply and reconnect (onclose) to another server
+                    if (typingInterval) {
+                        clearInterval(typingInterval);
+                        typingInterval = null;
+                    }
+                    if (currentBotMessageDiv && currentBotMessageDiv.classList.contains('streaming')) {
+                        currentBotMessageDiv.remove();
+                    }
+                    currentBotMessageDiv = null;
+                    handOff = { pendingMessage: data.pending_message, retryAfterMs: data.retry_after_ms || 1000 };
+                    addMessage(data.message, 'system-message');
+                    setButtonState(false);
                 }
 
             } catch (e) {
@@ -133,9 +179,14 @@ document.addEventListener('DOMContentLoaded', (event) => {
             if (typingInterval) clearInterval(typingInterval);
             typingInterval = null;
             if (currentBotMessageDiv) currentBotMessageDiv.classList.remove('streaming');
-            addMessage('Connection closed...', 'system-message');
             setButtonState(false);
             currentBotMessageDiv = null;
+            if (handOff) {
+                // Spread reconnects so the remaining servers are not hit all at once
+                setTimeout(connectWebSocket, handOff.retryAfterMs * (1 + Math.random()));
+                return;
+            }
+            addMessage('Connection closed...', 'system-message');
             setTimeout(connectWebSocket, 5000);
         };
     }
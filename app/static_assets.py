@@ -0,0 +1,104 @@
+import os
+import gzip
+import hashlib
+import logging
+import mimetypes
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli  # optional: without it assets are served gzip / identity only
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Hashed URLs never change content, so browsers and CDNs may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# The page itself keeps a stable URL: always revalidate (cheap 304 thanks to the ETag)
+PAGE_CACHE_CONTROL = "no-cache"
+# Compressing tiny bodies costs more than it saves
+MIN_COMPRESS_BYTES = 256
+
+
+@dataclass
+class PrecomputedResponse:
+    """One response body in every encoding worth serving, computed once at startup."""
+    media_type: str
+    etag: str
+    cache_control: str
+    bodies: Dict[str, bytes] = field(default_factory=dict)  # encoding ("identity", "gzip", "br") -> body
+
+    @classmethod
+    def build(cls, content: bytes, media_type: str, cache_control: str) -> "PrecomputedResponse":
+        response = cls(
+            media_type=media_type,
+            etag=f'"{hashlib.sha256(content).hexdigest()[:16]}"',
+            cache_control=cache_control,
+            bodies={"identity": content},
+        )
+        if len(content) >= MIN_COMPRESS_BYTES:
+            candidates = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                candidates["br"] = brotli.compress(content, quality=11)
+            response.bodies.update({encoding: body for encoding, body in candidates.items() if len(body) < len(content)})
+        return response
+
+    def negotiate(self, accept_encoding: str) -> str:
+        """Best available encoding the client accepts (q-values of 0 exclude an encoding)."""
+        accepted = set()
+        for part in accept_encoding.lower().split(","):
+            name, _, params = part.strip().partition(";")
+            if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                accepted.add(name.strip())
+        for encoding in ("br", "gzip"):
+            if encoding in self.bodies and (encoding in accepted or "*" in accepted):
+                return encoding
+        return "identity"
+
+    def to_response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if self.etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        encoding = self.negotiate(request.headers.get("accept-encoding", ""))
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=self.bodies[encoding], media_type=self.media_type, headers=headers)
+
+
+class StaticAssetBundle:
+    """
+    The chat UI's static files, fingerprinted and precompressed once at startup.
+
+    Each file is exposed as `<url_prefix>/<stem>.<content hash><ext>`, e.g. /assets/script.3f2a9c1b.js,
+    so it can be cached as immutable; a changed file gets a new URL on the next deploy.
+    """
+
+    def __init__(self, directory: str, url_prefix: str = "/assets", exclude=("index.html",)):
+        self.url_prefix = url_prefix
+        self._urls: Dict[str, str] = {}  # original file name -> hashed URL
+        self._assets: Dict[str, PrecomputedResponse] = {}  # hashed file name -> response
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name in exclude or not os.path.isfile(path):
+                continue
+            with open(path, "rb") as f:
+                content = f.read()
+            stem, ext = os.path.splitext(name)
+            hashed_name = f"{stem}.{hashlib.sha256(content).hexdigest()[:8]}{ext}"
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if media_type.startswith("text/") or media_type == "application/javascript":
+                media_type += "; charset=utf-8"
+            self._assets[hashed_name] = PrecomputedResponse.build(content, media_type, IMMUTABLE_CACHE_CONTROL)
+            self._urls[name] = f"{url_prefix}/{hashed_name}"
+        logger.info(f"Precomputed {len(self._assets)} static assets (brotli {'on' if brotli else 'off'})")
+
+    def url(self, name: str) -> str:
+        """Hashed URL of a static file (falls back to the plain /static path for unknown files)."""
+        return self._urls.get(name, f"/static/{name}")
+
+    def get(self, hashed_name: str) -> Optional[PrecomputedResponse]:
+        return self._assets.get(hashed_name)
@@ -0,0 +1,315 @@
+import re
+import datetime
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from config_loader import get_config
+from intent_router import normalize_text, DATE_PATTERN, TIME_PATTERN, WEEKDAY_NAMES_PT
+
+# Deterministic resolver for pt-BR date/time expressions in scheduling messages
+# ("amanhã às 15h", "próxima terça de manhã", "dia 20 depois das 14h", "semana que vem").
+# Every pattern runs on normalize_text() output: lowercase, no accents, no punctuation.
+
+WEEKDAYS = {"segunda": 0, "terca": 1, "quarta": 2, "quinta": 3, "sexta": 4, "sabado": 5, "domingo": 6}
+MONTHS = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6, "julho": 7,
+    "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+}
+NUMBER_WORDS = {
+    "um": 1, "uma": 1, "dois": 2, "duas": 2, "tres": 3, "quatro": 4, "cinco": 5, "seis": 6,
+    "sete": 7, "oito": 8, "nove": 9, "dez": 10, "onze": 11, "doze": 12, "quinze": 15,
+}
+# Day periods as (start, end) hours; clipped to the business hours
+PERIODS = {"manha": (8, 12), "almoco": (12, 14), "tarde": (12, 18), "noite": (18, 21)}
+
+_NUMBER = r"(\d{1,2}|" + "|".join(NUMBER_WORDS) + r")"
+_HOUR = r"(\d{1,2})(?:(?:h|:)(\d{2})?)?(?: ?h(?:s|oras?)?)?"
+
+DAY_AFTER_TOMORROW_PATTERN = re.compile(r"\bdepois de amanha\b")
+TOMORROW_PATTERN = re.compile(r"\bamanha\b")
+TODAY_PATTERN = re.compile(r"\bhoje\b")
+IN_DAYS_PATTERN = re.compile(r"\b(?:daqui a|daqui|em) " + _NUMBER + r" dias?\b")
+DAY_OF_MONTH_PATTERN = re.compile(r"\bdia " + r"(\d{1,2})" + r"(?: de (" + "|".join(MONTHS) + r"))?\b")
+WEEKDAY_PATTERN = re.compile(r"\b(segunda|terca|quarta|quinta|sexta|sabado|domingo)(?:-feira| feira)?\b(?! opcao)")
+NEXT_WEEK_PATTERN = re.compile(r"\b(?:semana que vem|proxima semana)\b")
+THIS_WEEK_PATTERN = re.compile(r"\b(?:n?essa|n?esta) semana\b")
+WEEKEND_PATTERN = re.compile(r"\b(?:fim|final) de semana\b")
+
+BETWEEN_PATTERN = re.compile(r"\b(?:entre (?:as )?|das |de )" + _HOUR + r" (?:e|as|a|ate) (?:as )?" + _HOUR)
+AFTER_PATTERN = re.compile(r"\b(?:depois das?|apos as?|a partir das?|mais tarde que as?) " + _HOUR)
+BEFORE_PATTERN = re.compile(r"\b(?:antes das?|ate as?|no maximo as?) " + _HOUR)
+AT_PATTERN = re.compile(r"\bas " + _HOUR)
+NOON_PATTERN = re.compile(r"\bmeio dia\b|\bmeio-dia\b")
+PERIOD_PATTERN = re.compile(r"\b(?:de |pela |a |na |no |durante a |hora do )?(manha|tarde|noite|almoco)\b")
+# Alternatives in one message ("terça às 11h ou quarta às 14h"); commas become " ou " before normalizing
+CLAUSE_SEPARATOR_PATTERN = re.compile(r" (?:ou|e) ")
+
+
+@dataclass(frozen=True)
+class TemporalRange:
+    """A candidate [start, end) the user asked for; `exact` when they named a time, not a window."""
+    start: datetime.datetime
+    end: datetime.datetime
+    exact: bool = False
+
+    def describe(self) -> str:
+        day = f"{WEEKDAY_NAMES_PT[self.start.weekday()]}, {self.start.strftime('%d/%m')}"
+        return (f"{day} {self.start.strftime('%H:%M')}-{self.end.strftime('%H:%M')}: "
+                f"timeMin={self.start.isoformat()}, timeMax={self.end.isoformat()}")
+
+
+def _hour_minute(hour: str, minute: Optional[str], period: Optional[str]) -> Optional[Tuple[int, int]]:
+    value, minutes = int(hour), int(minute or 0)
+    # "às 3 da tarde", "às 8 da noite"; bare 1-6 in a scheduling chat means the afternoon
+    if value < 12 and (period in ("tarde", "noite") or 1 <= value <= 6):
+        value += 12
+    if value > 23 or minutes > 59:
+        return None
+    return value, minutes
+
+
+def _number(token: str) -> int:
+    return int(token) if token.isdigit() else NUMBER_WORDS[token]
+
+
+class TemporalResolver:
+    """
+    Turns the date/time expressions of one message into concrete ranges in `timezone_id`.
+
+    Days come from relative words (hoje, amanhã, depois de amanhã, daqui a N dias), weekday names
+    (optionally "da semana que vem"), dd/mm dates, "dia N [de <mês>]" and week expressions; times
+    from "às 15h", "15h30", "entre 14h e 16h", "depois das 14", "antes das 10", "meio-dia" or a
+    period (manhã, tarde, noite). Missing parts default to the business hours, or to the next day
+    when only a time is given and it already passed today.
+    """
+
+    def __init__(self, timezone_id: str = "UTC", business_hours: Tuple[int, int] = (8, 18),
+                 slot_minutes: int = 30, max_ranges: int = 5):
+        self.timezone = ZoneInfo(timezone_id)
+        self.business_hours = tuple(business_hours)
+        self.slot = datetime.timedelta(minutes=slot_minutes)
+        self.max_ranges = max_ranges
+
+    # --- Days ---
+
+    def _next_week_monday(self, today: datetime.date) -> datetime.date:
+        return today + datetime.timedelta(days=7 - today.weekday())
+
+    def _days(self, text: str, today: datetime.date, next_week: Optional[bool] = None) -> Tuple[List[datetime.date], bool]:
+        """
+        (dates, explicit): explicit is False for whole-week expressions, which skip weekends.
+        `next_week` overrides whether weekday names mean next week's (it may be said once for several).
+        """
+        days = []
+        if DAY_AFTER_TOMORROW_PATTERN.search(text):
+            days.append(today + datetime.timedelta(days=2))
+            text = DAY_AFTER_TOMORROW_PATTERN.sub(" ", text)
+        if TOMORROW_PATTERN.search(text):
+            days.append(today + datetime.timedelta(days=1))
+        if TODAY_PATTERN.search(text):
+            days.append(today)
+        for match in IN_DAYS_PATTERN.finditer(text):
+            days.append(today + datetime.timedelta(days=_number(match.group(1))))
+        date_spans = []
+        for match in DATE_PATTERN.finditer(text):
+            date_spans.append(match.span())
+            day, month, year = int(match.group(1)), int(match.group(2)), match.group(3)
+            year = int(year) + (2000 if len(year) == 2 else 0) if year else today.year
+            try:
+                date = datetime.date(year, month, day)
+            except ValueError:
+                continue
+            if not match.group(3) and date < today:
+                date = date.replace(year=year + 1)
+            days.append(date)
+        for match in DAY_OF_MONTH_PATTERN.finditer(text):
+            if any(start < match.end() and match.start(1) < end for start, end in date_spans):
+                continue # "dia 17/07" is the dd/mm date; "dia 30/02" is no date at all
+            day = int(match.group(1))
+            month = MONTHS[match.group(2)] if match.group(2) else today.month
+            year = today.year
+            for _ in range(3): # this month, else the next one(s) that have that day
+                try:
+                    date = datetime.date(year, month, day)
+                except ValueError:
+                    date = None
+                if date is not None and date >= today:
+                    days.append(date)
+                    break
+                if match.group(2):
+                    year += 1
+                else:
+                    month, year = (1, year + 1) if month == 12 else (month + 1, year)
+
+        said_next_week = bool(NEXT_WEEK_PATTERN.search(text))
+        weekday_matches = WEEKDAY_PATTERN.findall(text)
+        for name in weekday_matches:
+            weekday = WEEKDAYS[name]
+            if said_next_week if next_week is None else next_week:
+                # "terça da semana que vem": that weekday in next calendar week
+                days.append(self._next_week_monday(today) + datetime.timedelta(days=weekday))
+            else:
+                # "terça", "próxima terça", "terça que vem": the next one, never today
+                days.append(today + datetime.timedelta(days=(weekday - today.weekday()) % 7 or 7))
+        if days:
+            return sorted(set(days)), True
+
+        if WEEKEND_PATTERN.search(text):
+            saturday = today + datetime.timedelta(days=(5 - today.weekday()) % 7)
+            return [saturday, saturday + datetime.timedelta(days=1)], True
+        if said_next_week:
+            monday = self._next_week_monday(today)
+            return [monday + datetime.timedelta(days=offset) for offset in range(5)], False
+        if THIS_WEEK_PATTERN.search(text):
+            return [today + datetime.timedelta(days=offset) for offset in range(5 - today.weekday())], False
+        return [], False
+
+    # --- Times ---
+
+    def _window(self, text: str) -> Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]], bool]:
+        """(start, end, exact) as (hour, minute) pairs; (None, None, False) when no time was given."""
+        period_match = PERIOD_PATTERN.search(text)
+        period = period_match.group(1) if period_match else None
+        open_hour, close_hour = self.business_hours
+
+        between = BETWEEN_PATTERN.search(text)
+        if between:
+            start = _hour_minute(between.group(1), between.group(2), period)
+            end = _hour_minute(between.group(3), between.group(4), period)
+            if start and end and end > start:
+                return start, end, False
+        after = AFTER_PATTERN.search(text)
+        before = BEFORE_PATTERN.search(text)
+        if after or before:
+            start = _hour_minute(after.group(1), after.group(2), period) if after else None
+            end = _hour_minute(before.group(1), before.group(2), period) if before else None
+            start = start or (open_hour, 0)
+            end = end or (max(close_hour, start[0] + 1), 0)
+            if end > start:
+                return start, end, False
+
+        # Exact times: "15h", "15h30", "15:30", "às 15"
+        text_without_dates = DATE_PATTERN.sub(" ", text)
+        exact = TIME_PATTERN.search(text_without_dates) or AT_PATTERN.search(text_without_dates)
+        if exact:
+            at = _hour_minute(exact.group(1), exact.group(2) if exact.re is AT_PATTERN else (exact.group(2) or exact.group(3)), period)
+            if at:
+                return at, None, True
+        if NOON_PATTERN.search(text):
+            return (12, 0), None, True
+
+        if period:
+            start, end = PERIODS[period]
+            if period != "noite":
+                start, end = max(start, open_hour), min(end, close_hour)
+            return (start, 0), (end, 0), False
+        return None, None, False
+
+    # --- Clauses ---
+
+    def _clauses(self, text: str, today: datetime.date) -> List[str]:
+        """
+        Splits the message into alternatives, each with at most one day part and one time part:
+        "terca as 11h ou quarta as 14h" -> ["terca as 11h", "quarta as 14h"]. A clause that adds
+        no new part joins the previous one, and "entre 14h e 16h" is never split.
+        """
+        protected = [match.span() for match in BETWEEN_PATTERN.finditer(text)]
+        pieces, start = [], 0
+        for match in CLAUSE_SEPARATOR_PATTERN.finditer(text):
+            if not any(low <= match.start() < high for low, high in protected):
+                pieces.append(text[start:match.start()])
+                start = match.end()
+        pieces.append(text[start:])
+
+        clauses, has_day, has_time = [], False, False
+        for piece in pieces:
+            piece_day = bool(self._days(piece, today, next_week=False)[0])
+            piece_time = self._window(piece)[0] is not None
+            if clauses and not (piece_day and has_day) and not (piece_time and has_time):
+                clauses[-1] += " e " + piece
+                has_day, has_time = has_day or piece_day, has_time or piece_time
+            else:
+                clauses.append(piece)
+                has_day, has_time = piece_day, piece_time
+        return clauses
+
+    def _clause_ranges(self, days: List[datetime.date], explicit: bool, window, now: datetime.datetime) -> List[TemporalRange]:
+        start, end, exact = window
+        if not days:
+            # Only a time: today if it is still ahead, else tomorrow
+            first = datetime.datetime.combine(now.date(), datetime.time(*start), tzinfo=self.timezone)
+            days = [now.date() if first > now else now.date() + datetime.timedelta(days=1)]
+            explicit = True
+
+        ranges = []
+        for day in days:
+            if not explicit and day.weekday() >= 5:
+                continue
+            if start is None:
+                begin = datetime.datetime.combine(day, datetime.time(self.business_hours[0]), tzinfo=self.timezone)
+                finish = datetime.datetime.combine(day, datetime.time(self.business_hours[1]), tzinfo=self.timezone)
+            else:
+                begin = datetime.datetime.combine(day, datetime.time(*start), tzinfo=self.timezone)
+                finish = begin + self.slot if exact else datetime.datetime.combine(day, datetime.time(*end), tzinfo=self.timezone)
+            if finish <= now:
+                continue
+            if not exact and begin < now:
+                # What is left of today, from the next full quarter hour
+                begin = (now + datetime.timedelta(minutes=15 - now.minute % 15)).replace(second=0, microsecond=0)
+                if begin >= finish:
+                    continue
+            ranges.append(TemporalRange(begin, finish, exact))
+        return ranges
+
+    # --- Public API ---
+
+    def resolve(self, message: str, now: Optional[datetime.datetime] = None) -> List[TemporalRange]:
+        """
+        Candidate ranges for the message, earliest first (empty when it names no date or time).
+        Each alternative ("terça às 11h ou quarta às 14h") pairs its days with its own time; a time
+        said once ("amanhã ou quarta às 15h") applies to every alternative.
+        """
+        text = normalize_text(re.sub(r"[,;]", " ou ", message))
+        now = (now or datetime.datetime.now(self.timezone)).astimezone(self.timezone)
+        next_week = bool(NEXT_WEEK_PATTERN.search(text))
+        clauses = []
+        previous_days = ([], False)
+        for clause in self._clauses(text, now.date()):
+            days = self._days(clause, now.date(), next_week=next_week)
+            if not days[0]:
+                days = previous_days # "amanhã às 10h ou às 15h": the 15h is tomorrow too
+            clauses.append((days, self._window(clause)))
+            previous_days = days
+
+        windows = {window for _, window in clauses if window[0] is not None}
+        ranges = []
+        for (days, explicit), window in clauses:
+            if window[0] is None and len(windows) == 1:
+                window = next(iter(windows))
+            if not days and window[0] is None:
+                continue
+            for candidate in self._clause_ranges(days, explicit, window, now):
+                if candidate not in ranges:
+                    ranges.append(candidate)
+        ranges.sort(key=lambda candidate: (candidate.start, candidate.end))
+        return ranges[:self.max_ranges]
+
+
+def format_resolved_ranges(ranges: List[TemporalRange], timezone_id: str) -> str:
+    """Turn context note listing the resolved ranges, so the agent does not have to compute them."""
+    lines = "\n".join(f"- {r.describe()}" for r in ranges)
+    return (f"\n(Dates/times in the user message, already resolved in {timezone_id}; use these exact "
+            f"timeMin/timeMax values instead of computing them:\n{lines})")
+
+
+def create_temporal_resolver_from_config() -> Optional[TemporalResolver]:
+    """Resolver for the current tenant's timezone and business hours, or None when disabled."""
+    if not get_config("temporal_resolver_enabled", True):
+        return None
+    return TemporalResolver(
+        timezone_id=get_config("internal_timezone_id", "UTC"),
+        business_hours=get_config("temporal_resolver_business_hours", [8, 18]),
+        slot_minutes=get_config("consultation_duration_minutes", 30),
+        max_ranges=get_config("temporal_resolver_max_ranges", 5),
+    )
@@ -0,0 +1,170 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from config_loader import get_config, current_config, compile_config, active_tenant_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+# Keys describing the tenant table itself; never copied into a tenant's compiled config
+_TENANT_TABLE_KEYS = ("tenants", "tenant_cache_size")
+
+
+def session_key(tenant_id: str, session_id: str) -> str:
+    """
+    Internal session key: tenants never share histories or state, even on equal ids. Always
+    prefixed, so no client-chosen id (e.g. "acme:abc" on the default tenant) names another tenant's session.
+    """
+    return f"{tenant_id}:{session_id}"
+
+
+@dataclass
+class TenantContext:
+    """Everything one tenant (brand) needs to serve chats, built from its compiled config."""
+    tenant_id: str
+    config: Mapping[str, Any]
+    config_version: int
+    qualification_tools: list
+    scheduling_tools: list
+    intent_router: Any = None
+    qualification_answer_cache: Any = None
+    availability_prefetcher: Any = None
+    temporal_resolver: Any = None
+    # state ("qualification" / "scheduling") -> executor, built lazily
+    executors: Dict[str, Any] = field(default_factory=dict)
+    # WebSocket base path ("" when routed by host, "/t/<tenant>" by path) -> rendered index page
+    index_pages: Dict[str, Any] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def session_key(self, session_id: str) -> str:
+        return session_key(self.tenant_id, session_id)
+
+    def executor(self, state: str, build: Callable[["TenantContext", str], Any]):
+        with self.lock:
+            if state not in self.executors:
+                with tenant_scope(self):
+                    self.executors[state] = build(self, state)
+            return self.executors[state]
+
+    def index_page(self, ws_base: str, render: Callable[["TenantContext", str], Any]):
+        with self.lock:
+            if ws_base not in self.index_pages:
+                self.index_pages[ws_base] = render(self, ws_base)
+            return self.index_pages[ws_base]
+
+
+@contextmanager
+def tenant_scope(tenant: TenantContext):
+    """Makes get_config() answer with the tenant's values inside the block."""
+    token = active_tenant_config.set(tenant.config)
+    try:
+        yield tenant
+    finally:
+        active_tenant_config.reset(token)
+
+
+def tenant_definitions() -> Mapping[str, dict]:
+    """
+    `tenants` from the base config: tenant_id -> {"hosts": [...], "config": {...overrides}}.
+    "config" may also be a path to a JSON file with the overrides.
+    """
+    return current_config().get("tenants", {}) or {}
+
+
+def compile_tenant_config(tenant_id: str) -> Mapping[str, Any]:
+    """Base config with the tenant's overrides applied, prompt templates re-formatted."""
+    base = {key: value for key, value in current_config().values.items() if key not in _TENANT_TABLE_KEYS}
+    if tenant_id == DEFAULT_TENANT:
+        overrides = {}
+    else:
+        overrides = tenant_definitions()[tenant_id].get("config", {})
+        if isinstance(overrides, str):
+            with open(overrides, encoding="utf-8") as f:
+                overrides = json.load(f)
+    compiled = compile_config({**base, **overrides})
+    compiled["tenant_id"] = tenant_id
+    return MappingProxyType(compiled)
+
+
+class TenantRegistry:
+    """
+    Resolves requests to tenants and keeps a bounded LRU of built TenantContexts.
+
+    The default tenant is pinned; other tenants are built on first use (compiled config, tools,
+    caches, router, executors) and evicted least-recently-used beyond `max_cached`. Sessions that
+    already hold an evicted context keep using it until they disconnect. Contexts built from an
+    older base config version are rebuilt on next access.
+    """
+
+    def __init__(self, build_context: Callable[[str, Mapping[str, Any]], TenantContext], max_cached: int = 32):
+        self._build_context = build_context
+        self.max_cached = max_cached
+        self._contexts: "OrderedDict[str, TenantContext]" = OrderedDict()
+        self._default: Optional[TenantContext] = None
+        self._lock = threading.Lock()
+
+    def resolve(self, host: Optional[str] = None, path_tenant: Optional[str] = None) -> Optional[str]:
+        """Tenant for a request: explicit /t/<tenant> path first, then the Host header, else default."""
+        definitions = tenant_definitions()
+        if path_tenant is not None:
+            return path_tenant if path_tenant in definitions else None
+        hostname = (host or "").split(":")[0].lower()
+        for tenant_id, definition in definitions.items():
+            if hostname and hostname in (h.lower() for h in definition.get("hosts", [])):
+                return tenant_id
+        return DEFAULT_TENANT
+
+    def get(self, tenant_id: str) -> TenantContext:
+        version = current_config().version
+        with self._lock:
+            if tenant_id == DEFAULT_TENANT:
+                context = self._default
+            else:
+                context = self._contexts.get(tenant_id)
+                if context is not None:
+                    self._contexts.move_to_end(tenant_id)
+            if context is not None and context.config_version == version:
+                return context
+
+        # Built outside the registry lock (may read files, create clients); last writer wins
+        config = compile_tenant_config(tenant_id)
+        token = active_tenant_config.set(config)
+        try:
+            context = self._build_context(tenant_id, config)
+        finally:
+            active_tenant_config.reset(token)
+        context.config_version = version
+        logger.info(f"Built tenant context '{tenant_id}' for config version {version}")
+
+        with self._lock:
+            if tenant_id == DEFAULT_TENANT:
+                self._default = context
+                return context
+            self._contexts[tenant_id] = context
+            self._contexts.move_to_end(tenant_id)
+            while len(self._contexts) > self.max_cached:
+                evicted, _ = self._contexts.popitem(last=False)
+                logger.info(f"Evicted tenant context '{evicted}' (cache size {self.max_cached})")
+        return context
+
+    def cached_tenants(self) -> List[str]:
+        with self._lock:
+            return ([DEFAULT_TENANT] if self._default else []) + list(self._contexts)
+
+
+def calendar_scope(calendar_id: str) -> str:
+    """
+    Key of a calendar in process-wide tables (slot holds, coalesced reads). Tenants use their
+    own credentials, so the same calendar id ("primary") of two tenants is two calendars.
+    """
+    tenant_id = get_config("tenant_id", DEFAULT_TENANT)
+    if tenant_id == DEFAULT_TENANT:
+        return calendar_id
+    return f"{tenant_id}:{calendar_id}"
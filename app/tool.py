@@ -1,8 +1,13 @@
 import subprocess
 import os
+import asyncio
 import logging
 import json # Added for MCP JSON handling
 import uuid # Added for potential request IDs
+import functools
+import time
+import threading
+import hashlib
 from typing import Any, Optional, Type
 from langchain_core.tools import BaseTool
 # from langchain_core.pydantic_v1 import Field, root_validator # Deprecated
@@ -11,16 +16,25 @@ from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI # Needed for summarizer
 from langchain_core.prompts import ChatPromptTemplate # Needed for summarizer
 from langchain_core.output_parsers import StrOutputParser # Needed for summarizer
-from config_loader import get_config # <<< ADDED
+from config_loader import get_config, subscribe # <<< ADDED
+from logging_setup import log_payload
+from semantic_cache import notify_source_content
+from calendar_coalescing import CalendarRequestCoalescer, WRITE_TOOLS
+from deadlines import remaining_timeout, DeadlineExceeded
+from mcp_client import get_mcp_http_client
+from drain import note_calendar_write
+from slot_holds import create_slot_hold_table_from_config, current_session_id, parse_slot_time, format_holds_as_events
+from tenants import calendar_scope, DEFAULT_TENANT
+from sitemap_index import load_sitemap_index_from_config, documents_from_json, chunk_documents
+from bm25 import BM25Index, fuse_scores, top_k_indices
 from langchain.tools import BaseTool
-from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.callbacks import CallbackManagerForToolRun, AsyncCallbackManagerForToolRun
 from pydantic import BaseModel
 import httpx  # <-- Add httpx import
 
 load_dotenv()
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# Setup logging (handlers are installed by logging_setup.configure_logging in main.py)
 logger = logging.getLogger(__name__)
 
 # --- Load Configurable Values ---
@@ -30,6 +44,8 @@ MAX_CALENDAR_RESULT_LENGTH = get_config("max_calendar_result_length", 2000) # <<
 
 # CALENDAR_TOOL_DESCRIPTION = load_tool_description()
 CALENDAR_TOOL_DESCRIPTION = get_config("calendar_tool_description", "Calendar tool.") # <<< Use config
+# Upper bound for one MCP server call; also capped by what is left of the turn budget
+MCP_CALL_TIMEOUT_SECONDS = get_config("mcp_call_timeout_seconds", 30)
 # --- End Load Configurable Values ---
 
 # Get the path to the MCP server script from environment variables
@@ -56,6 +72,49 @@ summarizer_chain = summarizer_prompt | summarizer_llm | StrOutputParser()
 
 # --- End Summarization Chain Definition ---
 
+# Shared by every calendar tool instance (all sessions), so identical concurrent reads
+# (e.g. many users opening the scheduling step at once) spawn a single MCP subprocess.
+calendar_coalescer = (
+    CalendarRequestCoalescer(result_ttl_seconds=get_config("calendar_read_cache_ttl_seconds", 5))
+    if get_config("calendar_coalescing_enabled", True)
+    else None
+)
+
+# Short leases on offered/booked slots so concurrent sessions don't double book (None when disabled)
+slot_holds = create_slot_hold_table_from_config()
+SLOT_HOLD_TIMEZONE = get_config("internal_timezone_id", "UTC")
+
+# Per-tenant cap on concurrent MCP subprocesses (tenant_id -> semaphore), so one busy brand
+# cannot take all the calendar capacity of a shared deployment
+_mcp_call_slots = {}
+_mcp_call_slots_lock = threading.Lock()
+
+def mcp_call_slot() -> Optional[threading.BoundedSemaphore]:
+    """The current tenant's MCP concurrency semaphore, or None when mcp_max_concurrent_calls is 0."""
+    limit = get_config("mcp_max_concurrent_calls", 0)
+    if not limit:
+        return None
+    tenant_id = get_config("tenant_id", DEFAULT_TENANT)
+    with _mcp_call_slots_lock:
+        slot = _mcp_call_slots.get(tenant_id)
+        if slot is None or slot.limit != limit:
+            slot = _mcp_call_slots[tenant_id] = threading.BoundedSemaphore(limit)
+            slot.limit = limit
+        return slot
+
+def mcp_environment() -> Optional[dict]:
+    """Subprocess environment: the tenant's own Google credentials directory, when configured."""
+    credentials_dir = get_config("mcp_credentials_dir", "")
+    if not credentials_dir:
+        return None # Inherit ours (MCP_CREDENTIALS_DIR of the container)
+    return {**os.environ, "MCP_CREDENTIALS_DIR": credentials_dir}
+
+def coalescing_args(tool_args: dict) -> dict:
+    """Arguments the coalescer keys on: tenants never share reads of their (distinct) calendars."""
+    if "calendarId" not in tool_args:
+        return tool_args
+    return {**tool_args, "calendarId": calendar_scope(tool_args["calendarId"])}
+
 class GoogleCalendarSubprocessWrapper(BaseTool):
     """Tool for interacting with the Google Calendar MCP server via subprocess stdio."""
     # Prevent Pydantic v1 from potentially interfering with standard attributes
@@ -66,10 +125,8 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
     # No longer need mcp_script_path as instance variable, use module-level constant
     # mcp_script_path: str = MCP_SERVER_SCRIPT_PATH
 
-    def _run(self, command: str, **kwargs: Any) -> str:
-        """Use the tool by executing the MCP server and communicating via stdin/stdout."""
-        logger.info(f"Received command input for calendar tool: {command}")
-
+    def _parse_command(self, command: Any):
+        """Parses the agent's tool input into (tool_name, tool_args, error_message)."""
         # --- Parse Structured Input ---
         tool_input = None
         tool_name = None
@@ -77,11 +134,11 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
         try:
             if isinstance(command, dict):
                 # Agent might pass the dictionary directly
-                logger.info("Tool input received as dictionary.")
+                logger.debug("Tool input received as dictionary.")
                 tool_input = command
             elif isinstance(command, str):
                 # Agent passes a string, try parsing as JSON
-                logger.info("Tool input received as string, attempting JSON parse.")
+                logger.debug("Tool input received as string, attempting JSON parse.")
                 try:
                     # Clean the string: strip whitespace and potential markdown backticks
                     cleaned_command = command.strip()
@@ -104,7 +161,7 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
                         tool_input = json.loads(fixed_command)
                     except Exception as e_fix:
                         logger.error(f"Failed to parse tool input string even after fixing escapes: {command} (cleaned: {cleaned_command}) - Error: {e_fix}")
-                        return "Error: Tool input string is not valid JSON, even after attempting to fix escaping and cleaning."
+                        return None, None, "Error: Tool input string is not valid JSON, even after attempting to fix escaping and cleaning."
             else:
                  raise TypeError(f"Unexpected command input type: {type(command)}")
 
@@ -116,7 +173,7 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
                 raise ValueError("Input must resolve to a dictionary containing 'name' (string) and 'arguments' (object).")
 
             logger.info(f"Parsed MCP Tool Name: {tool_name}")
-            logger.info(f"Parsed MCP Arguments (original): {tool_args}")
+            logger.debug("Parsed MCP Arguments (original)", extra=log_payload(arguments=tool_args))
 
             # --- Inject Default Calendar ID if needed --- Start
             if not tool_args.get("calendarId"):
@@ -134,11 +191,17 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
 
         except (json.JSONDecodeError, TypeError, ValueError) as e:
              logger.error(f"Invalid tool input format: {command} - {e}")
-             return f"Error: Invalid tool input format. {e}"
-        # --- End Parse Input ---
+             return None, None, f"Error: Invalid tool input format. {e}"
+
+        return tool_name, tool_args, None
 
+    def _execute_mcp_request(self, tool_name: str, tool_args: dict, callbacks=None) -> str:
+        """
+        Runs one MCP tools/call against a fresh server subprocess (blocking). `callbacks` (the tool
+        run's child callbacks) are passed to the summarizer, so its LLM call is traced with the turn.
+        """
         # Use the module-level MCP_SERVER_SCRIPT_PATH
-        logger.info(f"Executing MCP server: node {MCP_SERVER_SCRIPT_PATH}")
+        logger.debug(f"Executing MCP server: node {MCP_SERVER_SCRIPT_PATH}")
 
         # --- Construct the MCP Request ---
         request_id = str(uuid.uuid4())
@@ -152,251 +215,28 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
             }
         }
         mcp_request_json = json.dumps(mcp_request) + "\n"
-        logger.info(f"Sending MCP Request (stdin): {mcp_request_json.strip()}")
+        logger.debug("Sending MCP Request (stdin)", extra=log_payload(request=mcp_request))
         # --- End MCP Request Construction ---
 
-        # (Subprocess execution logic requires manual stream handling)
-        process = None # Define process outside try block for finally clause
-        try:
-            process = subprocess.Popen(
-                ['node', MCP_SERVER_SCRIPT_PATH], # Use module-level constant
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8',
-                bufsize=1 # Line buffering
-            )
-
-            # Write request to stdin
-            try:
-                process.stdin.write(mcp_request_json)
-                process.stdin.flush() # Ensure data is sent
-                process.stdin.close() # Signal end of request
-                logger.info("MCP request sent to stdin and stream closed.")
-            except BrokenPipeError:
-                logger.error("Failed to write to MCP server stdin. Process likely terminated early.")
-                # Capture any initial stderr
-                stderr_data = process.stderr.read()
-                logger.error(f"MCP Server initial stderr: {stderr_data}")
-                return f"Error: Could not send request to calendar server process. Stderr: {stderr_data}"
-            except Exception as e_write:
-                 logger.exception("An unexpected error occurred writing to stdin.")
-                 return f"Error writing to calendar server: {e_write}"
-
-            # Read response from stdout, with timeout
-            response_lines = []
-            stderr_lines = []
-            stdout_complete_json = None
-            try:
-                # We need a way to read with timeout without communicate()
-                # Using select or threading is complex. A simpler approach for now
-                # is to read line by line but implement a manual timeout mechanism.
-                # Or, we can try reading stdout first before checking return code/stderr.
-                # Reading stderr in a separate thread might be necessary to avoid deadlocks.
-
-                # Read stderr first (non-blocking or short timeout) - simpler but might miss things
-                # stderr_data = process.stderr.read() # This might block!
-                # Better: Use select or threads. Simpler alternative: communicate with tiny timeout
-                try:
-                    _, stderr_data_initial = process.communicate(timeout=0.1) # Try getting quick stderr
-                    stderr_lines.append(stderr_data_initial)
-                    logger.info(f"MCP Server initial stderr (communicate):\n{stderr_data_initial}")
-                except subprocess.TimeoutExpired:
-                    logger.info("No immediate stderr from MCP server.")
-                except Exception as e_comm_stderr:
-                     logger.error(f"Error during initial stderr communicate: {e_comm_stderr}")
-
-                logger.info("Attempting to read stdout...")
-                # Now read stdout line-by-line - THIS CAN STILL HANG if server doesn't write
-                # A select-based approach or threading is more robust for simultaneous reads.
-                for line in process.stdout:
-                    line = line.strip()
-                    if not line: continue
-                    logger.info(f"MCP Server stdout line: {line}")
-                    response_lines.append(line)
-                    # Check if we received a complete JSON object (simple check)
-                    if line.startswith('{') and line.endswith('}'):
-                        stdout_complete_json = line
-                        break # Assume one JSON response per request for now
-
-                # Read any remaining stderr after stdout is done (or if stdout loop finished)
-                stderr_data_remaining = process.stderr.read()
-                if stderr_data_remaining:
-                     stderr_lines.append(stderr_data_remaining)
-                     logger.info(f"MCP Server remaining stderr:\n{stderr_data_remaining}")
-
-                stdout_data = "\n".join(response_lines)
-                stderr_data = "\n".join(filter(None, stderr_lines))
-
-            except Exception as e_read:
-                logger.exception("Error reading from MCP server streams.")
-                stderr_data = "".join(stderr_lines) + process.stderr.read() # Try to get final stderr
-                return f"Error reading from calendar server: {e_read}. Stderr: {stderr_data}"
-
-            # --- Process the MCP Response --- (using stdout_complete_json or stdout_data)
-            try:
-                # Prioritize the detected complete JSON object
-                json_to_parse = stdout_complete_json
-                if not json_to_parse:
-                    # Fallback: Maybe the whole output is the JSON
-                    json_to_parse = stdout_data.strip()
-                    if not (json_to_parse.startswith('{') and json_to_parse.endswith('}')):
-                         json_to_parse = None # Not a likely JSON object
-
-                if json_to_parse:
-                    mcp_response = json.loads(json_to_parse)
-                    logger.info(f"Parsed MCP Response: {mcp_response}")
-
-                    if "error" in mcp_response:
-                        error_info = mcp_response["error"]
-                        return f"Error from calendar server: {error_info.get('message', 'Unknown error')} (Code: {error_info.get('code', 'N/A')})"
-                    elif "result" in mcp_response:
-                        result_content = mcp_response["result"].get("content", [])
-                        result_text = ""
-                        if isinstance(result_content, list) and len(result_content) > 0 and "text" in result_content[0]:
-                            result_text = result_content[0]["text"]
-                        else:
-                            result_text = json.dumps(mcp_response["result"])
-
-                        # <<< Summarize long results INSTEAD of truncating >>>
-                        if len(result_text) > MAX_CALENDAR_RESULT_LENGTH:
-                             logger.warning(f"Calendar tool result length ({len(result_text)}) exceeds threshold ({MAX_CALENDAR_RESULT_LENGTH}). Summarizing...")
-                             # Directly invoke the summarizer chain
-                             try:
-                                 summary = summarizer_chain.invoke({"text_to_summarize": result_text})
-                                 return f"(Summarized due to length): {summary}"
-                             except Exception as e_summary:
-                                 logger.exception("Error during summarization chain invocation.")
-                                 return f"Error summarizing result: {e_summary}"
-                        else:
-                             # Return the full text if below threshold
-                             return result_text
-                        # <<< End Summarization Logic >>>
-                    else:
-                        return "Received unexpected response structure from calendar server."
-                elif stderr_data:
-                    return f"Calendar server finished with no JSON result, but reported errors: {stderr_data.strip()}"
-                elif stdout_data:
-                     # Might be non-JSON logs or messages
-                     return f"Received non-JSON response from calendar server: {stdout_data.strip()}"
-                else:
-                     return "Calendar server finished with no output."
-
-            except json.JSONDecodeError:
-                logger.error(f"Failed to decode JSON response from MCP server stdout: {stdout_data}")
-                return f"Error: Could not parse response from calendar server. Raw output:\n{stdout_data}"
-            # --- End MCP Response Processing ---
-
-        except subprocess.TimeoutExpired: # This specific exception might not be hit with manual reads
-            logger.error("Subprocess operation timed out (manual handling). This shouldn't usually happen here.")
-            # Ensure process is killed if it exists and is running
-            if process and process.poll() is None:
-                 process.kill()
-                 stdout_data, stderr_data = process.communicate() # Capture final output after kill
-                 logger.error(f"Final stdout after kill: {stdout_data}")
-                 logger.error(f"Final stderr after kill: {stderr_data}")
-            return "Error: The request to the calendar server timed out."
-        except FileNotFoundError:
-            logger.error(f"Could not execute MCP server. 'node' command not found or script path incorrect: {MCP_SERVER_SCRIPT_PATH}")
-            return "Error: Could not start the calendar server subprocess. Check environment."
-        except Exception as e:
-            logger.exception("An unexpected error occurred during subprocess communication.")
-            # Ensure process is killed if it exists and is running
-            if process and process.poll() is None:
-                 process.kill()
-            return f"An unexpected error occurred: {e}"
-        finally:
-             # Ensure the process is cleaned up if it's still running
-             if process and process.poll() is None:
-                 logger.warning("MCP process still running after handling, attempting to terminate.")
-                 process.terminate() # Ask nicely first
-                 try:
-                     process.wait(timeout=1) # Wait briefly
-                 except subprocess.TimeoutExpired:
-                     logger.warning("MCP process did not terminate gracefully, killing.")
-                     process.kill() # Force kill
-
-    async def _arun(self, command: str, **kwargs: Any) -> str:
-        logger.info(f"Async received command input for calendar tool: {command}")
-        # ... (rest of the async input parsing - should mirror _run)
-        # --- Assume input parsing mirrored from _run results in tool_name, tool_args --- START
-        tool_input = None
-        tool_name = None
-        tool_args = None
         try:
-            # Mirror the parsing logic from _run diligently
-            if isinstance(command, dict):
-                tool_input = command
-            elif isinstance(command, str):
-                cleaned_command = command.strip()
-                if cleaned_command.startswith("```json\n"):
-                    cleaned_command = cleaned_command[len("```json\n"):]
-                if cleaned_command.startswith("```"):
-                     cleaned_command = cleaned_command[3:]
-                if cleaned_command.endswith("\n```"):
-                     cleaned_command = cleaned_command[:-len("\n```")]
-                if cleaned_command.endswith("```"):
-                    cleaned_command = cleaned_command[:-3]
-                cleaned_command = cleaned_command.strip()
-
-                try:
-                    tool_input = json.loads(cleaned_command)
-                except json.JSONDecodeError:
-                    logger.warning(f"Async initial JSON parse failed. Trying to fix escaping.")
-                    try:
-                        fixed_command = cleaned_command.replace('\"', '"')
-                        tool_input = json.loads(fixed_command)
-                    except Exception as e_fix:
-                        logger.error(f"Async failed to parse tool input string: {command} - Error: {e_fix}")
-                        return "Error: Async tool input string is not valid JSON."
-            else:
-                 raise TypeError(f"Async unexpected command input type: {type(command)}")
-
-            tool_name = tool_input.get("name")
-            tool_args = tool_input.get("arguments", {})
+            timeout_seconds = remaining_timeout(MCP_CALL_TIMEOUT_SECONDS)
+        except DeadlineExceeded:
+            logger.warning(f"Skipping MCP call '{tool_name}': turn budget exhausted")
+            return "Error: The request to the calendar server timed out (no time left for this turn)."
 
-            if not tool_name or not isinstance(tool_args, dict):
-                raise ValueError("Async input must resolve to a dictionary containing 'name' and 'arguments'.")
+        http_client = get_mcp_http_client()
+        if http_client is not None:
+            return self._execute_mcp_http_request(http_client, tool_name, tool_args, timeout_seconds, callbacks)
 
-            logger.info(f"Async Parsed MCP Tool Name: {tool_name}")
-            logger.info(f"Async Parsed MCP Arguments (original): {tool_args}")
-
-            # --- Inject Default Calendar ID if needed (Mirror _run logic) --- Start
-            if not tool_args.get("calendarId"):
-                relevant_tools = ['list-events', 'create-event', 'search-events', 'update-event', 'delete-event']
-                if tool_name in relevant_tools:
-                    default_id = get_config('default_calendar_id')
-                    if default_id:
-                        tool_args['calendarId'] = default_id
-                        logger.info(f"Async Injected default_calendar_id: {default_id}")
-                    else:
-                        logger.warning(f"Async Tool '{tool_name}' might need calendarId, but none provided and no default_calendar_id found.")
-            # --- Inject Default Calendar ID if needed (Mirror _run logic) --- End
-
-        except (json.JSONDecodeError, TypeError, ValueError) as e:
-             logger.error(f"Async invalid tool input format: {command} - {e}")
-             return f"Error: Async invalid tool input format. {e}"
-        # --- Assume input parsing mirrored from _run results in tool_name, tool_args --- END
-
-        logger.info(f"Async Executing MCP server: node {MCP_SERVER_SCRIPT_PATH}")
-
-        # Construct MCP Request (mirror _run)
-        request_id = str(uuid.uuid4())
-        mcp_request = {
-            "jsonrpc": "2.0",
-            "method": "tools/call",
-            "id": request_id,
-            "params": {
-                "name": tool_name,
-                "arguments": tool_args
-            }
-        }
-        mcp_request_json = json.dumps(mcp_request) + "\n"
-        logger.info(f"Async Sending MCP Request (stdin): {mcp_request_json.strip()}")
+        call_slot = mcp_call_slot()
+        if call_slot is not None and not call_slot.acquire(timeout=timeout_seconds):
+            logger.warning(f"Skipping MCP call '{tool_name}': all of this tenant's MCP call slots stayed busy")
+            return "Error: The request to the calendar server timed out (calendar server busy)."
 
         # (Subprocess execution logic requires manual stream handling)
         process = None # Define process outside try block for finally clause
+        watchdog = None
+        timed_out = threading.Event()
         try:
             process = subprocess.Popen(
                 ['node', MCP_SERVER_SCRIPT_PATH], # Use module-level constant
@@ -405,15 +245,23 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
                 stderr=subprocess.PIPE,
                 text=True,
                 encoding='utf-8',
-                bufsize=1 # Line buffering
+                bufsize=1, # Line buffering
+                env=mcp_environment() # Per-tenant credentials
             )
+            # The blocking reads below have no timeout of their own: killing the process ends them
+            def kill_on_timeout(process=process):
+                timed_out.set()
+                process.kill()
+            watchdog = threading.Timer(timeout_seconds, kill_on_timeout)
+            watchdog.daemon = True
+            watchdog.start()
 
             # Write request to stdin
             try:
                 process.stdin.write(mcp_request_json)
                 process.stdin.flush() # Ensure data is sent
                 process.stdin.close() # Signal end of request
-                logger.info("MCP request sent to stdin and stream closed.")
+                logger.debug("MCP request sent to stdin and stream closed.")
             except BrokenPipeError:
                 logger.error("Failed to write to MCP server stdin. Process likely terminated early.")
                 # Capture any initial stderr
@@ -441,19 +289,19 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
                 try:
                     _, stderr_data_initial = process.communicate(timeout=0.1) # Try getting quick stderr
                     stderr_lines.append(stderr_data_initial)
-                    logger.info(f"MCP Server initial stderr (communicate):\n{stderr_data_initial}")
+                    logger.debug("MCP Server initial stderr (communicate)", extra=log_payload(stderr=stderr_data_initial))
                 except subprocess.TimeoutExpired:
-                    logger.info("No immediate stderr from MCP server.")
+                    logger.debug("No immediate stderr from MCP server.")
                 except Exception as e_comm_stderr:
                      logger.error(f"Error during initial stderr communicate: {e_comm_stderr}")
 
-                logger.info("Attempting to read stdout...")
+                logger.debug("Attempting to read stdout...")
                 # Now read stdout line-by-line - THIS CAN STILL HANG if server doesn't write
                 # A select-based approach or threading is more robust for simultaneous reads.
                 for line in process.stdout:
                     line = line.strip()
                     if not line: continue
-                    logger.info(f"MCP Server stdout line: {line}")
+                    logger.debug("MCP Server stdout line", extra=log_payload(line=line))
                     response_lines.append(line)
                     # Check if we received a complete JSON object (simple check)
                     if line.startswith('{') and line.endswith('}'):
@@ -464,7 +312,7 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
                 stderr_data_remaining = process.stderr.read()
                 if stderr_data_remaining:
                      stderr_lines.append(stderr_data_remaining)
-                     logger.info(f"MCP Server remaining stderr:\n{stderr_data_remaining}")
+                     logger.debug("MCP Server remaining stderr", extra=log_payload(stderr=stderr_data_remaining))
 
                 stdout_data = "\n".join(response_lines)
                 stderr_data = "\n".join(filter(None, stderr_lines))
@@ -474,6 +322,10 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
                 stderr_data = "".join(stderr_lines) + process.stderr.read() # Try to get final stderr
                 return f"Error reading from calendar server: {e_read}. Stderr: {stderr_data}"
 
+            if timed_out.is_set():
+                logger.error(f"MCP call '{tool_name}' killed after {timeout_seconds:.1f}s")
+                return "Error: The request to the calendar server timed out."
+
             # --- Process the MCP Response --- (using stdout_complete_json or stdout_data)
             try:
                 # Prioritize the detected complete JSON object
@@ -486,35 +338,8 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
 
                 if json_to_parse:
                     mcp_response = json.loads(json_to_parse)
-                    logger.info(f"Parsed MCP Response: {mcp_response}")
-
-                    if "error" in mcp_response:
-                        error_info = mcp_response["error"]
-                        return f"Error from calendar server: {error_info.get('message', 'Unknown error')} (Code: {error_info.get('code', 'N/A')})"
-                    elif "result" in mcp_response:
-                        result_content = mcp_response["result"].get("content", [])
-                        result_text = ""
-                        if isinstance(result_content, list) and len(result_content) > 0 and "text" in result_content[0]:
-                            result_text = result_content[0]["text"]
-                        else:
-                            result_text = json.dumps(mcp_response["result"])
-
-                        # <<< Summarize long results INSTEAD of truncating >>>
-                        if len(result_text) > MAX_CALENDAR_RESULT_LENGTH:
-                             logger.warning(f"Calendar tool result length ({len(result_text)}) exceeds threshold ({MAX_CALENDAR_RESULT_LENGTH}). Summarizing...")
-                             # Directly invoke the summarizer chain
-                             try:
-                                 summary = summarizer_chain.invoke({"text_to_summarize": result_text})
-                                 return f"(Summarized due to length): {summary}"
-                             except Exception as e_summary:
-                                 logger.exception("Error during summarization chain invocation.")
-                                 return f"Error summarizing result: {e_summary}"
-                        else:
-                             # Return the full text if below threshold
-                             return result_text
-                        # <<< End Summarization Logic >>>
-                    else:
-                        return "Received unexpected response structure from calendar server."
+                    text, is_result = self._mcp_response_text(mcp_response)
+                    return self._summarize_if_long(text, callbacks) if is_result else text
                 elif stderr_data:
                     return f"Calendar server finished with no JSON result, but reported errors: {stderr_data.strip()}"
                 elif stdout_data:
@@ -547,6 +372,10 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
                  process.kill()
             return f"An unexpected error occurred: {e}"
         finally:
+             if watchdog:
+                 watchdog.cancel()
+             if call_slot is not None:
+                 call_slot.release()
              # Ensure the process is cleaned up if it's still running
              if process and process.poll() is None:
                  logger.warning("MCP process still running after handling, attempting to terminate.")
@@ -557,9 +386,265 @@ class GoogleCalendarSubprocessWrapper(BaseTool):
                      logger.warning("MCP process did not terminate gracefully, killing.")
                      process.kill() # Force kill
 
+    def _mcp_response_text(self, mcp_response: dict):
+        """JSON-RPC response -> (text, is_result); errors and odd shapes come back as is_result=False."""
+        logger.debug("Parsed MCP Response", extra=log_payload(response=mcp_response))
+        if "error" in mcp_response:
+            error_info = mcp_response["error"]
+            return f"Error from calendar server: {error_info.get('message', 'Unknown error')} (Code: {error_info.get('code', 'N/A')})", False
+        if "result" in mcp_response:
+            result_content = mcp_response["result"].get("content", [])
+            if isinstance(result_content, list) and len(result_content) > 0 and "text" in result_content[0]:
+                return result_content[0]["text"], True
+            return json.dumps(mcp_response["result"]), True
+        return "Received unexpected response structure from calendar server.", False
+
+    def _summarize_if_long(self, result_text: str, callbacks=None) -> str:
+        # <<< Summarize long results INSTEAD of truncating >>>
+        if len(result_text) <= MAX_CALENDAR_RESULT_LENGTH:
+            return result_text
+        logger.warning(f"Calendar tool result length ({len(result_text)}) exceeds threshold ({MAX_CALENDAR_RESULT_LENGTH}). Summarizing...")
+        try:
+            summary = summarizer_chain.invoke({"text_to_summarize": result_text}, config={"callbacks": callbacks})
+            return f"(Summarized due to length): {summary}"
+        except Exception as e_summary:
+            logger.exception("Error during summarization chain invocation.")
+            return f"Error summarizing result: {e_summary}"
+
+    async def _asummarize_if_long(self, result_text: str, callbacks=None) -> str:
+        if len(result_text) <= MAX_CALENDAR_RESULT_LENGTH:
+            return result_text
+        logger.warning(f"Calendar tool result length ({len(result_text)}) exceeds threshold ({MAX_CALENDAR_RESULT_LENGTH}). Summarizing...")
+        try:
+            summary = await summarizer_chain.ainvoke({"text_to_summarize": result_text}, config={"callbacks": callbacks})
+            return f"(Summarized due to length): {summary}"
+        except Exception as e_summary:
+            logger.exception("Error during summarization chain invocation.")
+            return f"Error summarizing result: {e_summary}"
+
+    @staticmethod
+    def _mcp_http_error(tool_name: str, error: Exception) -> str:
+        if isinstance(error, httpx.TimeoutException):
+            logger.error(f"MCP call '{tool_name}' timed out (http)")
+            return "Error: The request to the calendar server timed out."
+        if isinstance(error, httpx.HTTPStatusError):
+            logger.error(f"MCP server returned HTTP {error.response.status_code} for '{tool_name}'")
+            return f"Error from calendar server: HTTP {error.response.status_code}"
+        logger.error(f"MCP call '{tool_name}' failed (http): {error!r}")
+        return f"Error: Could not reach the calendar server: {error}"
+
+    def _execute_mcp_http_request(self, http_client, tool_name: str, tool_args: dict, timeout_seconds: float,
+                                  callbacks=None) -> str:
+        """Runs one tools/call against the shared MCP service over pooled connections (blocking)."""
+        try:
+            mcp_response = http_client.call_tool(tool_name, tool_args, timeout=timeout_seconds)
+        except (httpx.HTTPError, ValueError) as e:
+            return self._mcp_http_error(tool_name, e)
+        text, is_result = self._mcp_response_text(mcp_response)
+        return self._summarize_if_long(text, callbacks) if is_result else text
+
+    async def _aexecute_mcp_request(self, tool_name: str, tool_args: dict, callbacks=None) -> str:
+        """Async MCP call: pooled HTTP on the event loop, or the stdio subprocess in a worker thread."""
+        http_client = get_mcp_http_client()
+        if http_client is None:
+            # Subprocess I/O is blocking, keep it off the event loop
+            return await asyncio.to_thread(self._execute_mcp_request, tool_name, tool_args, callbacks)
+        try:
+            timeout_seconds = remaining_timeout(MCP_CALL_TIMEOUT_SECONDS)
+        except DeadlineExceeded:
+            logger.warning(f"Skipping MCP call '{tool_name}': turn budget exhausted")
+            return "Error: The request to the calendar server timed out (no time left for this turn)."
+        try:
+            mcp_response = await http_client.acall_tool(tool_name, tool_args, timeout=timeout_seconds)
+        except (httpx.HTTPError, ValueError) as e:
+            return self._mcp_http_error(tool_name, e)
+        text, is_result = self._mcp_response_text(mcp_response)
+        return await self._asummarize_if_long(text, callbacks) if is_result else text
+
+    def _slot_bounds(self, tool_args: dict, start_key: str, end_key: str):
+        """(calendar_id, start, end) in epoch seconds, or None when the call has no usable time range."""
+        try:
+            start = parse_slot_time(tool_args[start_key], tool_args.get("timeZone", SLOT_HOLD_TIMEZONE))
+            end = parse_slot_time(tool_args[end_key], tool_args.get("timeZone", SLOT_HOLD_TIMEZONE))
+        except (KeyError, TypeError, AttributeError, ValueError):
+            return None
+        return calendar_scope(tool_args.get("calendarId", "primary")), start, end
+
+    def _create_with_hold(self, tool_args: dict, session_id: str, execute) -> str:
+        """Books only if the session can lease the slot; once the event exists the session's leases are dropped."""
+        bounds = self._slot_bounds(tool_args, "start", "end")
+        if bounds is None:
+            return execute()
+        if not slot_holds.acquire(*bounds, session_id):
+            logger.info(f"Slot {tool_args.get('start')} is held by another session, not booking for {session_id}")
+            return "Error: This time slot is being held for another conversation. Offer the user a different time."
+        result = execute()
+        if isinstance(result, str) and result.startswith("Event created"):
+            # The booked slot is now busy in the calendar and the session's other offers are moot
+            slot_holds.release_session(session_id)
+        return result
+
+    def _with_other_holds(self, tool_args: dict, session_id: Optional[str], result):
+        """Appends slots leased to other sessions to a list/search result, as busy events."""
+        bounds = self._slot_bounds(tool_args, "timeMin", "timeMax")
+        if bounds is None or not isinstance(result, str) or result.startswith("Error"):
+            return result
+        holds = slot_holds.holds_between(*bounds, exclude_session=session_id)
+        if not holds:
+            return result
+        held = format_holds_as_events(holds, SLOT_HOLD_TIMEZONE)
+        return f"{result}\n{held}" if result.strip() else held
+
+    def _call(self, tool_name: str, tool_args: dict, session_id: Optional[str], callbacks=None) -> str:
+        """Blocking: slot holds around the (possibly coalesced) MCP call."""
+        execute = lambda: self._execute_mcp_request(tool_name, tool_args, callbacks)
+        if calendar_coalescer is not None:
+            # Identical concurrent reads share one subprocess call; writes invalidate cached reads
+            execute = lambda: calendar_coalescer.call(tool_name, coalescing_args(tool_args), lambda: self._execute_mcp_request(tool_name, tool_args, callbacks))
+        if slot_holds is None:
+            return execute()
+        if tool_name == "create-event" and session_id:
+            return self._create_with_hold(tool_args, session_id, execute)
+        if tool_name in ("list-events", "search-events"):
+            # Holds are applied after coalescing: the shared result is the same for every session
+            return self._with_other_holds(tool_args, session_id, execute())
+        return execute()
+
+    def _run(self, command: str, run_manager: Optional[CallbackManagerForToolRun] = None, **kwargs: Any) -> str:
+        """Use the tool by executing the MCP server and communicating via stdin/stdout."""
+        logger.debug("Calendar tool command received", extra=log_payload(command=command))
+        tool_name, tool_args, error = self._parse_command(command)
+        if error:
+            return error
+        if tool_name in WRITE_TOOLS:
+            note_calendar_write()
+        callbacks = run_manager.get_child() if run_manager else None
+        return self._call(tool_name, tool_args, current_session_id.get(), callbacks)
+
+    async def _arun(self, command: str, run_manager: Optional[AsyncCallbackManagerForToolRun] = None, **kwargs: Any) -> str:
+        logger.debug("Async calendar tool command received", extra=log_payload(command=command))
+        tool_name, tool_args, error = self._parse_command(command)
+        if error:
+            return error
+        if tool_name in WRITE_TOOLS:
+            note_calendar_write()
+        session_id = current_session_id.get()
+        callbacks = run_manager.get_child() if run_manager else None
+        if slot_holds is not None and tool_name == "create-event" and session_id:
+            # Lease, booking and release run together in a worker thread
+            return await asyncio.to_thread(self._call, tool_name, tool_args, session_id, callbacks)
+        execute = functools.partial(self._aexecute_mcp_request, tool_name, tool_args, callbacks)
+        if calendar_coalescer is None:
+            result = await execute()
+        else:
+            result = await calendar_coalescer.acall(tool_name, coalescing_args(tool_args), execute)
+        if slot_holds is not None and tool_name in ("list-events", "search-events"):
+            result = self._with_other_holds(tool_args, session_id, result)
+        return result
+
 # Rename the class reference to maintain compatibility with agent.py
 GoogleCalendarCLIWrapper = GoogleCalendarSubprocessWrapper
 
+# Prebuilt, memory-mapped sitemap index (see sitemap_index.py); None -> fetch vector_store_data_url live
+sitemap_index = load_sitemap_index_from_config()
+sitemap_query_embeddings = None
+if sitemap_index:
+    from langchain_openai import OpenAIEmbeddings
+    # Queries must be embedded with the same model the index was built with
+    sitemap_query_embeddings = OpenAIEmbeddings(model=sitemap_index.model)
+VECTOR_STORE_TOP_K = get_config("vector_store_top_k", 5)
+
+def format_index_results(query_vector) -> str:
+    results = sitemap_index.search(query_vector, top_k=VECTOR_STORE_TOP_K)
+    return json.dumps({"index_version": sitemap_index.version, "results": results}, ensure_ascii=False, indent=2)
+
+# vector (embeddings only) | bm25 (local lexical search, no embedding call) | hybrid (both, fused)
+VECTOR_STORE_RETRIEVAL_MODE = get_config("vector_store_retrieval_mode", "vector")
+VECTOR_STORE_HYBRID_VECTOR_WEIGHT = get_config("vector_store_hybrid_vector_weight", 0.5)
+_lexical_index = None
+_lexical_chunks = []
+_lexical_source = None # (data_url, ETag, content digest) of the live payload the index was built from
+_lexical_checked_at = 0.0
+_lexical_lock = threading.Lock()
+
+def lexical_index_is_fresh(data_url: str) -> bool:
+    """True while the BM25 index can be used without revalidating its source."""
+    if _lexical_index is None:
+        return False
+    if sitemap_index:
+        return True # The offline index only changes with a restart
+    return (_lexical_source[0] == data_url
+            and time.monotonic() - _lexical_checked_at < get_config("vector_store_bm25_ttl_seconds", 3600))
+
+def reset_lexical_index(snapshot=None):
+    """Drops the BM25 index (config reload subscriber); the next lexical search rebuilds it."""
+    global _lexical_index, _lexical_chunks, _lexical_source
+    with _lexical_lock:
+        _lexical_index, _lexical_chunks, _lexical_source = None, [], None
+
+subscribe(reset_lexical_index)
+
+def _fetch_lexical_chunks(data_url: str):
+    """
+    Chunks of the live vector_store_data_url payload, or None when it has not changed since the
+    index was built (304 to the ETag, or same content digest). Blocking; call under _lexical_lock.
+    """
+    global _lexical_source
+    known = _lexical_source if _lexical_index is not None and _lexical_source[0] == data_url else None
+    headers = {"If-None-Match": known[1]} if known and known[1] else {}
+    response = httpx.get(data_url, headers=headers, timeout=remaining_timeout(30.0))
+    if known and response.status_code == 304:
+        return None
+    response.raise_for_status()
+    digest = hashlib.sha256(response.content).hexdigest()
+    etag = response.headers.get("etag")
+    if known and digest == known[2]:
+        _lexical_source = (data_url, etag, digest)
+        return None
+    notify_source_content(data_url, response.content)
+    _lexical_source = (data_url, etag, digest)
+    return chunk_documents(documents_from_json(response.json(), url=data_url))
+
+def get_lexical_index(data_url: str):
+    """
+    BM25 index over the offline index chunks or, without one, over the chunked
+    vector_store_data_url payload. Built on first use; the live payload is revalidated every
+    vector_store_bm25_ttl_seconds and the index rebuilt when it changed.
+    """
+    global _lexical_index, _lexical_chunks, _lexical_checked_at
+    with _lexical_lock:
+        if not lexical_index_is_fresh(data_url):
+            if sitemap_index:
+                chunks = sitemap_index.chunks
+            else:
+                try:
+                    chunks = _fetch_lexical_chunks(data_url)
+                except (httpx.HTTPError, ValueError, DeadlineExceeded) as e:
+                    if _lexical_index is None or _lexical_source[0] != data_url:
+                        raise
+                    logger.warning(f"Could not revalidate {data_url}, keeping the current BM25 index: {e}")
+                    chunks = None
+                _lexical_checked_at = time.monotonic()
+            if chunks is not None:
+                started = time.perf_counter()
+                _lexical_chunks = chunks
+                _lexical_index = BM25Index([f"{c['title']}\n{c['text']}" for c in chunks])
+                logger.info(f"Built BM25 index over {len(chunks)} chunks in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return _lexical_index, _lexical_chunks
+
+def format_lexical_results(query: str, data_url: str, query_vector=None) -> str:
+    """Top-k chunks by BM25, fused with the offline index's cosine scores when query_vector is given."""
+    index, chunks = get_lexical_index(data_url)
+    scores = index.scores(query)
+    if query_vector is not None:
+        scores = fuse_scores(scores, sitemap_index.scores(query_vector), VECTOR_STORE_HYBRID_VECTOR_WEIGHT)
+    results = [{**chunks[i], "score": round(score, 4)} for i, score in top_k_indices(scores, VECTOR_STORE_TOP_K)]
+    return json.dumps({
+        "index_version": sitemap_index.version if sitemap_index else None,
+        "retrieval_mode": "hybrid" if query_vector is not None else "bm25",
+        "results": results,
+    }, ensure_ascii=False, indent=2)
+
 # Schema for the Vector Store Tool input
 class VectorStoreInput(BaseModel):
     query: str = Field(description="The user query for semantic search.")
@@ -572,28 +657,49 @@ class VectorStoreSitemapTool(BaseTool):
     description: str = get_config("vector_store_tool_description", "Query a vector store based on website data.")
     args_schema: Type[BaseModel] = VectorStoreInput
     data_url: str = get_config("vector_store_data_url", "")
+    # The offline index and the BM25 index are process-wide and built from the base config;
+    # tenants with their own vector_store_data_url turn this off and fetch their URL live
+    use_offline_index: bool = True
 
     def _run(
         self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None
     ) -> str:
         """Use the tool by fetching data from the configured URL."""
-        logger.info(f"VectorStoreSitemapTool received query: {query}")
-        logger.info(f"VectorStoreSitemapTool attempting to fetch data from: {self.data_url}")
+        logger.debug("VectorStoreSitemapTool received query", extra=log_payload(query=query))
+
+        if self.use_offline_index and VECTOR_STORE_RETRIEVAL_MODE in ("bm25", "hybrid") and (sitemap_index or self.data_url):
+            try:
+                # Hybrid needs the offline index for vectors; without one it degrades to pure BM25
+                query_vector = None
+                if VECTOR_STORE_RETRIEVAL_MODE == "hybrid" and sitemap_index:
+                    query_vector = sitemap_query_embeddings.embed_query(query)
+                return format_lexical_results(query, self.data_url, query_vector)
+            except Exception as exc:
+                logger.exception(f"VectorStoreSitemapTool lexical search error: {exc}")
+                return f"Error: An unexpected error occurred in the vector store tool: {exc}"
+        if self.use_offline_index and sitemap_index:
+            try:
+                return format_index_results(sitemap_query_embeddings.embed_query(query))
+            except Exception as exc:
+                logger.exception(f"VectorStoreSitemapTool index search error: {exc}")
+                return f"Error: An unexpected error occurred in the vector store tool: {exc}"
+        logger.debug(f"VectorStoreSitemapTool attempting to fetch data from: {self.data_url}")
 
         if not self.data_url:
             logger.error("VectorStoreSitemapTool error: data_url is not configured.")
             return "Error: Vector store data URL is not configured."
 
         try:
-            response = httpx.get(self.data_url, timeout=30.0)
+            response = httpx.get(self.data_url, timeout=remaining_timeout(30.0))
             response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
+            notify_source_content(self.data_url, response.content) # Keeps answer caches in sync with the data
             
             # Return the entire JSON content as a string
             # Langchain tools expect string output
             json_content = response.json() # Parse JSON first to ensure validity
             response_string = json.dumps(json_content, ensure_ascii=False, indent=2) # Return pretty-printed JSON string
             
-            logger.info(f"VectorStoreSitemapTool successfully fetched data. Returning content (length: {len(response_string)}). First 200 chars: {response_string[:200]}...")
+            logger.info(f"VectorStoreSitemapTool successfully fetched data (length: {len(response_string)}).")
             # TODO: Implement actual semantic search on the fetched content based on the 'query'
             return response_string 
 
@@ -614,8 +720,27 @@ class VectorStoreSitemapTool(BaseTool):
         self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None
     ) -> str:
         """Use the tool asynchronously by fetching data from the configured URL."""
-        logger.info(f"VectorStoreSitemapTool received async query: {query}")
-        logger.info(f"VectorStoreSitemapTool attempting async fetch data from: {self.data_url}")
+        logger.debug("VectorStoreSitemapTool received async query", extra=log_payload(query=query))
+
+        if self.use_offline_index and VECTOR_STORE_RETRIEVAL_MODE in ("bm25", "hybrid") and (sitemap_index or self.data_url):
+            try:
+                query_vector = None
+                if VECTOR_STORE_RETRIEVAL_MODE == "hybrid" and sitemap_index:
+                    query_vector = await sitemap_query_embeddings.aembed_query(query)
+                if not lexical_index_is_fresh(self.data_url):
+                    # First use (or revalidation) fetches vector_store_data_url; keep that off the event loop
+                    await asyncio.to_thread(get_lexical_index, self.data_url)
+                return format_lexical_results(query, self.data_url, query_vector)
+            except Exception as exc:
+                logger.exception(f"VectorStoreSitemapTool lexical search error: {exc}")
+                return f"Error: An unexpected error occurred in the vector store tool: {exc}"
+        if self.use_offline_index and sitemap_index:
+            try:
+                return format_index_results(await sitemap_query_embeddings.aembed_query(query))
+            except Exception as exc:
+                logger.exception(f"VectorStoreSitemapTool index search error: {exc}")
+                return f"Error: An unexpected error occurred in the vector store tool: {exc}"
+        logger.debug(f"VectorStoreSitemapTool attempting async fetch data from: {self.data_url}")
         
         if not self.data_url:
             logger.error("VectorStoreSitemapTool async error: data_url is not configured.")
@@ -623,14 +748,15 @@ class VectorStoreSitemapTool(BaseTool):
 
         async with httpx.AsyncClient() as client:
             try:
-                response = await client.get(self.data_url, timeout=30.0)
+                response = await client.get(self.data_url, timeout=remaining_timeout(30.0))
                 response.raise_for_status()
+                notify_source_content(self.data_url, response.content)
                 
                 # Return the entire JSON content as a string
                 json_content = response.json()
                 response_string = json.dumps(json_content, ensure_ascii=False, indent=2)
 
-                logger.info(f"VectorStoreSitemapTool successfully fetched data async. Returning content (length: {len(response_string)}). First 200 chars: {response_string[:200]}...")
+                logger.info(f"VectorStoreSitemapTool successfully fetched data async (length: {len(response_string)}).")
                 # TODO: Implement actual async semantic search on the fetched content based on the 'query'
                 return response_string
 
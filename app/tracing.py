@@ -0,0 +1,355 @@
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from typing import Optional
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config_loader import get_config
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "calendar-agent"
+
+# OTLP span kinds / status codes (https://opentelemetry.io/docs/specs/otlp/)
+SPAN_KIND = {"INTERNAL": 1, "SERVER": 2, "CLIENT": 3}
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Chain runs worth a span of their own; the many small runnables inside them
+# (prompt, parser, passthroughs) are folded into their nearest recorded ancestor.
+TRACED_CHAINS = {"AgentExecutor", "RunnableWithMessageHistory"}
+
+
+def _otel_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """One timed operation of a session turn; exported in OTLP/JSON shape."""
+
+    __slots__ = ("session_id", "trace_id", "span_id", "parent", "name", "kind", "state",
+                 "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, session_id: str, name: str, kind: str = "INTERNAL", parent: "Span" = None, attributes: dict = None):
+        self.session_id = session_id
+        self.parent = parent
+        # One trace per turn: children inherit the turn's trace id and conversation state
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.state = parent.state if parent else (attributes or {}).get("state")
+        self.span_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.kind = kind
+        self.attributes = {"session.id": session_id, **(attributes or {})}
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    @property
+    def duration_seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_otel(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [{"key": key, "value": _otel_value(value)} for key, value in self.attributes.items() if value is not None],
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error else {"code": STATUS_OK},
+        }
+        if self.parent:
+            span["parentSpanId"] = self.parent.span_id
+        return span
+
+
+class SpanExporter:
+    """
+    Batches finished spans on a background thread and writes them as OTLP/JSON
+    ExportTraceServiceRequest documents: one line per batch to a JSONL file (the format of
+    the OpenTelemetry Collector file exporter) and/or POSTed to an OTLP/HTTP endpoint.
+    Never blocks the caller; spans are dropped when the queue is full.
+    """
+
+    def __init__(self, path: str = "", otlp_endpoint: str = "", batch_size: int = 256, flush_interval_seconds: float = 2.0):
+        self.path = path
+        self.otlp_endpoint = otlp_endpoint
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=10000)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._worker, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span.to_otel())
+        except queue.Full:
+            self.dropped += 1
+
+    def shutdown(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def _worker(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = []
+            deadline = time.monotonic() + self.flush_interval_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+
+    def _write(self, spans: list):
+        document = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+            }]
+        }
+        if self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(document, ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not write spans to {self.path}: {e}")
+        if self.otlp_endpoint:
+            try:
+                httpx.post(self.otlp_endpoint, json=document, timeout=5.0).raise_for_status()
+            except httpx.HTTPError as e:
+                logger.warning(f"Could not export spans to {self.otlp_endpoint}: {e}")
+
+
+class SessionTraceStats:
+    """Per-session totals behind the trace-summary endpoint."""
+
+    def __init__(self):
+        self.turns = 0
+        self.turn_seconds = 0.0
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.tool_calls = 0
+        self.errors = 0
+        self.by_span = defaultdict(lambda: {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+        self.by_state = defaultdict(lambda: {"turns": 0, "seconds": 0.0, "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+
+    def record(self, span: Span):
+        duration = span.duration_seconds
+        stage = self.by_span[span.name]
+        stage["count"] += 1
+        stage["seconds"] += duration
+        stage["max_seconds"] = max(stage["max_seconds"], duration)
+        state = self.by_state[span.state or "unknown"]
+        if span.error:
+            self.errors += 1
+        if span.parent is None:
+            self.turns += 1
+            self.turn_seconds += duration
+            state["turns"] += 1
+            state["seconds"] += duration
+        elif span.kind == "CLIENT" and span.name == "llm":
+            prompt_tokens = span.attributes.get("gen_ai.usage.input_tokens") or 0
+            completion_tokens = span.attributes.get("gen_ai.usage.output_tokens") or 0
+            self.llm_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            state["llm_calls"] += 1
+            state["prompt_tokens"] += prompt_tokens
+            state["completion_tokens"] += completion_tokens
+        elif span.name.startswith("tool:"):
+            self.tool_calls += 1
+
+    def summary(self) -> dict:
+        def rounded(stats: dict) -> dict:
+            return {key: round(value, 3) if isinstance(value, float) else value for key, value in stats.items()}
+
+        return {
+            "turns": self.turns,
+            "turn_seconds": round(self.turn_seconds, 3),
+            "llm_calls": self.llm_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tool_calls": self.tool_calls,
+            "errors": self.errors,
+            "by_state": {name: rounded(stats) for name, stats in self.by_state.items()},
+            # Slowest stages first: where this conversation spent its time
+            "by_span": dict(sorted(((name, rounded(stats)) for name, stats in self.by_span.items()),
+                                   key=lambda item: item[1]["seconds"], reverse=True)),
+        }
+
+
+class Tracer:
+    """Creates spans, keeps per-session totals (LRU-bounded) and hands finished spans to the exporter."""
+
+    def __init__(self, exporter: Optional[SpanExporter] = None, max_sessions: int = 1000):
+        self.exporter = exporter
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, SessionTraceStats]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start_span(self, session_id: str, name: str, parent: Span = None, kind: str = "INTERNAL", **attributes) -> Span:
+        return Span(session_id, name, kind=kind, parent=parent, attributes=attributes)
+
+    def end_span(self, span: Optional[Span], error: str = None, **attributes):
+        """Finishes a span; safe to call twice (only the first call counts)."""
+        if span is None or span.end_ns is not None:
+            return
+        span.end_ns = time.time_ns()
+        span.attributes.update(attributes)
+        if error:
+            span.error = str(error)[:500]
+        with self._lock:
+            stats = self._sessions.get(span.session_id)
+            if stats is None:
+                stats = self._sessions[span.session_id] = SessionTraceStats()
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(span.session_id)
+            stats.record(span)
+        if self.exporter:
+            self.exporter.export(span)
+
+    @contextmanager
+    def span(self, session_id: str, name: str, parent: Span = None, kind: str = "INTERNAL", **attributes):
+        span = self.start_span(session_id, name, parent=parent, kind=kind, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, error=f"{type(e).__name__}: {e}")
+            raise
+        self.end_span(span)
+
+    def callback_handler(self, session_id: str, parent: Span) -> "TracingCallbackHandler":
+        return TracingCallbackHandler(self, session_id, parent)
+
+    def summary(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            stats = self._sessions.get(session_id)
+            return stats.summary() if stats else None
+
+
+def _run_name(serialized: Optional[dict], kwargs: dict) -> str:
+    if kwargs.get("name"):
+        return kwargs["name"]
+    serialized = serialized or {}
+    return serialized.get("name") or (serialized.get("id") or ["unknown"])[-1]
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callbacks -> nested spans under one turn span: agent executor, every LLM call
+    (model, token usage, time to first token) and every tool call.
+    """
+
+    def __init__(self, tracer: Tracer, session_id: str, parent: Span):
+        self.tracer = tracer
+        self.session_id = session_id
+        self.root = parent
+        self._spans = {}  # run_id -> Span
+        self._folded = {}  # run_id of an untraced run -> span its children attach to
+
+    def _parent_of(self, parent_run_id) -> Span:
+        if parent_run_id is None:
+            return self.root
+        return self._spans.get(parent_run_id) or self._folded.get(parent_run_id) or self.root
+
+    def _start(self, run_id, parent_run_id, name: str, kind: str = "INTERNAL", **attributes):
+        self._spans[run_id] = self.tracer.start_span(self.session_id, name, parent=self._parent_of(parent_run_id), kind=kind, **attributes)
+
+    def _end(self, run_id, error=None, **attributes):
+        self._folded.pop(run_id, None)
+        self.tracer.end_span(self._spans.pop(run_id, None), error=error, **attributes)
+
+    # --- chains ---
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        name = _run_name(serialized, kwargs)
+        if name in TRACED_CHAINS:
+            self._start(run_id, parent_run_id, f"chain:{name}")
+        else:
+            self._folded[run_id] = self._parent_of(parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+    # --- LLM calls ---
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        self._start(run_id, parent_run_id, "llm", kind="CLIENT",
+                    **{"gen_ai.system": "openai", "gen_ai.request.model": params.get("model_name") or params.get("model")})
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self.on_chat_model_start(serialized, prompts, run_id=run_id, parent_run_id=parent_run_id, **kwargs)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        span = self._spans.get(run_id)
+        if span is not None and "gen_ai.time_to_first_token_ms" not in span.attributes:
+            span.attributes["gen_ai.time_to_first_token_ms"] = round((time.time_ns() - span.start_ns) / 1e6, 1)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        input_tokens = output_tokens = 0
+        for generations in response.generations or []:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        if not (input_tokens or output_tokens):
+            # Non-streaming responses report usage here instead
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            input_tokens = token_usage.get("prompt_tokens", 0)
+            output_tokens = token_usage.get("completion_tokens", 0)
+        self._end(run_id, **{"gen_ai.usage.input_tokens": input_tokens, "gen_ai.usage.output_tokens": output_tokens})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+    # --- tools ---
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, f"tool:{_run_name(serialized, kwargs)}", **{"tool.input_length": len(str(input_str))})
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id, **{"tool.output_length": len(str(output))})
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+
+def create_tracer_from_config() -> Optional[Tracer]:
+    """Builds the session tracer from config.json, or None if disabled."""
+    if not get_config("tracing_enabled", False):
+        return None
+    export_path = get_config("tracing_export_path", "")
+    otlp_endpoint = get_config("tracing_otlp_endpoint", "")
+    exporter = None
+    if export_path or otlp_endpoint:
+        if export_path and os.path.dirname(export_path):
+            os.makedirs(os.path.dirname(export_path), exist_ok=True)
+        exporter = SpanExporter(path=export_path, otlp_endpoint=otlp_endpoint)
+    return Tracer(exporter=exporter, max_sessions=get_config("tracing_max_sessions", 1000))
@@ -0,0 +1,70 @@
+#!/usr/bin/env node
+// Stand-in for mcp_server/build/index.js in load tests (MCP_SERVER_SCRIPT_PATH points here).
+// Same process model as the real server: one process per tool call, one JSON-RPC request on
+// stdin, one response on stdout. Google Calendar latency is simulated with
+// FAKE_MCP_LATENCY_MS (default 250).
+
+const { createInterface } = require('node:readline');
+
+const latencyMs = Number(process.env.FAKE_MCP_LATENCY_MS || 250);
+
+function nextWeekdays(count) {
+  const days = [];
+  const day = new Date();
+  day.setHours(0, 0, 0, 0);
+  while (days.length < count) {
+    day.setDate(day.getDate() + 1);
+    if (day.getDay() !== 0 && day.getDay() !== 6) days.push(new Date(day));
+  }
+  return days;
+}
+
+function isoLocal(date, hour) {
+  const pad = (n) => String(n).padStart(2, '0');
+  return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())}T${pad(hour)}:00:00-03:00`;
+}
+
+function formatEvents() {
+  // A couple of busy blocks per day, formatted like handlers/callTool.ts formatEventList
+  return nextWeekdays(5)
+    .flatMap((day, index) => [
+      `Reunião interna (busy-${index}-a)\nStart: ${isoLocal(day, 9)}\nEnd: ${isoLocal(day, 10)}\n`,
+      `Almoço (busy-${index}-b)\nStart: ${isoLocal(day, 12)}\nEnd: ${isoLocal(day, 13)}\n`,
+    ])
+    .join('\n');
+}
+
+function handle(request) {
+  const { name, arguments: args = {} } = request.params || {};
+  switch (name) {
+    case 'list-events':
+    case 'search-events': {
+      // Short single-slot checks (intent router) see a free slot
+      const span = args.timeMin && args.timeMax ? Date.parse(args.timeMax) - Date.parse(args.timeMin) : Infinity;
+      return span <= 2 * 60 * 60 * 1000 ? '' : formatEvents();
+    }
+    case 'create-event':
+      return `Event created: ${args.summary} (loadtest-${Math.random().toString(36).slice(2, 10)})`;
+    case 'update-event':
+      return `Event updated: ${args.summary} (${args.eventId})`;
+    case 'delete-event':
+      return 'Event deleted successfully';
+    case 'list-calendars':
+      return `Load test (${args.calendarId || 'primary'})`;
+    default:
+      return null;
+  }
+}
+
+const rl = createInterface({ input: process.stdin });
+rl.once('line', (line) => {
+  const request = JSON.parse(line);
+  setTimeout(() => {
+    const text = handle(request);
+    const response = text === null
+      ? { jsonrpc: '2.0', id: request.id, error: { code: -32601, message: `Unknown tool: ${request.params?.name}` } }
+      : { jsonrpc: '2.0', id: request.id, result: { content: [{ type: 'text', text }] } };
+    process.stdout.write(JSON.stringify(response) + '\n');
+    rl.close();
+  }, latencyMs);
+});
@@ -0,0 +1,400 @@
+"""
+End-to-end load test for the WebSocket API.
+
+Opens many concurrent /ws/{session_id} connections, each driving the scripted
+qualification -> scheduling conversation from scenario.py, and reports turn latency
+percentiles, throughput, error rate, event-loop lag and server RSS.
+
+By default it starts everything locally: the stand-in services (stubs.py on --stub-port),
+and the app itself (uvicorn on --app-port) pointed at them through a derived config
+(CONFIG_PATH), OPENAI_BASE_URL and MCP_SERVER_SCRIPT_PATH=fake_mcp_server.js.
+
+    python loadtest/run.py --sessions 2000 --ramp-seconds 60
+    python loadtest/run.py --sessions 500 --set semantic_cache_enabled=false --json report.json
+    python loadtest/run.py --url ws://staging:3001 --server-pid 1234   # existing server
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import signal
+import asyncio
+import argparse
+import resource
+import tempfile
+import statistics
+import subprocess
+from collections import defaultdict
+
+import httpx
+import websockets
+
+from scenario import QUALIFICATION_MESSAGES, SCHEDULING_MESSAGES
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(LOADTEST_DIR)
+
+
+# --- Measurements ---
+
+class Stats:
+    def __init__(self):
+        self.turn_latencies = defaultdict(list)  # phase -> [seconds]
+        self.first_answer_latencies = []
+        self.turn_errors = defaultdict(int)  # kind -> count
+        self.turns = 0
+        self.sessions_started = 0
+        self.sessions_completed = 0
+        self.sessions_not_qualified = 0
+        self.sessions_failed = 0
+        self.probe_latencies = []
+        self.rss_samples = []  # (elapsed, server_rss_kb, children_rss_kb)
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def read_rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        pass
+    return 0
+
+
+def child_pids(pid: int) -> list:
+    pids = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                pids.extend(int(p) for p in f.read().split())
+    except (FileNotFoundError, PermissionError):
+        pass
+    return pids
+
+
+# --- Conversation driver ---
+
+class TurnFailed(Exception):
+    pass
+
+
+async def run_turn(ws, message: str, phase: str, stats: Stats, turn_timeout: float) -> dict:
+    """Sends one user message and waits for the server's "end"; returns what the turn produced."""
+    started = time.perf_counter()
+    await ws.send(message)
+    outcome = {"answers": [], "error": None, "closed": False}
+    try:
+        while True:
+            raw = await asyncio.wait_for(ws.recv(), timeout=max(0.1, turn_timeout - (time.perf_counter() - started)))
+            payload = json.loads(raw)
+            kind = payload.get("type")
+            if kind == "final_answer":
+                if not outcome["answers"]:
+                    stats.first_answer_latencies.append(time.perf_counter() - started)
+                outcome["answers"].append(payload.get("message", ""))
+            elif kind == "error":
+                outcome["error"] = payload.get("message", "")
+            elif kind == "end":
+                break
+    except asyncio.TimeoutError:
+        stats.turn_errors["timeout"] += 1
+        raise TurnFailed("turn timed out")
+    except websockets.ConnectionClosed:
+        # The server closes normally after a "not qualified" answer
+        outcome["closed"] = True
+    stats.turns += 1
+    stats.turn_latencies[phase].append(time.perf_counter() - started)
+    if outcome["error"] is not None:
+        stats.turn_errors["error_message"] += 1
+    return outcome
+
+
+async def run_session(number: int, args, stats: Stats):
+    session_id = f"loadtest-{uuid.uuid4().hex[:12]}"
+    stats.sessions_started += 1
+    try:
+        async with websockets.connect(f"{args.url}/ws/{session_id}", open_timeout=args.turn_timeout,
+                                      max_size=None, ping_interval=None) as ws:
+            for message in QUALIFICATION_MESSAGES:
+                outcome = await run_turn(ws, message, "qualification", stats, args.turn_timeout)
+                if outcome["closed"]:
+                    stats.sessions_not_qualified += 1
+                    return
+                await asyncio.sleep(random.uniform(0.5, 1.5) * args.think_time)
+            for message in SCHEDULING_MESSAGES:
+                outcome = await run_turn(ws, message.format(session_number=number), "scheduling", stats, args.turn_timeout)
+                if outcome["closed"]:
+                    raise TurnFailed("connection closed during scheduling")
+                await asyncio.sleep(random.uniform(0.5, 1.5) * args.think_time)
+        stats.sessions_completed += 1
+    except (TurnFailed, websockets.ConnectionClosed, websockets.InvalidHandshake, OSError, asyncio.TimeoutError) as e:
+        stats.sessions_failed += 1
+        stats.turn_errors[f"session:{type(e).__name__}"] += 1
+
+
+async def probe_event_loop(args, stats: Stats, stop: asyncio.Event):
+    """Times a trivial HTTP request every second; spikes mean the server's event loop was blocked."""
+    http_url = args.url.replace("ws://", "http://").replace("wss://", "https://")
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                await client.get(http_url + "/")
+                stats.probe_latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError:
+                stats.turn_errors["probe_failed"] += 1
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def sample_rss(pid: int, stats: Stats, stop: asyncio.Event, started: float):
+    while not stop.is_set():
+        children = sum(read_rss_kb(child) for child in child_pids(pid))
+        stats.rss_samples.append((time.perf_counter() - started, read_rss_kb(pid), children))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def drive(args, server_pid) -> tuple:
+    stats = Stats()
+    stop = asyncio.Event()
+    started = time.perf_counter()
+    monitors = [asyncio.create_task(probe_event_loop(args, stats, stop))]
+    if server_pid:
+        monitors.append(asyncio.create_task(sample_rss(server_pid, stats, stop, started)))
+
+    # Sessions start evenly over the ramp and then stay connected for their whole conversation
+    sessions = []
+    for number in range(args.sessions):
+        sessions.append(asyncio.create_task(run_session(number, args, stats)))
+        if args.ramp_seconds and args.sessions > 1:
+            await asyncio.sleep(args.ramp_seconds / args.sessions)
+    await asyncio.gather(*sessions)
+
+    stop.set()
+    await asyncio.gather(*monitors)
+    return stats, time.perf_counter() - started
+
+
+# --- Report ---
+
+def build_report(stats: Stats, elapsed: float) -> dict:
+    def summary(values):
+        return {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p90_ms": round(percentile(values, 90) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "max_ms": round(max(values) * 1000, 1) if values else float("nan"),
+            "mean_ms": round(statistics.fmean(values) * 1000, 1) if values else float("nan"),
+        }
+
+    all_turns = [latency for values in stats.turn_latencies.values() for latency in values]
+    turn_errors = stats.turn_errors["timeout"] + stats.turn_errors["error_message"]
+    report = {
+        "elapsed_seconds": round(elapsed, 1),
+        "sessions": {
+            "started": stats.sessions_started,
+            "completed": stats.sessions_completed,
+            "not_qualified": stats.sessions_not_qualified,
+            "failed": stats.sessions_failed,
+        },
+        "turns": stats.turns,
+        "throughput_turns_per_second": round(stats.turns / elapsed, 2) if elapsed else 0,
+        "error_rate": round(turn_errors / max(1, stats.turns + stats.turn_errors["timeout"]), 4),
+        "errors": dict(stats.turn_errors),
+        "turn_latency": {"all": summary(all_turns), **{phase: summary(v) for phase, v in stats.turn_latencies.items()}},
+        "time_to_first_answer": summary(stats.first_answer_latencies),
+        "event_loop_probe": summary(stats.probe_latencies),
+    }
+    if stats.rss_samples:
+        server = [sample[1] for sample in stats.rss_samples]
+        children = [sample[2] for sample in stats.rss_samples]
+        report["server_rss_mb"] = {
+            "start": round(server[0] / 1024, 1),
+            "peak": round(max(server) / 1024, 1),
+            "end": round(server[-1] / 1024, 1),
+            "peak_with_children": round(max(s + c for s, c in zip(server, children)) / 1024, 1),
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"\nElapsed: {report['elapsed_seconds']}s")
+    sessions = report["sessions"]
+    print(f"Sessions: {sessions['started']} started, {sessions['completed']} completed, "
+          f"{sessions['not_qualified']} not qualified, {sessions['failed']} failed")
+    print(f"Turns: {report['turns']} ({report['throughput_turns_per_second']}/s), error rate {report['error_rate']:.2%}")
+    if report["errors"]:
+        print(f"Errors: {report['errors']}")
+    print(f"\n{'latency':<26}{'count':>8}{'p50':>10}{'p90':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+    rows = [(f"turn ({name})", values) for name, values in report["turn_latency"].items()]
+    rows += [("time to first answer", report["time_to_first_answer"]), ("event loop probe", report["event_loop_probe"])]
+    for name, values in rows:
+        print(f"{name:<26}{values['count']:>8}{values['p50_ms']:>10}{values['p90_ms']:>10}"
+              f"{values['p95_ms']:>10}{values['p99_ms']:>10}{values['max_ms']:>10}")
+    if "server_rss_mb" in report:
+        rss = report["server_rss_mb"]
+        print(f"\nServer RSS (MB): start {rss['start']}, peak {rss['peak']}, end {rss['end']}, "
+              f"peak incl. MCP subprocesses {rss['peak_with_children']}")
+
+
+# --- Local environment ---
+
+def parse_overrides(pairs: list) -> dict:
+    overrides = {}
+    for pair in pairs or []:
+        key, _, value = pair.partition("=")
+        try:
+            overrides[key] = json.loads(value)
+        except json.JSONDecodeError:
+            overrides[key] = value
+    return overrides
+
+
+def write_loadtest_config(args) -> str:
+    with open(os.path.join(REPO_DIR, "config.json"), encoding="utf-8") as f:
+        config = json.load(f)
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    config["qualification_api_url"] = f"{stub_url}/qualify"
+    config["vector_store_data_url"] = f"{stub_url}/vector-store.json"
+    config.update(parse_overrides(args.set))
+    handle, path = tempfile.mkstemp(prefix="loadtest-config-", suffix=".json")
+    with os.fdopen(handle, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False)
+    return path
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited during startup (code {process.returncode})")
+        try:
+            httpx.get(url, timeout=2.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_local_stack(args, config_path: str, processes: list):
+    """Starts the stubs and the app (app first in `processes`); appends each as it starts, so the caller can stop them."""
+    stub_env = {
+        **os.environ,
+        "LOADTEST_LLM_TTFT_MS": str(args.llm_ttft_ms),
+        "LOADTEST_LLM_TOKEN_MS": str(args.llm_token_ms),
+        "LOADTEST_EMBEDDING_MS": str(args.embedding_ms),
+        "LOADTEST_QUALIFICATION_MS": str(args.qualification_ms),
+        "LOADTEST_QUALIFY_RATE": str(args.qualify_rate),
+    }
+    stubs = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "stubs:app", "--app-dir", LOADTEST_DIR,
+         "--port", str(args.stub_port), "--log-level", "warning"],
+        env=stub_env,
+    )
+    processes.append(stubs)
+    wait_until_up(f"http://127.0.0.1:{args.stub_port}/vector-store.json", stubs)
+
+    openai_url = f"http://127.0.0.1:{args.stub_port}/v1"
+    app_env = {
+        **os.environ,
+        "CONFIG_PATH": config_path,
+        "OPENAI_API_KEY": "loadtest",
+        "OPENAI_BASE_URL": openai_url,
+        "OPENAI_API_BASE": openai_url,
+        "MCP_SERVER_SCRIPT_PATH": os.path.join(LOADTEST_DIR, "fake_mcp_server.js"),
+        "FAKE_MCP_LATENCY_MS": str(args.mcp_latency_ms),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", os.path.join(REPO_DIR, "app"),
+         "--port", str(args.app_port), "--log-level", "warning"],
+        env=app_env,
+        stdout=subprocess.DEVNULL if not args.server_logs else None,
+    )
+    processes.insert(0, server)
+    wait_until_up(f"http://127.0.0.1:{args.app_port}/", server)
+
+
+def stop_processes(processes: list):
+    for process in processes:
+        if process.poll() is None:
+            process.send_signal(signal.SIGINT)
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def raise_file_limit():
+    # Each session holds a socket (and the local server another); thousands need more than the usual 1024
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200, help="concurrent conversations to run")
+    parser.add_argument("--ramp-seconds", type=float, default=30.0, help="spread session starts over this long")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds a user waits between messages")
+    parser.add_argument("--turn-timeout", type=float, default=120.0)
+    parser.add_argument("--url", help="ws:// base URL of an already running server (skips the local stack)")
+    parser.add_argument("--server-pid", type=int, help="PID to sample RSS from when using --url")
+    parser.add_argument("--app-port", type=int, default=8901)
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--set", action="append", metavar="KEY=VALUE",
+                        help="config.json override for the local server (JSON values), repeatable")
+    parser.add_argument("--llm-ttft-ms", type=float, default=400)
+    parser.add_argument("--llm-token-ms", type=float, default=15)
+    parser.add_argument("--embedding-ms", type=float, default=60)
+    parser.add_argument("--qualification-ms", type=float, default=150)
+    parser.add_argument("--qualify-rate", type=float, default=1.0, help="fraction of sessions the fake API approves")
+    parser.add_argument("--mcp-latency-ms", type=float, default=250)
+    parser.add_argument("--server-logs", action="store_true", help="show the local server's stdout")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    raise_file_limit()
+    processes = []
+    config_path = None
+    server_pid = args.server_pid
+    try:
+        if not args.url:
+            config_path = write_loadtest_config(args)
+            start_local_stack(args, config_path, processes)
+            server_pid = processes[0].pid
+            args.url = f"ws://127.0.0.1:{args.app_port}"
+        stats, elapsed = asyncio.run(drive(args, server_pid))
+    finally:
+        stop_processes(processes)
+        if config_path:
+            # The app reads it until it stops
+            os.unlink(config_path)
+
+    report = build_report(stats, elapsed)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Scripted conversation shared by the load driver (run.py) and the stand-in services (stubs.py).
+
+Keeping it in one place lets the fake model decide when qualification is "done" from the
+number of user turns it has seen, in step with what the driver is about to send.
+"""
+import datetime
+
+# One qualification conversation: the fake model finishes qualification on the last message
+QUALIFICATION_MESSAGES = [
+    "Olá!",
+    "Sim, tenho computador e internet em casa",
+    "Meu inglês é intermediário e trabalho com vendas",
+    "Quanto tempo dura o bootcamp de análise de dados?",
+    "Ganho uns 3 mil por mês e não estou satisfeito no emprego",
+    "Tenho 29 anos, nunca trabalhei com tecnologia e posso estudar 10 horas por semana",
+]
+
+# Scheduling conversation after the qualification API approves the session
+SCHEDULING_MESSAGES = [
+    "Quais horários vocês têm disponíveis?",
+    "Pode ser a primeira opção",
+    "Meu email é loadtest+{session_number}@example.com",
+    "Sim, pode confirmar",
+]
+
+COLLECTED_DATA = {
+    "acesso_computador": "sim",
+    "nivel_ingles": "intermediário",
+    "area_atuacao": "vendas",
+    "renda_mensal": "3000",
+    "plano_estudo": "10 horas por semana",
+    "idade": "29",
+    "satisfacao_emprego": "insatisfeito",
+    "experiencia_em_tecnologia": "nenhuma",
+}
+
+
+def collected_data_after(turns: int) -> dict:
+    """Data the fake model reports after `turns` user messages (one more field per turn)."""
+    filled = max(0, turns - 1)
+    return {key: (value if index < filled else "") for index, (key, value) in enumerate(COLLECTED_DATA.items())}
+
+
+def offered_slots(now: datetime.datetime = None, count: int = 3) -> list:
+    """Next `count` weekday slots (10:00 and 14:00), as the scheduling agent would offer them."""
+    now = now or datetime.datetime.now()
+    slots = []
+    day = now.date() + datetime.timedelta(days=1)
+    while len(slots) < count:
+        if day.weekday() < 5:
+            for hour in (10, 14):
+                slots.append(datetime.datetime.combine(day, datetime.time(hour)))
+        day += datetime.timedelta(days=1)
+    return slots[:count]
@@ -0,0 +1,221 @@
+"""
+Local stand-ins for the services the app calls, so load tests measure the app itself:
+
+  /v1/chat/completions   OpenAI chat API (plain and SSE streaming, json_schema structured steps)
+  /v1/embeddings         OpenAI embeddings (float and base64 encodings)
+  /qualify               qualification API ({"classificacao": 1 | 0})
+  /vector-store.json     vector store data (with ETag / If-None-Match)
+
+The Google Calendar side is replaced by fake_mcp_server.js. Latencies are configured through
+LOADTEST_* environment variables (see run.py, which sets them).
+
+    uvicorn stubs:app --app-dir loadtest --port 8900
+"""
+import os
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import asyncio
+import hashlib
+from array import array
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from scenario import QUALIFICATION_MESSAGES, collected_data_after, offered_slots
+
+LLM_TTFT_MS = float(os.getenv("LOADTEST_LLM_TTFT_MS", "400"))
+LLM_TOKEN_MS = float(os.getenv("LOADTEST_LLM_TOKEN_MS", "15"))
+EMBEDDING_MS = float(os.getenv("LOADTEST_EMBEDDING_MS", "60"))
+QUALIFICATION_MS = float(os.getenv("LOADTEST_QUALIFICATION_MS", "150"))
+QUALIFY_RATE = float(os.getenv("LOADTEST_QUALIFY_RATE", "1.0"))
+EMBEDDING_DIMENSIONS = int(os.getenv("LOADTEST_EMBEDDING_DIMENSIONS", "256"))
+
+VECTOR_STORE_DOCUMENT = {
+    "source": "https://tripleten.com.br",
+    "chunks": [
+        {"url": "https://tripleten.com.br/analise-de-dados", "text": "O bootcamp de Análise de Dados dura cerca de 7 meses, com 20 horas de estudo por semana."},
+        {"url": "https://tripleten.com.br/garantia", "text": "Alunos elegíveis contam com garantia de emprego ou reembolso do investimento."},
+    ],
+}
+VECTOR_STORE_BODY = json.dumps(VECTOR_STORE_DOCUMENT, ensure_ascii=False).encode("utf-8")
+VECTOR_STORE_ETAG = '"' + hashlib.sha256(VECTOR_STORE_BODY).hexdigest()[:16] + '"'
+
+app = FastAPI()
+
+
+# --- Fake model behaviour ---
+
+def _text_of(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def _user_turns(messages: list) -> int:
+    return sum(_text_of(m).count("User query:") for m in messages if m.get("role") == "user")
+
+
+def _latest_query(messages: list) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user" and "User query:" in _text_of(message):
+            return _text_of(message).rsplit("User query:", 1)[1].strip()
+    return ""
+
+
+def _scratchpad(messages: list) -> str:
+    """The agent scratchpad is rendered as the trailing assistant message."""
+    if messages and messages[-1].get("role") == "assistant":
+        return _text_of(messages[-1])
+    return ""
+
+
+def qualification_step(messages: list) -> str:
+    """One schema-shaped ReAct step for the qualification agent."""
+    turns = _user_turns(messages)
+    query = _latest_query(messages)
+    if "?" in query and "Observation:" not in _scratchpad(messages):
+        step = {"thought": "Vou consultar o site.", "action": "vector_store_sitemap", "action_input": query, "final_answer": None}
+    else:
+        done = turns >= len(QUALIFICATION_MESSAGES)
+        step = {
+            "thought": "Respondo e sigo com a próxima pergunta.",
+            "action": "final_answer",
+            "action_input": "",
+            "final_answer": {
+                "chat_output": "Perfeito, obrigado! Vou verificar seu perfil." if done else
+                               "Entendi! O bootcamp dura cerca de 7 meses. Pode me contar um pouco mais sobre você?",
+                "collected_data": collected_data_after(turns),
+                "done": done,
+            },
+        }
+    return json.dumps(step, ensure_ascii=False)
+
+
+def scheduling_step(messages: list) -> str:
+    """One text ReAct step for the scheduling agent."""
+    query = _latest_query(messages).lower()
+    scratchpad = _scratchpad(messages)
+    if "Event created" in scratchpad:
+        return "Thought: O evento foi criado.\nFinal Answer: Agendamento confirmado! Você receberá o convite por email."
+    if query.startswith("sim") and "Observation:" not in scratchpad:
+        slot = offered_slots()[0]
+        arguments = {
+            "summary": "Consultoria TripleTen",
+            "start": slot.strftime("%Y-%m-%dT%H:%M:00-03:00"),
+            "end": slot.replace(hour=slot.hour + 1).strftime("%Y-%m-%dT%H:%M:00-03:00"),
+            "timeZone": "America/Sao_Paulo",
+        }
+        return ("Thought: Vou criar o evento.\nAction: google_calendar_tool\n"
+                f"Action Input: {json.dumps({'name': 'create-event', 'arguments': arguments})}")
+    # main.py appends prefetched availability to the first scheduling input
+    prefetched = "calendar events already fetched" in query
+    if "Observation:" not in scratchpad and not prefetched:
+        time_min = offered_slots()[0].strftime("%Y-%m-%dT00:00:00-03:00")
+        return ("Thought: Preciso consultar a agenda.\nAction: google_calendar_tool\n"
+                f"Action Input: {json.dumps({'name': 'list-events', 'arguments': {'timeMin': time_min, 'maxResults': 20}})}")
+    options = "\n".join(f"{index}. {slot:%d/%m} às {slot:%H:%M}" for index, slot in enumerate(offered_slots(), start=1))
+    return f"Thought: Tenho a agenda.\nFinal Answer: Tenho estes horários disponíveis:\n{options}\nQual prefere?"
+
+
+def _chunks(text: str):
+    # Roughly token-sized pieces
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+
+def _usage(messages: list, completion: str) -> dict:
+    prompt_tokens = sum(len(_text_of(m)) for m in messages) // 4
+    completion_tokens = max(1, len(completion) // 4)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        content = qualification_step(messages)
+    else:
+        content = scheduling_step(messages)
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    model = body.get("model", "gpt-4o")
+    usage = _usage(messages, content)
+
+    if not body.get("stream"):
+        await asyncio.sleep((LLM_TTFT_MS + LLM_TOKEN_MS * len(_chunks(content))) / 1000)
+        return JSONResponse({
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    async def events():
+        def chunk(delta: dict, finish_reason=None, choices=True, extra=None):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if choices else []}
+            payload.update(extra or {})
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        await asyncio.sleep(LLM_TTFT_MS / 1000)
+        yield chunk({"role": "assistant", "content": ""})
+        for piece in _chunks(content):
+            await asyncio.sleep(LLM_TOKEN_MS / 1000)
+            yield chunk({"content": piece})
+        yield chunk({}, finish_reason="stop")
+        if include_usage:
+            yield chunk({}, choices=False, extra={"usage": usage})
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _embedding(item) -> list:
+    # Deterministic unit vector per input, so repeated questions hit the semantic cache
+    seed = hashlib.sha256(json.dumps(item, ensure_ascii=False).encode("utf-8")).digest()
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(EMBEDDING_DIMENSIONS)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body.get("input", [])
+    # str | [str] | [int] (one tokenized input) | [[int]]
+    if isinstance(inputs, str) or (isinstance(inputs, list) and inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    await asyncio.sleep(EMBEDDING_MS / 1000)
+
+    data = []
+    for index, item in enumerate(inputs):
+        vector = _embedding(item)
+        if body.get("encoding_format") == "base64":
+            vector = base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+        data.append({"object": "embedding", "index": index, "embedding": vector})
+    tokens = sum(len(item) if isinstance(item, list) else len(item) // 4 for item in inputs)
+    return JSONResponse({"object": "list", "data": data, "model": body.get("model", "text-embedding-3-small"),
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+
+@app.post("/qualify")
+async def qualify(request: Request):
+    await request.json()
+    await asyncio.sleep(QUALIFICATION_MS / 1000)
+    return JSONResponse({"classificacao": 1 if random.random() < QUALIFY_RATE else 0})
+
+
+@app.get("/vector-store.json")
+async def vector_store(request: Request):
+    if request.headers.get("if-none-match") == VECTOR_STORE_ETAG:
+        return Response(status_code=304, headers={"ETag": VECTOR_STORE_ETAG})
+    return Response(VECTOR_STORE_BODY, media_type="application/json", headers={"ETag": VECTOR_STORE_ETAG})
@@ -1,4 +1,5 @@
 import * as path from 'path';
+import { logger } from '../logger.js';
 // No longer need fileURLToPath as we use a fixed path
 // import { fileURLToPath } from 'url';
 
@@ -19,7 +20,7 @@ export function getSecureTokenPath(): string {
   // const projectRoot = getProjectRoot();
   // const tokenPath = path.join(projectRoot, ".gcp-saved-tokens.json");
   const tokenPath = path.join(CREDENTIALS_DIR, '.gcp-saved-tokens.json');
-  console.error(`DEBUG: Using token path: ${tokenPath}`); // Add debug log
+  logger.debug('Using token path', { tokenPath });
   return tokenPath;
 }
 
@@ -28,6 +29,6 @@ export function getKeysFilePath(): string {
   // const projectRoot = getProjectRoot();
   // const keysPath = path.join(projectRoot, "gcp-oauth.keys.json");
   const keysPath = path.join(CREDENTIALS_DIR, 'gcp-oauth.keys.json');
-  console.error(`DEBUG: Using keys path: ${keysPath}`); // Add debug log
+  logger.debug('Using keys path', { keysPath });
   return keysPath;
 } 
\ No newline at end of file
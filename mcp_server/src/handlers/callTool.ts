@@ -15,13 +15,15 @@ import {
     listColors,
     createEvent,
     updateEvent,
-    deleteEvent
+    deleteEvent,
+    EventConflictError
 } from '../services/googleCalendar.js';
 import {
     CalendarListEntry, 
     CalendarEvent, 
     CalendarEventAttendee
 } from '../schemas/types.js';
+import { logger, logPayloads } from '../logger.js';
 
 /**
  * Formats a list of calendars into a user-friendly string.
@@ -73,7 +75,8 @@ function formatColorList(colors: calendar_v3.Schema$Colors): string {
  * @returns A Promise resolving to the CallToolResponse.
  */
 export async function handleCallTool(request: typeof CallToolRequestSchema._type, oauth2Client: OAuth2Client) {
-    console.error(`MCP_SERVER_DEBUG: handleCallTool received request: ${JSON.stringify(request, null, 2)}`);
+    // Bodies are only serialized when explicitly enabled; pretty-printing every request was a measurable cost
+    logger.debug("handleCallTool received request", logPayloads ? { request } : { tool: request.params.name });
 
     const { name, arguments: args } = request.params;
 
@@ -123,7 +126,20 @@ export async function handleCallTool(request: typeof CallToolRequestSchema._type
 
             case "create-event": {
                 const validArgs = CreateEventArgumentsSchema.parse(args);
-                const event = await createEvent(oauth2Client, validArgs);
+                let event;
+                try {
+                    event = await createEvent(oauth2Client, validArgs);
+                } catch (error) {
+                    if (!(error instanceof EventConflictError)) throw error;
+                    // An expected outcome under concurrent bookings, not a server failure
+                    return {
+                        content: [{
+                            type: "text",
+                            text: `Error: ${error.message}. Choose another time.`,
+                        }],
+                        isError: true,
+                    };
+                }
                 return {
                     content: [{
                         type: "text",
@@ -158,7 +174,7 @@ export async function handleCallTool(request: typeof CallToolRequestSchema._type
                 throw new Error(`Unknown tool: ${name}`);
         }
     } catch (error: unknown) {
-        console.error(`Error executing tool '${name}':`, error);
+        logger.error(`Error executing tool '${name}'`, { error: error instanceof Error ? error.message : String(error) });
         // Re-throw the error to be handled by the main server logic or error handler
         throw error;
     }
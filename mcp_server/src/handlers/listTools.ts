@@ -69,6 +69,10 @@ export function getToolDefinitions() {
               type: "number",
               description: "Maximum number of events to return (optional, default is 250)",
               default: 250
+            },
+            expandRecurring: {
+              type: "boolean",
+              description: "Fetch recurring series once and expand their occurrences in the server instead of having Google return every instance (optional, recommended for long time ranges)",
             }
           },
           required: ["calendarId"],
@@ -102,6 +106,10 @@ export function getToolDefinitions() {
               type: "number",
               description: "Maximum number of events to return (optional, default is 250)",
               default: 250
+            },
+            expandRecurring: {
+              type: "boolean",
+              description: "Fetch recurring series once and expand their occurrences in the server instead of having Google return every instance (optional, recommended for long time ranges)",
             }
           },
           required: ["calendarId", "query"],
@@ -181,6 +189,10 @@ export function getToolDefinitions() {
                 type: "string"
               }
             },
+            allowConflicts: {
+              type: "boolean",
+              description: "Create the event even if the time overlaps existing busy events (optional, default false)",
+            },
           },
           required: ["calendarId", "summary", "start", "end", "timeZone"],
         },
@@ -0,0 +1,123 @@
+import express from 'express';
+import http from 'http';
+import type { Transport } from '@modelcontextprotocol/sdk/shared/transport.js';
+import { JSONRPCMessage, JSONRPCMessageSchema } from '@modelcontextprotocol/sdk/types.js';
+import { logger, logPayloads } from './logger.js';
+
+// MCP over HTTP for running the server as a standalone service shared by many agent replicas.
+// Each POST /mcp carries one JSON-RPC message and the response comes back in the HTTP response
+// body (the JSON-response mode of the streamable HTTP transport, without sessions or SSE).
+// One Server instance, OAuth client and token refresher serve every request.
+
+type JsonRpcId = string | number;
+
+interface PendingRequest {
+  res: express.Response;
+  clientId: JsonRpcId;
+}
+
+/**
+ * Transport that multiplexes concurrent HTTP requests onto one MCP Server. Clients pick their
+ * own JSON-RPC ids, which may collide across replicas, so every request is forwarded under an
+ * internal id and the reply is mapped back to the caller's id and HTTP response.
+ */
+export class HttpJsonRpcTransport implements Transport {
+  onclose?: () => void;
+  onerror?: (error: Error) => void;
+  onmessage?: (message: JSONRPCMessage) => void;
+
+  private pending = new Map<number, PendingRequest>();
+  private nextId = 0;
+
+  async start(): Promise<void> {
+    // Nothing to open: requests arrive through handleRequest()
+  }
+
+  async close(): Promise<void> {
+    for (const { res, clientId } of this.pending.values()) {
+      if (!res.headersSent) {
+        res.status(503).json({ jsonrpc: '2.0', id: clientId, error: { code: -32000, message: 'Server shutting down' } });
+      }
+    }
+    this.pending.clear();
+    this.onclose?.();
+  }
+
+  async send(message: JSONRPCMessage): Promise<void> {
+    if (!('id' in message) || 'method' in message) {
+      // Server-initiated requests / notifications: there is no open stream to push them on
+      logger.debug('Dropping server-initiated message (HTTP transport)', { method: (message as { method?: string }).method });
+      return;
+    }
+    const entry = this.pending.get(message.id as number);
+    if (!entry) {
+      logger.warn('Response for an unknown or abandoned request', { id: message.id });
+      return;
+    }
+    this.pending.delete(message.id as number);
+    if (entry.res.headersSent || entry.res.writableEnded) return;
+    entry.res.json({ ...message, id: entry.clientId });
+  }
+
+  handleRequest(req: express.Request, res: express.Response): void {
+    const parsed = JSONRPCMessageSchema.safeParse(req.body);
+    if (!parsed.success) {
+      res.status(400).json({ jsonrpc: '2.0', id: null, error: { code: -32600, message: 'Invalid JSON-RPC message' } });
+      return;
+    }
+    const message = parsed.data;
+    if (logPayloads) {
+      logger.debug('HTTP MCP request', { message });
+    }
+    if (!('method' in message) || !('id' in message)) {
+      // Notifications and client responses need no reply
+      this.onmessage?.(message);
+      res.status(202).end();
+      return;
+    }
+    const internalId = ++this.nextId;
+    this.pending.set(internalId, { res, clientId: message.id });
+    // Client gave up (timeout, disconnect): forget the request; a late reply is dropped
+    res.on('close', () => this.pending.delete(internalId));
+    this.onmessage?.({ ...message, id: internalId });
+  }
+
+  get inFlight(): number {
+    return this.pending.size;
+  }
+}
+
+export interface HttpServerOptions {
+  port: number;
+  host?: string;
+  // Shared secret expected as "Authorization: Bearer <token>" (empty: no authentication)
+  token?: string;
+}
+
+/** Serves the transport on POST /mcp, plus GET /healthz for load balancers. */
+export function startHttpServer(transport: HttpJsonRpcTransport, options: HttpServerOptions): Promise<http.Server> {
+  const app = express();
+  app.use(express.json({ limit: '1mb' }));
+
+  app.get('/healthz', (_req, res) => {
+    res.json({ status: 'ok', inFlight: transport.inFlight });
+  });
+
+  app.post('/mcp', (req, res) => {
+    if (options.token && req.headers.authorization !== `Bearer ${options.token}`) {
+      res.status(401).json({ jsonrpc: '2.0', id: null, error: { code: -32001, message: 'Unauthorized' } });
+      return;
+    }
+    transport.handleRequest(req, res);
+  });
+
+  return new Promise((resolve, reject) => {
+    const httpServer = app.listen(options.port, options.host ?? '0.0.0.0', () => {
+      logger.info('MCP HTTP transport listening', { port: options.port, host: options.host ?? '0.0.0.0' });
+      resolve(httpServer);
+    });
+    // Requests are short and callers reuse connections: keep them alive past typical pool idle times
+    httpServer.keepAliveTimeout = 65_000;
+    httpServer.on('error', reject);
+  });
+}
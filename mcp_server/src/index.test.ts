@@ -29,6 +29,7 @@ vi.mock('googleapis', async (importOriginal) => {
         },
         events: {
           list: vi.fn(),
+          instances: vi.fn(),
           insert: vi.fn(),
           patch: vi.fn(),
           delete: vi.fn()
@@ -256,6 +257,8 @@ describe('Google Calendar MCP Tool Calls', () => {
             id: 'eventId123',
             summary: mockEventArgs.summary,
         };
+        // Conflict re-check finds the slot free
+        (mockCalendarApi.events.list as ReturnType<typeof vi.fn>).mockResolvedValue({ data: { items: [] } });
         (mockCalendarApi.events.insert as ReturnType<typeof vi.fn>).mockResolvedValue({ data: mockApiResponse });
 
         const request = {
@@ -270,6 +273,12 @@ describe('Google Calendar MCP Tool Calls', () => {
         const result = await callToolHandler(request);
 
         // Assert
+        expect(mockCalendarApi.events.list).toHaveBeenCalledWith(expect.objectContaining({
+            calendarId: mockEventArgs.calendarId,
+            timeMin: mockEventArgs.start,
+            timeMax: mockEventArgs.end,
+            singleEvents: true,
+        }));
         expect(mockCalendarApi.events.insert).toHaveBeenCalledWith({
             calendarId: mockEventArgs.calendarId,
             requestBody: {
@@ -294,6 +303,41 @@ describe('Google Calendar MCP Tool Calls', () => {
         });
     });
 
+    it('should reject "create-event" when the slot is already busy', async () => {
+        // Arrange: another booking landed after the slot was offered
+        const mockEventArgs = {
+            calendarId: 'primary',
+            summary: 'Consultation',
+            start: '2024-08-15T10:00:00-03:00',
+            end: '2024-08-15T10:30:00-03:00',
+            timeZone: 'America/Sao_Paulo',
+        };
+        (mockCalendarApi.events.list as ReturnType<typeof vi.fn>).mockResolvedValue({
+            data: {
+                items: [
+                    { id: 'taken', summary: 'Consultation', status: 'confirmed', start: { dateTime: '2024-08-15T10:00:00-03:00' }, end: { dateTime: '2024-08-15T10:30:00-03:00' } },
+                    { id: 'free', summary: 'Focus time', status: 'confirmed', transparency: 'transparent', start: { dateTime: '2024-08-15T09:00:00-03:00' }, end: { dateTime: '2024-08-15T12:00:00-03:00' } },
+                ],
+            },
+        });
+
+        const request = {
+            params: {
+                name: 'create-event',
+                arguments: mockEventArgs,
+            },
+        };
+
+        // Act
+        if (!callToolHandler) throw new Error('callToolHandler not captured');
+        const result = await callToolHandler(request);
+
+        // Assert: nothing inserted, the caller gets an error it can act on
+        expect(mockCalendarApi.events.insert).not.toHaveBeenCalled();
+        expect(result.isError).toBe(true);
+        expect(result.content[0].text).toContain('conflicts with 1 existing event(s): Consultation');
+    });
+
      it('should handle "create-event" argument validation failure (missing required field)', async () => {
         // Arrange: Missing 'start' which is required
         const invalidEventArgs = {
@@ -357,6 +401,64 @@ describe('Google Calendar MCP Tool Calls', () => {
         expect(result.content[0].text).toContain('Location: Cafe');
     });
 
+    it('should expand recurring events locally when "expandRecurring" is set', async () => {
+        // Arrange
+        const listEventsArgs = {
+            calendarId: 'primary',
+            timeMin: '2024-08-05T00:00:00Z',
+            timeMax: '2024-08-10T00:00:00Z',
+            expandRecurring: true,
+        };
+
+        const mockItems = [
+            {
+                id: 'standup', summary: 'Standup', status: 'confirmed',
+                recurrence: ['RRULE:FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR', 'EXDATE:20240807T090000Z'],
+                start: { dateTime: '2024-07-01T09:00:00Z', timeZone: 'UTC' },
+                end: { dateTime: '2024-07-01T09:15:00Z', timeZone: 'UTC' },
+            },
+            {
+                id: 'standup_20240808T090000Z', recurringEventId: 'standup', summary: 'Standup (moved)', status: 'confirmed',
+                originalStartTime: { dateTime: '2024-08-08T09:00:00Z' },
+                start: { dateTime: '2024-08-08T11:00:00Z' }, end: { dateTime: '2024-08-08T11:15:00Z' },
+            },
+            { id: 'lunch', summary: 'Lunch', status: 'confirmed', start: { dateTime: '2024-08-06T12:00:00Z' }, end: { dateTime: '2024-08-06T13:00:00Z' } },
+        ];
+
+        (mockCalendarApi.events.list as ReturnType<typeof vi.fn>).mockResolvedValue({
+            data: { items: mockItems }
+        });
+
+        const request = {
+            params: {
+                name: 'list-events',
+                arguments: listEventsArgs
+            }
+        };
+
+        // Act
+        if (!callToolHandler) throw new Error('callToolHandler not captured');
+        const result = await callToolHandler(request);
+
+        // Assert: masters are fetched once, Google doesn't expand them
+        expect(mockCalendarApi.events.list).toHaveBeenCalledWith(expect.objectContaining({
+            calendarId: 'primary',
+            singleEvents: false,
+            showDeleted: true,
+        }));
+        expect(mockCalendarApi.events.instances).not.toHaveBeenCalled();
+
+        const text = result.content[0].text;
+        expect(text).toContain('Standup (standup_20240805T090000Z)');
+        expect(text).toContain('Standup (standup_20240806T090000Z)');
+        expect(text).not.toContain('standup_20240807T090000Z'); // EXDATE
+        expect(text).toContain('Standup (moved) (standup_20240808T090000Z)\nStart: 2024-08-08T11:00:00Z');
+        expect(text).toContain('Standup (standup_20240809T090000Z)');
+        expect(text).toContain('Lunch (lunch)');
+        // Ordered by start time
+        expect(text.indexOf('standup_20240806T090000Z')).toBeLessThan(text.indexOf('Lunch (lunch)'));
+    });
+
     it('should handle "search-events" tool call', async () => {
         // Arrange
         const searchEventsArgs = {
@@ -397,6 +499,40 @@ describe('Google Calendar MCP Tool Calls', () => {
         expect(result.content[0].text).toContain('Team Meeting (event1)');
     });
 
+    it('should answer "search-events" from the event cache when a listing covers the range', async () => {
+        // Arrange: a complete listing of the day, then a booking made through this server
+        const range = { calendarId: 'cache-test', timeMin: '2024-09-02T00:00:00Z', timeMax: '2024-09-03T00:00:00Z' };
+        (mockCalendarApi.events.list as ReturnType<typeof vi.fn>).mockResolvedValue({
+            data: { items: [
+                { id: 'lunch', summary: 'Almoço', start: { dateTime: '2024-09-02T12:00:00Z' }, end: { dateTime: '2024-09-02T13:00:00Z' } },
+            ] }
+        });
+        (mockCalendarApi.events.insert as ReturnType<typeof vi.fn>).mockResolvedValue({
+            data: {
+                id: 'booking1', summary: 'Consulta João', attendees: [{ email: 'joao.silva@example.com' }],
+                start: { dateTime: '2024-09-02T15:00:00Z' }, end: { dateTime: '2024-09-02T16:00:00Z' },
+            }
+        });
+        if (!callToolHandler) throw new Error('callToolHandler not captured');
+        await callToolHandler({ params: { name: 'list-events', arguments: range } });
+        await callToolHandler({ params: { name: 'create-event', arguments: {
+            calendarId: 'cache-test', summary: 'Consulta João', start: '2024-09-02T15:00:00Z', end: '2024-09-02T16:00:00Z',
+            timeZone: 'UTC', attendees: [{ email: 'joao.silva@example.com' }], allowConflicts: true,
+        } } });
+        vi.mocked(mockCalendarApi.events.list).mockClear();
+
+        // Act: look the booking up by attendee e-mail, inside and outside the cached range
+        const hit = await callToolHandler({ params: { name: 'search-events', arguments: { ...range, query: 'joao.silva@example.com' } } });
+        const miss = await callToolHandler({ params: { name: 'search-events', arguments: { ...range, query: 'joao', timeMax: '2024-09-05T00:00:00Z' } } });
+
+        // Assert: only the uncovered search reached Google
+        expect(hit.content[0].text).toContain('Consulta João (booking1)');
+        expect(hit.content[0].text).not.toContain('lunch');
+        expect(mockCalendarApi.events.list).toHaveBeenCalledTimes(1);
+        expect(mockCalendarApi.events.list).toHaveBeenCalledWith(expect.objectContaining({ q: 'joao', timeMax: '2024-09-05T00:00:00Z' }));
+        expect(miss.content).toBeDefined();
+    });
+
     it('should handle "delete-event" tool call', async () => {
         // Arrange
         const deleteEventArgs = {
@@ -523,4 +659,69 @@ describe('Google Calendar MCP Tool Calls', () => {
 
   // TODO: Add more tests for:
   // - Argument validation failures for other tools
-}); 
\ No newline at end of file
+}); 
+describe('HTTP JSON-RPC transport', () => {
+  const makeResponse = () => {
+    const res: any = { headersSent: false, writableEnded: false, handlers: {} };
+    res.status = vi.fn().mockReturnValue(res);
+    res.json = vi.fn((body: any) => { res.body = body; res.headersSent = true; return res; });
+    res.end = vi.fn(() => res);
+    res.on = vi.fn((event: string, handler: Function) => { res.handlers[event] = handler; return res; });
+    return res;
+  };
+
+  it('maps colliding client ids onto distinct requests and back', async () => {
+    const { HttpJsonRpcTransport } = await import('./httpTransport.js');
+    const transport = new HttpJsonRpcTransport();
+    const forwarded: any[] = [];
+    transport.onmessage = (message: any) => forwarded.push(message);
+
+    const first = makeResponse();
+    const second = makeResponse();
+    const request = { jsonrpc: '2.0', id: 1, method: 'tools/call', params: { name: 'list-calendars', arguments: {} } };
+    transport.handleRequest({ body: request } as any, first);
+    transport.handleRequest({ body: request } as any, second);
+
+    expect(forwarded).toHaveLength(2);
+    expect(forwarded[0].id).not.toBe(forwarded[1].id);
+    expect(transport.inFlight).toBe(2);
+
+    await transport.send({ jsonrpc: '2.0', id: forwarded[1].id, result: { content: [{ type: 'text', text: 'second' }] } } as any);
+    await transport.send({ jsonrpc: '2.0', id: forwarded[0].id, result: { content: [{ type: 'text', text: 'first' }] } } as any);
+
+    expect(first.body).toEqual({ jsonrpc: '2.0', id: 1, result: { content: [{ type: 'text', text: 'first' }] } });
+    expect(second.body.result.content[0].text).toBe('second');
+    expect(transport.inFlight).toBe(0);
+  });
+
+  it('rejects invalid messages and acknowledges notifications', async () => {
+    const { HttpJsonRpcTransport } = await import('./httpTransport.js');
+    const transport = new HttpJsonRpcTransport();
+    transport.onmessage = vi.fn();
+
+    const invalid = makeResponse();
+    transport.handleRequest({ body: { hello: 'world' } } as any, invalid);
+    expect(invalid.status).toHaveBeenCalledWith(400);
+    expect(transport.onmessage).not.toHaveBeenCalled();
+
+    const notification = makeResponse();
+    transport.handleRequest({ body: { jsonrpc: '2.0', method: 'notifications/initialized' } } as any, notification);
+    expect(notification.status).toHaveBeenCalledWith(202);
+    expect(transport.onmessage).toHaveBeenCalledTimes(1);
+  });
+
+  it('forgets requests whose client disconnected', async () => {
+    const { HttpJsonRpcTransport } = await import('./httpTransport.js');
+    const transport = new HttpJsonRpcTransport();
+    const forwarded: any[] = [];
+    transport.onmessage = (message: any) => forwarded.push(message);
+
+    const res = makeResponse();
+    transport.handleRequest({ body: { jsonrpc: '2.0', id: 'a', method: 'tools/list' } } as any, res);
+    res.handlers.close();
+    await transport.send({ jsonrpc: '2.0', id: forwarded[0].id, result: { tools: [] } } as any);
+
+    expect(res.json).not.toHaveBeenCalled();
+    expect(transport.inFlight).toBe(0);
+  });
+});
@@ -1,5 +1,6 @@
 import { Server } from "@modelcontextprotocol/sdk/server/index.js";
 import { StdioServerTransport } from "@modelcontextprotocol/sdk/server/stdio.js";
+import http from "http";
 import {
   ListToolsRequestSchema,
   CallToolRequestSchema,
@@ -13,6 +14,8 @@ import { AuthServer } from './auth/server.js';
 import { TokenManager } from './auth/tokenManager.js';
 import { getToolDefinitions } from './handlers/listTools.js';
 import { handleCallTool } from './handlers/callTool.js';
+import { logger } from './logger.js';
+import { HttpJsonRpcTransport, startHttpServer } from './httpTransport.js';
 
 // --- Global Variables --- 
 // Necessary because they are initialized in main and used in handlers/cleanup
@@ -33,26 +36,31 @@ const server = new Server(
 let oauth2Client: OAuth2Client;
 let tokenManager: TokenManager;
 let authServer: AuthServer;
+let httpServer: http.Server | null = null;
+
+// stdio (default): one request per spawned process. http: long-running service shared by
+// every agent replica (see httpTransport.ts), listening on MCP_HTTP_PORT.
+const transportMode = (process.env.MCP_TRANSPORT || 'stdio').toLowerCase();
 
 // --- Main Application Logic --- 
 
-console.error("MCP_SERVER_DEBUG: Script start...");
+logger.debug("Script start...");
 
 async function main() {
-  console.error("MCP_SERVER_DEBUG: main() entered.");
+  logger.debug("main() entered.");
   try {
     // 1. Initialize Authentication
-    console.error("MCP_SERVER_DEBUG: Calling initializeOAuth2Client()...");
+    logger.debug("Calling initializeOAuth2Client()...");
     oauth2Client = await initializeOAuth2Client();
-    console.error("MCP_SERVER_DEBUG: initializeOAuth2Client() completed.");
+    logger.debug("initializeOAuth2Client() completed.");
 
-    console.error("MCP_SERVER_DEBUG: Creating TokenManager...");
+    logger.debug("Creating TokenManager...");
     tokenManager = new TokenManager(oauth2Client);
-    console.error("MCP_SERVER_DEBUG: TokenManager created.");
+    logger.debug("TokenManager created.");
 
-    console.error("MCP_SERVER_DEBUG: Creating AuthServer...");
+    logger.debug("Creating AuthServer...");
     authServer = new AuthServer(oauth2Client);
-    console.error("MCP_SERVER_DEBUG: AuthServer created.");
+    logger.debug("AuthServer created.");
 
     // 2. Ensure Authentication or Start Auth Server
     // validateTokens attempts to load/refresh first.
@@ -75,7 +83,7 @@ async function main() {
 
     // 3. Set up MCP Handlers
     
-    console.error("MCP_SERVER_DEBUG: Setting up MCP handlers...");
+    logger.debug("Setting up MCP handlers...");
     
     // List Tools Handler
     server.setRequestHandler(ListToolsRequestSchema, async () => {
@@ -89,23 +97,33 @@ async function main() {
       return handleCallTool(request, oauth2Client);
     });
 
-    console.error("MCP_SERVER_DEBUG: MCP handlers set up.");
+    logger.debug("MCP handlers set up.");
 
     // 4. Connect Server Transport
-    console.error("MCP_SERVER_DEBUG: Creating StdioServerTransport...");
-    const transport = new StdioServerTransport();
-    console.error("MCP_SERVER_DEBUG: StdioServerTransport created.");
-
-    console.error("MCP_SERVER_DEBUG: Attempting server.connect(transport)...");
-    await server.connect(transport);
-    console.error("MCP_SERVER_DEBUG: server.connect(transport) completed."); // <<< Will likely not be reached if it hangs
+    if (transportMode === 'http') {
+      const transport = new HttpJsonRpcTransport();
+      await server.connect(transport);
+      httpServer = await startHttpServer(transport, {
+        port: Number(process.env.MCP_HTTP_PORT || 3100),
+        host: process.env.MCP_HTTP_HOST,
+        token: process.env.MCP_HTTP_TOKEN,
+      });
+    } else {
+      logger.debug("Creating StdioServerTransport...");
+      const transport = new StdioServerTransport();
+      logger.debug("StdioServerTransport created.");
+
+      logger.debug("Attempting server.connect(transport)...");
+      await server.connect(transport);
+      logger.debug("server.connect(transport) completed."); // <<< Will likely not be reached if it hangs
+    }
 
     // 5. Set up Graceful Shutdown
     process.on("SIGINT", cleanup);
     process.on("SIGTERM", cleanup);
 
   } catch (error: unknown) {
-    console.error("Server startup failed:", error instanceof Error ? error.message : error);
+    logger.error("Server startup failed", { error: error instanceof Error ? error.message : String(error) });
     process.exit(1);
   }
 }
@@ -119,6 +137,13 @@ async function cleanup() {
         // Attempt to stop the auth server if it exists and might be running
     await authServer.stop();
   }
+    if (httpServer) {
+      // Stop accepting requests, then answer in-flight ones with a shutdown error (transport close)
+      const closed = new Promise<void>((resolve) => httpServer!.close(() => resolve()));
+      httpServer.closeIdleConnections();
+      await server.close();
+      await closed;
+    }
     // No need to clear tokens; let them persist for the next run.
     console.error("Cleanup complete.");
     process.exit(0);
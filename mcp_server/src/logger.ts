@@ -0,0 +1,34 @@
+// Minimal structured logger for the MCP server.
+// stdout carries the JSON-RPC stream, so logs always go to stderr, one JSON object per line.
+// MCP_LOG_LEVEL (debug | info | warn | error, default warn) controls verbosity and
+// MCP_LOG_PAYLOADS=true adds request/response bodies to debug entries.
+
+const LEVELS = { debug: 10, info: 20, warn: 30, error: 40 } as const;
+type LogLevel = keyof typeof LEVELS;
+
+const configuredLevel = (process.env.MCP_LOG_LEVEL || 'warn').toLowerCase() as LogLevel;
+const threshold: number = LEVELS[configuredLevel] ?? LEVELS.warn;
+
+export const logPayloads = process.env.MCP_LOG_PAYLOADS === 'true';
+
+function write(level: LogLevel, message: string, fields?: Record<string, unknown>): void {
+  if (LEVELS[level] < threshold) return;
+  const entry: Record<string, unknown> = {
+    ts: new Date().toISOString(),
+    level,
+    component: 'mcp_server',
+    message,
+    ...fields,
+  };
+  if (fields?.error instanceof Error) {
+    entry.error = fields.error.message;
+  }
+  process.stderr.write(JSON.stringify(entry) + '\n');
+}
+
+export const logger = {
+  debug: (message: string, fields?: Record<string, unknown>) => write('debug', message, fields),
+  info: (message: string, fields?: Record<string, unknown>) => write('info', message, fields),
+  warn: (message: string, fields?: Record<string, unknown>) => write('warn', message, fields),
+  error: (message: string, fields?: Record<string, unknown>) => write('error', message, fields),
+};
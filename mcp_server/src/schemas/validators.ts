@@ -16,7 +16,8 @@ export const ListEventsArgumentsSchema = z.object({
   calendarId: z.string(),
   timeMin: z.string().datetime({ offset: true }).optional(),
   timeMax: z.string().datetime({ offset: true }).optional(),
-  maxResults: z.number().int().positive().optional()
+  maxResults: z.number().int().positive().optional(),
+  expandRecurring: z.boolean().optional()
 });
 
 export const SearchEventsArgumentsSchema = z.object({
@@ -24,7 +25,8 @@ export const SearchEventsArgumentsSchema = z.object({
   query: z.string(),
   timeMin: z.string().datetime({ offset: true }).optional(),
   timeMax: z.string().datetime({ offset: true }).optional(),
-  maxResults: z.number().int().positive().optional()
+  maxResults: z.number().int().positive().optional(),
+  expandRecurring: z.boolean().optional()
 });
 
 export const CreateEventArgumentsSchema = z.object({
@@ -45,6 +47,7 @@ export const CreateEventArgumentsSchema = z.object({
   colorId: z.string().optional(),
   reminders: RemindersSchema.optional(),
   recurrence: z.array(z.string()).optional(),
+  allowConflicts: z.boolean().optional(),
 });
 
 export const UpdateEventArgumentsSchema = z.object({
@@ -0,0 +1,187 @@
+import { calendar_v3 } from 'googleapis';
+import { logger } from '../logger.js';
+
+// In-memory copy of recently listed events with an inverted index over their text, so that
+// `search-events` (typically the agent looking up a booking it just listed or created, to update
+// or cancel it) can be answered without another Google round trip.
+//
+// A calendar's cache only answers for time ranges that a complete `list-events` covered within
+// the last MCP_EVENT_CACHE_TTL_SECONDS (default 300, 0 disables the cache); anything else goes
+// to Google. Writes made through this server are applied to the cache as they happen; edits made
+// elsewhere (Google Calendar UI, other servers) show up when the covered range expires.
+// Useful with the long-lived HTTP transport: a stdio server lives for one tool call only.
+
+type Event = calendar_v3.Schema$Event;
+
+interface CoveredRange {
+    start: number;
+    end: number;
+    expiresAt: number;
+}
+
+interface CalendarCache {
+    ranges: CoveredRange[];
+    events: Map<string, Event>; // event id -> event
+    index: Map<string, Set<string>>; // token -> event ids
+}
+
+/** Lowercased, accent-free words; e-mail addresses split into their parts. */
+export function tokenize(text: string): string[] {
+    return text
+        .normalize('NFD')
+        .replace(/\p{M}/gu, '')
+        .toLowerCase()
+        .split(/[^\p{L}\p{N}]+/u)
+        .filter(Boolean);
+}
+
+function eventText(event: Event): string {
+    const attendees = (event.attendees || []).map((a) => `${a.email || ''} ${a.displayName || ''}`);
+    return [event.summary, event.description, event.location, event.organizer?.email, ...attendees]
+        .filter(Boolean)
+        .join(' ');
+}
+
+function eventBounds(event: Event): [number, number] {
+    const start = Date.parse(event.start?.dateTime || event.start?.date || '');
+    const end = Date.parse(event.end?.dateTime || event.end?.date || '');
+    return [start, Number.isNaN(end) ? start : end];
+}
+
+function overlaps(event: Event, start: number, end: number): boolean {
+    const [eventStart, eventEnd] = eventBounds(event);
+    // Same rule as the Calendar API's timeMin/timeMax filter
+    return eventEnd > start && eventStart < end;
+}
+
+export class EventCache {
+    private calendars = new Map<string, CalendarCache>();
+
+    constructor(private ttlMs: number, private now: () => number = Date.now) {}
+
+    get enabled(): boolean {
+        return this.ttlMs > 0;
+    }
+
+    private calendar(calendarId: string): CalendarCache {
+        let cache = this.calendars.get(calendarId);
+        if (!cache) {
+            cache = { ranges: [], events: new Map(), index: new Map() };
+            this.calendars.set(calendarId, cache);
+        }
+        return cache;
+    }
+
+    private add(cache: CalendarCache, event: Event): void {
+        if (!event.id || event.status === 'cancelled') return;
+        cache.events.set(event.id, event);
+        for (const token of new Set(tokenize(eventText(event)))) {
+            let ids = cache.index.get(token);
+            if (!ids) cache.index.set(token, (ids = new Set()));
+            ids.add(event.id);
+        }
+    }
+
+    private remove(cache: CalendarCache, eventId: string): void {
+        const event = cache.events.get(eventId);
+        if (!event) return;
+        cache.events.delete(eventId);
+        for (const token of new Set(tokenize(eventText(event)))) {
+            const ids = cache.index.get(token);
+            ids?.delete(eventId);
+            if (ids && ids.size === 0) cache.index.delete(token);
+        }
+    }
+
+    /** Drops expired ranges and the events no live range covers any more. */
+    private prune(cache: CalendarCache): void {
+        const now = this.now();
+        cache.ranges = cache.ranges.filter((range) => range.expiresAt > now);
+        for (const [id, event] of cache.events) {
+            if (!cache.ranges.some((range) => overlaps(event, range.start, range.end))) this.remove(cache, id);
+        }
+    }
+
+    /**
+     * Records the complete result of listing [timeMin, timeMax): the events cached for that range
+     * are replaced and the range becomes searchable locally.
+     */
+    recordList(calendarId: string, timeMin: string, timeMax: string, events: Event[]): void {
+        if (!this.enabled) return;
+        const start = Date.parse(timeMin);
+        const end = Date.parse(timeMax);
+        if (Number.isNaN(start) || Number.isNaN(end) || end <= start) return;
+        const cache = this.calendar(calendarId);
+        for (const [id, event] of cache.events) {
+            if (overlaps(event, start, end)) this.remove(cache, id);
+        }
+        cache.ranges.push({ start, end, expiresAt: this.now() + this.ttlMs });
+        for (const event of events) this.add(cache, event);
+        this.prune(cache);
+    }
+
+    /**
+     * Events matching every word of `query` (by word prefix) in [timeMin, timeMax), ordered by
+     * start time, or undefined when the cache does not cover the whole range.
+     */
+    search(calendarId: string, query: string, timeMin?: string, timeMax?: string, maxResults?: number): Event[] | undefined {
+        if (!this.enabled || !timeMin || !timeMax) return undefined;
+        const cache = this.calendars.get(calendarId);
+        if (!cache) return undefined;
+        const start = Date.parse(timeMin);
+        const end = Date.parse(timeMax);
+        const now = this.now();
+        if (!cache.ranges.some((range) => range.expiresAt > now && range.start <= start && end <= range.end)) {
+            return undefined;
+        }
+        let matches: Set<string> | undefined;
+        for (const word of new Set(tokenize(query))) {
+            const ids = new Set<string>();
+            for (const [token, tokenIds] of cache.index) {
+                if (token.startsWith(word)) tokenIds.forEach((id) => ids.add(id));
+            }
+            matches = matches ? new Set([...matches].filter((id) => ids.has(id))) : ids;
+            if (matches.size === 0) break;
+        }
+        const events = [...(matches ?? cache.events.keys())]
+            .map((id) => cache.events.get(id)!)
+            .filter((event) => overlaps(event, start, end))
+            .sort((a, b) => eventBounds(a)[0] - eventBounds(b)[0]);
+        logger.debug('search-events answered from the event cache', { calendarId, results: events.length });
+        return maxResults ? events.slice(0, maxResults) : events;
+    }
+
+    /** Applies a created or updated event. */
+    recordWrite(calendarId: string, event: Event): void {
+        const cache = this.calendars.get(calendarId);
+        if (!cache || !event.id) return;
+        if (event.recurrence?.length || event.recurringEventId) {
+            // Occurrences are expanded at list time; relisting is simpler than patching them here
+            this.invalidate(calendarId);
+            return;
+        }
+        this.remove(cache, event.id);
+        const now = this.now();
+        if (cache.ranges.some((range) => range.expiresAt > now && overlaps(event, range.start, range.end))) {
+            this.add(cache, event);
+        }
+    }
+
+    /** Applies a deleted event (and, for a recurring series, its occurrences). */
+    recordDelete(calendarId: string, eventId: string): void {
+        const cache = this.calendars.get(calendarId);
+        if (!cache) return;
+        if ([...cache.events.values()].some((event) => event.recurringEventId === eventId)) {
+            this.invalidate(calendarId);
+            return;
+        }
+        this.remove(cache, eventId);
+    }
+
+    invalidate(calendarId: string): void {
+        this.calendars.delete(calendarId);
+    }
+}
+
+const ttlSeconds = Number(process.env.MCP_EVENT_CACHE_TTL_SECONDS ?? 300);
+export const eventCache = new EventCache(Number.isFinite(ttlSeconds) ? ttlSeconds * 1000 : 0);
@@ -9,6 +9,8 @@ import {
     DeleteEventArgumentsSchema,
 } from '../schemas/validators.js';
 import { z } from 'zod';
+import { expandRecurringEvents } from './recurrence.js';
+import { eventCache } from './eventCache.js';
 
 // Type alias for Calendar API instance
 type CalendarApi = calendar_v3.Calendar;
@@ -36,8 +38,50 @@ export async function listCalendars(client: OAuth2Client): Promise<calendar_v3.S
     }
 }
 
+/**
+ * Fetches recurring masters, their exceptions and one-off events (`singleEvents: false`) and
+ * expands the series locally, bounded by the queried window. Returns the same flat,
+ * start-ordered list `singleEvents: true` would.
+ */
+async function listEventsWithLocalExpansion(
+    calendar: CalendarApi,
+    params: calendar_v3.Params$Resource$Events$List,
+    maxResults?: number
+): Promise<calendar_v3.Schema$Event[]> {
+    const items: calendar_v3.Schema$Event[] = [];
+    let pageToken: string | undefined;
+    do {
+        const response = await calendar.events.list({
+            ...params,
+            singleEvents: false,
+            showDeleted: true, // cancelled exceptions mark removed occurrences
+            maxResults: 2500,
+            pageToken,
+        });
+        items.push(...(response.data.items || []));
+        pageToken = response.data.nextPageToken || undefined;
+    } while (pageToken);
+
+    return expandRecurringEvents(
+        items,
+        { timeMin: params.timeMin, timeMax: params.timeMax, maxResults },
+        // Series using rule parts we don't expand locally are expanded by Google instead
+        async (master) => {
+            const response = await calendar.events.instances({
+                calendarId: params.calendarId!,
+                eventId: master.id!,
+                timeMin: params.timeMin,
+                timeMax: params.timeMax,
+                maxResults,
+            });
+            return response.data.items || [];
+        }
+    );
+}
+
 /**
  * Lists events from a specific calendar.
+ * A complete listing of a bounded range is also kept in the event cache, for search-events.
  */
 export async function listEvents(
     client: OAuth2Client, 
@@ -45,15 +89,29 @@ export async function listEvents(
 ): Promise<calendar_v3.Schema$Event[]> {
     try {
         const calendar = google.calendar({ version: 'v3', auth: client });
-        const response = await calendar.events.list({
-            calendarId: args.calendarId,
-            timeMin: args.timeMin,
-            timeMax: args.timeMax,
-            singleEvents: true,
-            orderBy: 'startTime',
-            maxResults: args.maxResults,
-        });
-        return response.data.items || [];
+        let events: calendar_v3.Schema$Event[];
+        if (args.expandRecurring) {
+            events = await listEventsWithLocalExpansion(calendar, {
+                calendarId: args.calendarId,
+                timeMin: args.timeMin,
+                timeMax: args.timeMax,
+            }, args.maxResults);
+        } else {
+            const response = await calendar.events.list({
+                calendarId: args.calendarId,
+                timeMin: args.timeMin,
+                timeMax: args.timeMax,
+                singleEvents: true,
+                orderBy: 'startTime',
+                maxResults: args.maxResults,
+            });
+            events = response.data.items || [];
+        }
+        // A result cut at maxResults does not cover the whole range
+        if (args.timeMin && args.timeMax && (!args.maxResults || events.length < args.maxResults)) {
+            eventCache.recordList(args.calendarId, args.timeMin, args.timeMax, events);
+        }
+        return events;
     } catch (error) {
         handleGoogleApiError(error);
         throw error;
@@ -62,13 +120,24 @@ export async function listEvents(
 
 /**
  * Searches for events in a specific calendar based on a query.
+ * Answered from the event cache when a recent listing covers the requested range.
  */
 export async function searchEvents(
     client: OAuth2Client, 
     args: z.infer<typeof SearchEventsArgumentsSchema>
 ): Promise<calendar_v3.Schema$Event[]> {
+    const cached = eventCache.search(args.calendarId, args.query, args.timeMin, args.timeMax, args.maxResults);
+    if (cached) return cached;
     try {
         const calendar = google.calendar({ version: 'v3', auth: client });
+        if (args.expandRecurring) {
+            return await listEventsWithLocalExpansion(calendar, {
+                calendarId: args.calendarId,
+                q: args.query,
+                timeMin: args.timeMin,
+                timeMax: args.timeMax,
+            }, args.maxResults);
+        }
         const response = await calendar.events.list({
             calendarId: args.calendarId,
             q: args.query,
@@ -100,8 +169,42 @@ export async function listColors(client: OAuth2Client): Promise<calendar_v3.Sche
     }
 }
 
+/**
+ * Raised by createEvent when the requested time is already taken.
+ */
+export class EventConflictError extends Error {
+    constructor(public readonly conflicts: calendar_v3.Schema$Event[]) {
+        super(`Time slot conflicts with ${conflicts.length} existing event(s): ${conflicts.map((e) => e.summary || e.id).join(', ')}`);
+        this.name = 'EventConflictError';
+    }
+}
+
+/**
+ * Events that keep the calendar busy between start and end (free/transparent and
+ * cancelled events don't block a slot).
+ */
+async function findConflictingEvents(
+    calendar: CalendarApi,
+    calendarId: string,
+    start: string,
+    end: string
+): Promise<calendar_v3.Schema$Event[]> {
+    const response = await calendar.events.list({
+        calendarId,
+        timeMin: start,
+        timeMax: end,
+        singleEvents: true,
+        maxResults: 10,
+    });
+    return (response.data.items || []).filter(
+        (event) => event.status !== 'cancelled' && event.transparency !== 'transparent'
+    );
+}
+
 /**
  * Creates a new calendar event.
+ * The slot is re-checked right before the insert, so a slot that was offered earlier but
+ * booked since then is rejected with EventConflictError instead of being double booked.
  */
 export async function createEvent(
     client: OAuth2Client, 
@@ -109,6 +212,10 @@ export async function createEvent(
 ): Promise<calendar_v3.Schema$Event> {
     try {
         const calendar = google.calendar({ version: 'v3', auth: client });
+        if (!args.allowConflicts) {
+            const conflicts = await findConflictingEvents(calendar, args.calendarId, args.start, args.end);
+            if (conflicts.length > 0) throw new EventConflictError(conflicts);
+        }
         const requestBody: calendar_v3.Schema$Event = {
             summary: args.summary,
             description: args.description,
@@ -125,6 +232,7 @@ export async function createEvent(
             requestBody: requestBody,
         });
         if (!response.data) throw new Error('Failed to create event, no data returned');
+        eventCache.recordWrite(args.calendarId, response.data);
         return response.data;
     } catch (error) {
         handleGoogleApiError(error);
@@ -177,6 +285,7 @@ export async function updateEvent(
             requestBody: requestBody,
         });
         if (!response.data) throw new Error('Failed to update event, no data returned');
+        eventCache.recordWrite(args.calendarId, response.data);
         return response.data;
     } catch (error) {
         handleGoogleApiError(error);
@@ -197,6 +306,7 @@ export async function deleteEvent(
             calendarId: args.calendarId,
             eventId: args.eventId,
         });
+        eventCache.recordDelete(args.calendarId, args.eventId);
     } catch (error) {
         handleGoogleApiError(error);
     }
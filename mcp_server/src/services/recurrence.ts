@@ -0,0 +1,413 @@
+import { calendar_v3 } from 'googleapis';
+
+// Local expansion of recurring events (RFC 5545 RRULE subset).
+//
+// With `singleEvents: true` Google expands every series server-side, so a long window over a
+// calendar full of daily/weekly meetings returns (and pages through) one item per occurrence.
+// Fetching masters + exceptions instead (`singleEvents: false`) keeps the payload proportional
+// to the number of series; the occurrences are generated here, lazily and only inside the
+// queried window.
+//
+// Supported: FREQ=DAILY|WEEKLY|MONTHLY|YEARLY, INTERVAL, COUNT, UNTIL, BYDAY (incl. ordinals
+// such as 2TU / -1FR for MONTHLY), BYMONTHDAY, BYMONTH, WKST, plus RDATE/EXDATE lines.
+// Anything else (BYSETPOS, BYWEEKNO, HOURLY rules, EXRULE, ...) is reported as unsupported so
+// the caller can fall back to Google's own expansion for that one series.
+
+type Event = calendar_v3.Schema$Event;
+
+const DAY_MS = 24 * 60 * 60 * 1000;
+const WEEKDAYS = ['SU', 'MO', 'TU', 'WE', 'TH', 'FR', 'SA'];
+const SUPPORTED_FREQS = ['DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY'];
+const SUPPORTED_PARTS = ['FREQ', 'INTERVAL', 'COUNT', 'UNTIL', 'BYDAY', 'BYMONTHDAY', 'BYMONTH', 'WKST'];
+// Hard stop for pathological rules (e.g. a daily series with a far-away UNTIL and no window)
+const MAX_ITERATIONS = 50000;
+
+export class UnsupportedRecurrenceError extends Error {}
+
+export interface RecurrenceRule {
+    freq: 'DAILY' | 'WEEKLY' | 'MONTHLY' | 'YEARLY';
+    interval: number;
+    count?: number;
+    until?: number; // instant (ms)
+    byDay?: { weekday: number; ordinal: number }[]; // ordinal 0 = every such weekday
+    byMonthDay?: number[];
+    byMonth?: number[]; // 1-12
+    weekStart: number; // 0 = Sunday
+}
+
+export interface ExpansionWindow {
+    timeMin?: string;
+    timeMax?: string;
+    maxResults?: number;
+}
+
+// --- Time zone helpers -----------------------------------------------------------------------
+// "Floating" times are wall-clock times stored as UTC milliseconds (Date.UTC(y, m, d, h, ...)),
+// which makes calendar arithmetic (add a day, go to the 3rd Tuesday) independent of offsets.
+
+const formatterCache = new Map<string, Intl.DateTimeFormat>();
+
+function tzOffsetMs(timeZone: string, instant: number): number {
+    let formatter = formatterCache.get(timeZone);
+    if (!formatter) {
+        formatter = new Intl.DateTimeFormat('en-US', {
+            timeZone,
+            hourCycle: 'h23',
+            year: 'numeric', month: '2-digit', day: '2-digit',
+            hour: '2-digit', minute: '2-digit', second: '2-digit',
+        });
+        formatterCache.set(timeZone, formatter);
+    }
+    const parts: Record<string, number> = {};
+    for (const part of formatter.formatToParts(new Date(instant))) {
+        if (part.type !== 'literal') parts[part.type] = Number(part.value);
+    }
+    const asUtc = Date.UTC(parts.year, parts.month - 1, parts.day, parts.hour, parts.minute, parts.second);
+    return asUtc - Math.floor(instant / 1000) * 1000;
+}
+
+function floatingToInstant(floating: number, timeZone: string): number {
+    const guess = floating - tzOffsetMs(timeZone, floating);
+    return floating - tzOffsetMs(timeZone, guess);
+}
+
+function instantToFloating(instant: number, timeZone: string): number {
+    return instant + tzOffsetMs(timeZone, instant);
+}
+
+function pad(value: number, width = 2): string {
+    return String(value).padStart(width, '0');
+}
+
+/** ISO date-time in the event's own offset, e.g. 2024-08-15T10:00:00-03:00 (same shape Google returns). */
+function formatInstant(instant: number, timeZone: string): string {
+    const offsetMinutes = Math.round(tzOffsetMs(timeZone, instant) / 60000);
+    const local = new Date(instant + offsetMinutes * 60000);
+    const sign = offsetMinutes < 0 ? '-' : '+';
+    const absolute = Math.abs(offsetMinutes);
+    return `${local.toISOString().slice(0, 19)}${sign}${pad(Math.floor(absolute / 60))}:${pad(absolute % 60)}`;
+}
+
+function formatDate(floating: number): string {
+    return new Date(floating).toISOString().slice(0, 10);
+}
+
+/** Parses iCalendar date/date-time values (20240815, 20240815T100000, 20240815T130000Z). */
+function parseICalDate(value: string, timeZone: string): number {
+    const match = /^(\d{4})(\d{2})(\d{2})(?:T(\d{2})(\d{2})(\d{2})(Z)?)?$/.exec(value.trim());
+    if (!match) throw new UnsupportedRecurrenceError(`Unrecognized date value: ${value}`);
+    const [, y, mo, d, h = '0', mi = '0', s = '0', utc] = match;
+    const floating = Date.UTC(Number(y), Number(mo) - 1, Number(d), Number(h), Number(mi), Number(s));
+    return utc ? floating : floatingToInstant(floating, timeZone);
+}
+
+// --- RRULE parsing ---------------------------------------------------------------------------
+
+export function parseRRule(line: string, timeZone: string): RecurrenceRule {
+    const body = line.replace(/^RRULE:/i, '');
+    const parts: Record<string, string> = {};
+    for (const item of body.split(';')) {
+        const [key, value] = item.split('=');
+        if (!key || value === undefined) continue;
+        parts[key.toUpperCase()] = value.toUpperCase();
+    }
+    for (const key of Object.keys(parts)) {
+        if (!SUPPORTED_PARTS.includes(key)) throw new UnsupportedRecurrenceError(`Unsupported RRULE part: ${key}`);
+    }
+    if (!SUPPORTED_FREQS.includes(parts.FREQ)) throw new UnsupportedRecurrenceError(`Unsupported FREQ: ${parts.FREQ}`);
+
+    const rule: RecurrenceRule = {
+        freq: parts.FREQ as RecurrenceRule['freq'],
+        interval: parts.INTERVAL ? Math.max(1, Number(parts.INTERVAL)) : 1,
+        weekStart: parts.WKST ? WEEKDAYS.indexOf(parts.WKST) : 1,
+    };
+    if (parts.COUNT) rule.count = Number(parts.COUNT);
+    if (parts.UNTIL) rule.until = parseICalDate(parts.UNTIL, timeZone);
+    if (parts.BYMONTH) rule.byMonth = parts.BYMONTH.split(',').map(Number);
+    if (parts.BYMONTHDAY) rule.byMonthDay = parts.BYMONTHDAY.split(',').map(Number);
+    if (parts.BYDAY) {
+        rule.byDay = parts.BYDAY.split(',').map((token) => {
+            const match = /^([+-]?\d{1,2})?(SU|MO|TU|WE|TH|FR|SA)$/.exec(token);
+            if (!match) throw new UnsupportedRecurrenceError(`Unsupported BYDAY value: ${token}`);
+            return { weekday: WEEKDAYS.indexOf(match[2]), ordinal: match[1] ? Number(match[1]) : 0 };
+        });
+        const hasOrdinals = rule.byDay.some((day) => day.ordinal !== 0);
+        // Ordinals only make sense per month here ("2nd Tuesday"); per-year ordinals are rare enough to defer to Google
+        if (hasOrdinals && !(rule.freq === 'MONTHLY' || (rule.freq === 'YEARLY' && rule.byMonth))) {
+            throw new UnsupportedRecurrenceError(`Unsupported BYDAY ordinal for FREQ=${rule.freq}`);
+        }
+    }
+    // Without BYMONTH these expand over the whole year, which isn't implemented
+    if (rule.freq === 'YEARLY' && !rule.byMonth && (rule.byDay || rule.byMonthDay)) {
+        throw new UnsupportedRecurrenceError('Unsupported yearly BYDAY/BYMONTHDAY without BYMONTH');
+    }
+    if ([rule.interval, rule.count ?? 1, rule.weekStart].some((n) => !Number.isFinite(n) || n < 0)) {
+        throw new UnsupportedRecurrenceError(`Invalid RRULE: ${line}`);
+    }
+    return rule;
+}
+
+// --- Occurrence generation -------------------------------------------------------------------
+
+function daysInMonth(year: number, month: number): number {
+    return new Date(Date.UTC(year, month + 1, 0)).getUTCDate();
+}
+
+/** Candidate days (floating midnight) of one month for BYDAY / BYMONTHDAY. */
+function monthDays(year: number, month: number, rule: RecurrenceRule, defaultDay: number): number[] {
+    const length = daysInMonth(year, month);
+    let days: number[] | null = null;
+
+    if (rule.byMonthDay) {
+        days = rule.byMonthDay
+            .map((d) => (d < 0 ? length + d + 1 : d))
+            .filter((d) => d >= 1 && d <= length);
+    }
+    if (rule.byDay) {
+        const matches = new Set<number>();
+        for (const { weekday, ordinal } of rule.byDay) {
+            const firstWeekday = new Date(Date.UTC(year, month, 1)).getUTCDay();
+            const first = 1 + ((weekday - firstWeekday + 7) % 7);
+            const all: number[] = [];
+            for (let d = first; d <= length; d += 7) all.push(d);
+            if (ordinal === 0) all.forEach((d) => matches.add(d));
+            else {
+                const picked = ordinal > 0 ? all[ordinal - 1] : all[all.length + ordinal];
+                if (picked !== undefined) matches.add(picked);
+            }
+        }
+        days = days ? days.filter((d) => matches.has(d)) : [...matches];
+    }
+    if (!days) days = defaultDay <= length ? [defaultDay] : []; // e.g. the 31st is skipped in 30-day months
+
+    return [...new Set(days)].sort((a, b) => a - b).map((d) => Date.UTC(year, month, d));
+}
+
+/**
+ * Lazily yields occurrence start instants (ms) of one RRULE, in order, from DTSTART until the
+ * rule ends or `stopAfter` is passed. `skipBefore` lets rules without COUNT jump straight to
+ * the window instead of walking the series from its first occurrence.
+ */
+export function* generateOccurrences(
+    rule: RecurrenceRule,
+    dtstart: number,
+    timeZone: string,
+    stopAfter: number,
+    skipBefore?: number,
+): Generator<number> {
+    const startFloating = instantToFloating(dtstart, timeZone);
+    const startDate = new Date(startFloating);
+    const timeOfDay = startFloating - Date.UTC(startDate.getUTCFullYear(), startDate.getUTCMonth(), startDate.getUTCDate());
+    const startYear = startDate.getUTCFullYear();
+    const startMonth = startDate.getUTCMonth();
+    const startDay = startDate.getUTCDate();
+
+    // Index of the first period worth looking at. COUNT needs every earlier occurrence, so it can't skip.
+    let period = 0;
+    if (skipBefore !== undefined && rule.count === undefined && skipBefore > dtstart) {
+        const gap = instantToFloating(skipBefore, timeZone) - startFloating;
+        const periodsAhead =
+            rule.freq === 'DAILY' ? gap / DAY_MS :
+            rule.freq === 'WEEKLY' ? gap / (7 * DAY_MS) :
+            rule.freq === 'MONTHLY' ? gap / (31 * DAY_MS) :
+            gap / (366 * DAY_MS);
+        period = Math.max(0, Math.floor(periodsAhead / rule.interval) - 1);
+    }
+
+    let emitted = 0;
+    for (let iterations = 0; iterations < MAX_ITERATIONS; iterations++, period++) {
+        const step = period * rule.interval;
+        let candidates: number[]; // floating midnights
+        let periodStart: number;
+
+        if (rule.freq === 'DAILY') {
+            periodStart = Date.UTC(startYear, startMonth, startDay + step);
+            candidates = [periodStart];
+        } else if (rule.freq === 'WEEKLY') {
+            const offsetToWeekStart = (startDate.getUTCDay() - rule.weekStart + 7) % 7;
+            periodStart = Date.UTC(startYear, startMonth, startDay - offsetToWeekStart + step * 7);
+            const weekdays = rule.byDay ? rule.byDay.map((d) => d.weekday) : [startDate.getUTCDay()];
+            candidates = weekdays
+                .map((weekday) => periodStart + ((weekday - rule.weekStart + 7) % 7) * DAY_MS)
+                .sort((a, b) => a - b);
+        } else if (rule.freq === 'MONTHLY') {
+            periodStart = Date.UTC(startYear, startMonth + step, 1);
+            const monthDate = new Date(periodStart);
+            candidates = monthDays(monthDate.getUTCFullYear(), monthDate.getUTCMonth(), rule, startDay);
+        } else {
+            periodStart = Date.UTC(startYear + step, 0, 1);
+            const months = rule.byMonth ? rule.byMonth.map((m) => m - 1) : [startMonth];
+            candidates = months
+                .sort((a, b) => a - b)
+                .flatMap((month) => monthDays(startYear + step, month, rule, startDay));
+        }
+
+        if (floatingToInstant(periodStart, timeZone) > stopAfter) return;
+
+        for (const day of candidates) {
+            const date = new Date(day);
+            if (rule.byMonth && !rule.byMonth.includes(date.getUTCMonth() + 1)) continue;
+            if (rule.freq === 'DAILY' && rule.byDay && !rule.byDay.some((d) => d.weekday === date.getUTCDay())) continue;
+            if (rule.freq === 'DAILY' && rule.byMonthDay && !monthDays(date.getUTCFullYear(), date.getUTCMonth(), rule, 0).includes(day)) continue;
+
+            const occurrence = floatingToInstant(day + timeOfDay, timeZone);
+            if (occurrence < dtstart) continue;
+            if (rule.until !== undefined && occurrence > rule.until) return;
+            if (occurrence > stopAfter) return;
+            emitted++;
+            yield occurrence;
+            if (rule.count !== undefined && emitted >= rule.count) return;
+        }
+    }
+}
+
+// --- Event expansion -------------------------------------------------------------------------
+
+function parseDateList(line: string, defaultTimeZone: string): number[] {
+    // EXDATE;TZID=America/Sao_Paulo:20240820T100000,20240827T100000 | EXDATE;VALUE=DATE:20240820
+    const separator = line.indexOf(':');
+    const params = line.slice(0, separator).split(';').slice(1);
+    const tzParam = params.find((p) => p.toUpperCase().startsWith('TZID='));
+    const timeZone = tzParam ? tzParam.slice(5) : defaultTimeZone;
+    return line.slice(separator + 1).split(',').map((value) => parseICalDate(value, timeZone));
+}
+
+function eventStartInstant(time: calendar_v3.Schema$EventDateTime | undefined): number | undefined {
+    if (!time) return undefined;
+    if (time.dateTime) return Date.parse(time.dateTime);
+    if (time.date) return Date.parse(`${time.date}T00:00:00Z`);
+    return undefined;
+}
+
+function instanceIdSuffix(instant: number, allDay: boolean): string {
+    const iso = new Date(instant).toISOString();
+    return allDay
+        ? iso.slice(0, 10).replace(/-/g, '')
+        : `${iso.slice(0, 19).replace(/[-:]/g, '')}Z`;
+}
+
+/**
+ * Expands one recurring master into the instances that overlap [windowStart, windowEnd].
+ * Throws UnsupportedRecurrenceError when the series uses rule parts this module doesn't handle.
+ */
+export function expandSeries(master: Event, windowStart: number, windowEnd: number, limit: number): Event[] {
+    const allDay = Boolean(master.start?.date);
+    // All-day events are floating dates; treat them as UTC midnights
+    const timeZone = allDay ? 'UTC' : master.start?.timeZone || 'UTC';
+    const dtstart = eventStartInstant(master.start);
+    const dtend = eventStartInstant(master.end);
+    if (dtstart === undefined) throw new UnsupportedRecurrenceError(`Recurring event ${master.id} has no start`);
+    const duration = dtend !== undefined ? dtend - dtstart : 0;
+
+    const rules: RecurrenceRule[] = [];
+    const extraDates: number[] = [];
+    const excluded = new Set<number>();
+    for (const line of master.recurrence || []) {
+        const upper = line.toUpperCase();
+        if (upper.startsWith('RRULE:')) rules.push(parseRRule(line, timeZone));
+        else if (upper.startsWith('EXDATE')) parseDateList(line, timeZone).forEach((d) => excluded.add(d));
+        else if (upper.startsWith('RDATE')) extraDates.push(...parseDateList(line, timeZone));
+        else throw new UnsupportedRecurrenceError(`Unsupported recurrence line: ${line}`);
+    }
+
+    // An instance starting before windowStart can still overlap it
+    const earliestStart = windowStart - duration;
+    const starts = new Set<number>(extraDates.filter((d) => d >= earliestStart && d <= windowEnd));
+    for (const rule of rules) {
+        for (const occurrence of generateOccurrences(rule, dtstart, timeZone, windowEnd, earliestStart)) {
+            if (occurrence < earliestStart) continue;
+            starts.add(occurrence);
+            if (starts.size >= limit + excluded.size) break;
+        }
+    }
+
+    return [...starts]
+        .filter((start) => !excluded.has(start))
+        .sort((a, b) => a - b)
+        .slice(0, limit)
+        .map((start) => {
+            const { recurrence, ...fields } = master;
+            const startTime: calendar_v3.Schema$EventDateTime = allDay
+                ? { date: formatDate(start) }
+                : { dateTime: formatInstant(start, timeZone), timeZone: master.start?.timeZone };
+            const endTime: calendar_v3.Schema$EventDateTime = allDay
+                ? { date: formatDate(start + duration) }
+                : { dateTime: formatInstant(start + duration, timeZone), timeZone: master.end?.timeZone ?? master.start?.timeZone };
+            return {
+                ...fields,
+                id: `${master.id}_${instanceIdSuffix(start, allDay)}`,
+                recurringEventId: master.id,
+                originalStartTime: startTime,
+                start: startTime,
+                end: endTime,
+            };
+        });
+}
+
+/**
+ * Turns a `singleEvents: false` listing (one-off events, recurring masters and their
+ * exceptions) into the same flat, start-ordered instance list `singleEvents: true` returns.
+ *
+ * `fallback` is called for series whose rules aren't supported locally (typically fetching
+ * that series' instances from Google).
+ */
+export async function expandRecurringEvents(
+    items: Event[],
+    window: ExpansionWindow,
+    fallback: (master: Event) => Promise<Event[]>,
+): Promise<Event[]> {
+    const windowStart = window.timeMin ? Date.parse(window.timeMin) : -Infinity;
+    const windowEnd = window.timeMax ? Date.parse(window.timeMax) : Infinity;
+    const limit = window.maxResults ?? 250;
+
+    // Exceptions (moved or cancelled instances) are keyed by the occurrence they replace
+    const exceptions = new Map<string, Event>();
+    const singles: Event[] = [];
+    const masters: Event[] = [];
+    for (const item of items) {
+        if (item.recurringEventId) {
+            const original = eventStartInstant(item.originalStartTime);
+            exceptions.set(`${item.recurringEventId}|${original}`, item);
+        } else if (item.recurrence?.length) {
+            if (item.status !== 'cancelled') masters.push(item);
+        } else if (item.status !== 'cancelled') {
+            singles.push(item);
+        }
+    }
+
+    const instances: Event[] = [...singles];
+    const expandedByGoogle = new Set<string>();
+    for (const master of masters) {
+        let expanded: Event[];
+        try {
+            // Without a timeMax the window is open-ended; `limit` bounds the work instead
+            expanded = expandSeries(master, windowStart, windowEnd, limit);
+        } catch (error) {
+            if (!(error instanceof UnsupportedRecurrenceError)) throw error;
+            expanded = await fallback(master);
+            expandedByGoogle.add(master.id ?? '');
+            instances.push(...expanded.filter((event) => event.status !== 'cancelled'));
+            continue;
+        }
+        for (const instance of expanded) {
+            const key = `${master.id}|${eventStartInstant(instance.originalStartTime)}`;
+            if (exceptions.has(key)) continue; // the exception (if not cancelled) is added below
+            instances.push(instance);
+        }
+    }
+    for (const exception of exceptions.values()) {
+        // Google's own expansion already applied this series' exceptions
+        if (expandedByGoogle.has(exception.recurringEventId ?? '')) continue;
+        if (exception.status !== 'cancelled') instances.push(exception);
+    }
+
+    return instances
+        .filter((event) => {
+            const start = eventStartInstant(event.start);
+            const end = eventStartInstant(event.end) ?? start;
+            if (start === undefined || end === undefined) return true;
+            return start < windowEnd && (end > windowStart || (end === start && start >= windowStart));
+        })
+        .sort((a, b) => (eventStartInstant(a.start) ?? 0) - (eventStartInstant(b.start) ?? 0))
+        .slice(0, limit);
+}
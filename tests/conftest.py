@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app modules import each other by name (the Docker image runs them from app/)
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+sys.path.insert(0, APP_DIR)
+os.environ.setdefault("CONFIG_PATH", os.path.join(os.path.dirname(APP_DIR), "config.json"))
@@ -0,0 +1,109 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from calendar_coalescing import CalendarRequestCoalescer
+
+ARGS = {"calendarId": "primary", "timeMin": "2031-07-17T10:00:00Z", "timeMax": "2031-07-17T18:00:00Z"}
+
+
+def test_followers_share_the_leaders_result():
+    coalescer = CalendarRequestCoalescer()
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "Start: 2031-07-17T10:00:00Z"
+
+    async def main():
+        return await asyncio.gather(*(coalescer.acall("list-events", ARGS, execute) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["Start: 2031-07-17T10:00:00Z"] * 3
+    assert len(calls) == 1
+
+
+def test_backend_errors_are_shared():
+    coalescer = CalendarRequestCoalescer()
+
+    async def execute():
+        await asyncio.sleep(0.05)
+        raise ValueError("bad response")
+
+    async def main():
+        return await asyncio.gather(*(coalescer.acall("list-events", ARGS, execute) for _ in range(2)),
+                                    return_exceptions=True)
+
+    assert [type(result) for result in asyncio.run(main())] == [ValueError, ValueError]
+
+
+def test_cancelled_leader_does_not_cancel_its_followers():
+    coalescer = CalendarRequestCoalescer()
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "Start: 2031-07-17T10:00:00Z"
+
+    async def leader():
+        async with asyncio.timeout(0.02): # The leader's own turn budget runs out
+            return await coalescer.acall("list-events", ARGS, execute)
+
+    async def main():
+        leading = asyncio.create_task(leader())
+        await asyncio.sleep(0) # The leader starts the flight first
+        following = asyncio.create_task(coalescer.acall("list-events", ARGS, execute))
+        with pytest.raises(TimeoutError):
+            await leading
+        return await following
+
+    assert asyncio.run(main()) == "Start: 2031-07-17T10:00:00Z"
+    assert len(calls) == 2 # The follower led a new flight
+
+
+def test_cancelled_follower_does_not_cancel_the_flight():
+    coalescer = CalendarRequestCoalescer()
+
+    async def execute():
+        await asyncio.sleep(0.05)
+        return "Start: 2031-07-17T10:00:00Z"
+
+    async def main():
+        leading = asyncio.create_task(coalescer.acall("list-events", ARGS, execute))
+        await asyncio.sleep(0)
+        following = asyncio.create_task(coalescer.acall("list-events", ARGS, execute))
+        await asyncio.sleep(0.01)
+        following.cancel()
+        return await leading
+
+    assert asyncio.run(main()) == "Start: 2031-07-17T10:00:00Z"
+
+
+def test_sync_leader_out_of_budget_lets_its_follower_retry():
+    coalescer = CalendarRequestCoalescer()
+    started = threading.Event()
+    results = {}
+
+    def leader_execute():
+        started.set()
+        time.sleep(0.05)
+        raise TimeoutError("turn budget exhausted")
+
+    def run(name, execute):
+        try:
+            results[name] = coalescer.call("list-events", ARGS, execute)
+        except Exception as e:
+            results[name] = e
+
+    leader = threading.Thread(target=run, args=("leader", leader_execute))
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=run, args=("follower", lambda: "Start: 2031-07-17T10:00:00Z"))
+    follower.start()
+    leader.join()
+    follower.join()
+    assert isinstance(results["leader"], TimeoutError)
+    assert results["follower"] == "Start: 2031-07-17T10:00:00Z"
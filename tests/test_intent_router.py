@@ -0,0 +1,226 @@
+import json
+import time
+import asyncio
+import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from intent_router import IntentRouter, normalize_text
+from slot_holds import SlotHoldTable
+
+TZ = ZoneInfo("America/Sao_Paulo")
+TEMPLATES = {
+    "scheduling_greeting": "Oi! Vamos continuar?",
+    "ask_email": "{slot} está disponível! Qual e-mail?",
+    "review": "{slot} no e-mail {email}. Está correto?",
+    "booked": "Agendado para {slot}, convite para {email}.",
+    "slot_taken": "{slot} acabou de ser ocupado.",
+}
+OFFER = (
+    "Tenho estes horários disponíveis:\n"
+    "1. Quinta, 17/07/2031 às 10:00\n"
+    "2. 14h30\n"
+    "3. Sexta, 18/07/2031 às 09h00\n"
+)
+SLOTS = [
+    datetime.datetime(2031, 7, 17, 10, 0, tzinfo=TZ),
+    datetime.datetime(2031, 7, 17, 14, 30, tzinfo=TZ),
+    datetime.datetime(2031, 7, 18, 9, 0, tzinfo=TZ),
+]
+
+
+class FakeCalendarTool:
+    """Stands in for GoogleCalendarCLIWrapper: records commands, answers from `busy` / `create_result`."""
+
+    def __init__(self):
+        self.calls = []
+        self.busy = False
+        self.create_result = "Event created successfully"
+
+    def _run(self, command: str) -> str:
+        call = json.loads(command)
+        self.calls.append(call)
+        if call["name"] == "list-events":
+            return f"Consulta\nStart: {call['arguments']['timeMin']}\n" if self.busy else ""
+        if call["name"] == "create-event":
+            return self.create_result
+        return "Error: unexpected tool"
+
+    def names(self):
+        return [call["name"] for call in self.calls]
+
+
+@pytest.fixture
+def calendar():
+    return FakeCalendarTool()
+
+
+@pytest.fixture
+def router(calendar):
+    return IntentRouter(calendar, TEMPLATES, timezone_id="America/Sao_Paulo", duration_minutes=30, event_title="Consulta")
+
+
+def route(router, message, session_id="s1"):
+    return asyncio.run(router.route(session_id, "scheduling", message))
+
+
+def offer(router, session_id="s1"):
+    asyncio.run(router.observe_agent_reply(session_id, OFFER))
+
+
+# --- Parsing ---
+
+def test_extract_offered_slots_reuses_the_previous_date(router):
+    assert router.extract_offered_slots(OFFER) == SLOTS
+
+
+def test_extract_offered_slots_skips_invalid_dates_and_times(router):
+    assert router.extract_offered_slots("31/02/2031 às 10:00\n17/07/2031 às 25:00") == []
+
+
+def test_extract_offered_slots_ignores_lines_before_any_date(router):
+    assert router.extract_offered_slots("Às 10:00 ou 11:00?") == []
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("opção 2", SLOTS[1]),
+    ("2", SLOTS[1]),
+    ("a primeira", SLOTS[0]),
+    ("o último", SLOTS[2]),
+    ("14h30", SLOTS[1]),
+    ("às 9", SLOTS[2]),
+    ("18/07", SLOTS[2]),
+    ("17/07 às 10h", SLOTS[0]),
+])
+def test_match_slot_selection(router, message, expected):
+    assert router.match_slot_selection(normalize_text(message), SLOTS) == expected
+
+
+@pytest.mark.parametrize("message", ["opção 4", "17/07", "às 11", "pode ser", "quero outro dia"])
+def test_match_slot_selection_ambiguous_or_unknown(router, message):
+    assert router.match_slot_selection(normalize_text(message), SLOTS) is None
+
+
+def test_match_slot_selection_without_offers(router):
+    assert router.match_slot_selection("opcao 1", []) is None
+
+
+# --- Pick -> e-mail -> confirm -> book ---
+
+def test_booking_flow(router, calendar):
+    offer(router)
+
+    reply = route(router, "opção 2")
+    assert reply.intent == "slot_selection" and "Qual e-mail" in reply.message
+    assert router.session_state("s1").pending_slot == SLOTS[1]
+
+    reply = route(router, "ana@example.com")
+    assert reply.intent == "email" and "ana@example.com" in reply.message
+
+    reply = route(router, "sim")
+    assert reply.intent == "booking" and reply.message.startswith("Agendado")
+    create = calendar.calls[-1]
+    assert create["name"] == "create-event"
+    assert create["arguments"]["start"] == SLOTS[1].isoformat()
+    assert create["arguments"]["end"] == (SLOTS[1] + datetime.timedelta(minutes=30)).isoformat()
+    assert create["arguments"]["attendees"] == [{"email": "ana@example.com"}]
+    state = router.session_state("s1")
+    assert state.pending_slot is None and state.offered_slots == [] and not state.awaiting_confirmation
+
+
+def test_pick_with_email_goes_straight_to_review(router):
+    offer(router)
+    reply = route(router, "a primeira, ana@example.com")
+    assert reply.intent == "slot_selection" and "ana@example.com" in reply.message
+    assert router.session_state("s1").awaiting_confirmation
+
+
+def test_busy_slot_goes_to_the_agent(router, calendar):
+    offer(router)
+    calendar.busy = True
+    assert route(router, "opção 1") is None
+    assert "create-event" not in calendar.names()
+
+
+def test_slot_taken_before_confirmation(router, calendar):
+    offer(router)
+    route(router, "opção 1")
+    route(router, "ana@example.com")
+    calendar.busy = True
+    reply = route(router, "pode marcar")
+    assert reply.intent == "booking" and "ocupado" in reply.message
+    assert router.session_state("s1").pending_slot is None
+    assert "create-event" not in calendar.names()
+
+
+def test_failed_booking_falls_back_to_the_agent(router, calendar):
+    offer(router)
+    route(router, "opção 1")
+    route(router, "ana@example.com")
+    calendar.create_result = "Error: calendar unavailable"
+    assert route(router, "sim") is None
+    assert router.session_state("s1").pending_slot == SLOTS[0]
+
+
+def test_anything_but_a_confirmation_goes_to_the_agent(router, calendar):
+    offer(router)
+    route(router, "opção 1")
+    route(router, "ana@example.com")
+    assert route(router, "não, prefiro outro horário") is None
+    assert "create-event" not in calendar.names()
+
+
+def test_agent_reply_resets_pending_steps(router):
+    offer(router)
+    route(router, "opção 1")
+    asyncio.run(router.observe_agent_reply("s1", "Claro, me diga outro dia."))
+    state = router.session_state("s1")
+    assert state.pending_slot is None and not state.awaiting_confirmation
+    assert state.offered_slots == SLOTS
+
+
+# --- Slot holds ---
+
+def test_offers_get_a_short_lease_and_unpicked_ones_are_released_on_pick(calendar):
+    holds = SlotHoldTable(lease_seconds=300)
+    router = IntentRouter(calendar, TEMPLATES, timezone_id="America/Sao_Paulo", duration_minutes=30,
+                          slot_holds=holds, offer_lease_seconds=60)
+    start, end = SLOTS[0].timestamp(), SLOTS[-1].timestamp() + 1800
+    offer(router)
+    leases = holds.holds_between("primary", start, end)
+    assert [hold.start for hold in leases] == [slot.timestamp() for slot in SLOTS]
+    assert all(hold.expires_at - time.time() <= 60 for hold in leases)
+
+    route(router, "opção 2")
+    leases = holds.holds_between("primary", start, end)
+    assert [hold.start for hold in leases] == [SLOTS[1].timestamp()]
+    assert leases[0].expires_at - time.time() > 60
+
+
+def test_slot_held_by_another_session_goes_to_the_agent(calendar):
+    holds = SlotHoldTable(lease_seconds=300)
+    router = IntentRouter(calendar, TEMPLATES, timezone_id="America/Sao_Paulo", duration_minutes=30, slot_holds=holds)
+    holds.acquire("primary", SLOTS[1].timestamp(), SLOTS[1].timestamp() + 1800, "other")
+    offer(router)
+    assert route(router, "opção 2") is None
+
+
+# --- Qualification ---
+
+def qualify(router, message, collected_data=None):
+    return asyncio.run(router.route("s1", "qualification", message, collected_data))
+
+
+def test_greeting_before_qualification_starts_gets_the_fast_reply(calendar):
+    router = IntentRouter(calendar, {**TEMPLATES, "qualification_greeting": "Oi! Qual o seu objetivo?"})
+    reply = qualify(router, "olá, tudo bem?", {"area_atuacao": "", "idade": ""})
+    assert reply.intent == "greeting" and reply.structured_output.chat_output == "Oi! Qual o seu objetivo?"
+    assert not reply.structured_output.done
+
+
+@pytest.mark.parametrize("message", ["tudo bem", "bom dia", "olá, tudo bem?"])
+def test_greeting_mid_qualification_goes_to_the_agent(calendar, message):
+    router = IntentRouter(calendar, {**TEMPLATES, "qualification_greeting": "Oi! Qual o seu objetivo?"})
+    collected = {"area_atuacao": "marketing", "nivel_ingles": "intermediario", "idade": "29"}
+    assert qualify(router, message, collected) is None
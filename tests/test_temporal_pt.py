@@ -0,0 +1,157 @@
+import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from temporal_pt import TemporalResolver, format_resolved_ranges
+
+TZ = ZoneInfo("America/Sao_Paulo")
+# A Wednesday morning
+NOW = datetime.datetime(2025, 6, 11, 10, 0, tzinfo=TZ)
+
+
+def at(day: int, hour: int, minute: int = 0, month: int = 6, year: int = 2025) -> datetime.datetime:
+    return datetime.datetime(year, month, day, hour, minute, tzinfo=TZ)
+
+
+@pytest.fixture
+def resolver():
+    return TemporalResolver(timezone_id="America/Sao_Paulo", business_hours=(8, 18), slot_minutes=30, max_ranges=5)
+
+
+def spans(ranges):
+    return [(r.start, r.end, r.exact) for r in ranges]
+
+
+def test_no_date_or_time(resolver):
+    assert resolver.resolve("Oi, tudo bem?", now=NOW) == []
+
+
+def test_tomorrow_at_exact_time(resolver):
+    assert spans(resolver.resolve("Pode ser amanhã às 15h?", now=NOW)) == [(at(12, 15), at(12, 15, 30), True)]
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("às 3", at(11, 15)),      # bare 1-6 means the afternoon
+    ("às 6", at(11, 18)),
+    ("às 8 da noite", at(11, 20)),
+    ("às 3 da tarde", at(11, 15)),
+    ("às 11", at(11, 11)),     # 7-11 stay in the morning
+    ("15h30", at(11, 15, 30)),
+    ("meio-dia", at(11, 12)),
+])
+def test_time_only_today_when_still_ahead(resolver, message, expected):
+    assert spans(resolver.resolve(message, now=NOW)) == [(expected, expected + datetime.timedelta(minutes=30), True)]
+
+
+def test_time_only_rolls_over_to_tomorrow_once_past(resolver):
+    assert spans(resolver.resolve("às 9", now=NOW)) == [(at(12, 9), at(12, 9, 30), True)]
+    assert spans(resolver.resolve("às 10", now=NOW)) == [(at(12, 10), at(12, 10, 30), True)]
+
+
+def test_period_of_next_weekday(resolver):
+    assert spans(resolver.resolve("próxima terça de manhã", now=NOW)) == [(at(17, 8), at(17, 12), False)]
+
+
+def test_weekday_named_today_means_next_week(resolver):
+    assert spans(resolver.resolve("quarta", now=NOW)) == [(at(18, 8), at(18, 18), False)]
+
+
+def test_weekday_of_next_week(resolver):
+    assert spans(resolver.resolve("segunda da semana que vem à tarde", now=NOW)) == [(at(16, 12), at(16, 18), False)]
+
+
+def test_between_hours(resolver):
+    assert spans(resolver.resolve("entre 14h e 16h na quarta", now=NOW)) == [(at(18, 14), at(18, 16), False)]
+
+
+def test_after_hour_defaults_to_closing_time(resolver):
+    assert spans(resolver.resolve("dia 20 depois das 14h", now=NOW)) == [(at(20, 14), at(20, 18), False)]
+
+
+def test_before_hour_defaults_to_opening_time(resolver):
+    assert spans(resolver.resolve("amanhã antes das 10", now=NOW)) == [(at(12, 8), at(12, 10), False)]
+
+
+def test_rest_of_today_starts_at_next_quarter_hour(resolver):
+    now = at(11, 13, 7)
+    assert spans(resolver.resolve("hoje à tarde", now=now)) == [(at(11, 13, 15), at(11, 18), False)]
+
+
+def test_window_already_over_today_is_dropped(resolver):
+    assert resolver.resolve("hoje de manhã", now=at(11, 13)) == []
+
+
+def test_day_of_month_already_past_moves_to_next_month(resolver):
+    assert spans(resolver.resolve("dia 5", now=NOW)) == [(at(5, 8, month=7), at(5, 18, month=7), False)]
+
+
+def test_date_already_past_without_year_moves_to_next_year(resolver):
+    assert spans(resolver.resolve("10/06 às 15h", now=NOW)) == [(at(10, 15, year=2026), at(10, 15, 30, year=2026), True)]
+
+
+def test_next_week_lists_weekdays_only(resolver):
+    ranges = resolver.resolve("semana que vem", now=NOW)
+    assert [r.start.date() for r in ranges] == [datetime.date(2025, 6, day) for day in (16, 17, 18, 19, 20)]
+
+
+def test_this_week_skips_the_weekend_and_what_already_passed(resolver):
+    ranges = resolver.resolve("essa semana", now=at(13, 17, 50)) # Friday, ten minutes before closing
+    assert spans(ranges) == []
+
+
+def test_weekend_is_explicit(resolver):
+    ranges = resolver.resolve("no fim de semana", now=NOW)
+    assert [r.start.date() for r in ranges] == [datetime.date(2025, 6, 14), datetime.date(2025, 6, 15)]
+
+
+def test_max_ranges(resolver):
+    resolver.max_ranges = 2
+    assert len(resolver.resolve("semana que vem", now=NOW)) == 2
+
+
+def test_format_resolved_ranges(resolver):
+    note = format_resolved_ranges(resolver.resolve("amanhã às 15h", now=NOW), "America/Sao_Paulo")
+    assert "timeMin=2025-06-12T15:00:00-03:00, timeMax=2025-06-12T15:30:00-03:00" in note
+
+
+def test_each_alternative_keeps_its_own_time(resolver):
+    monday = at(9, 9)
+    assert spans(resolver.resolve("pode ser terça às 11h ou quarta às 14h", now=monday)) == [
+        (at(10, 11), at(10, 11, 30), True),
+        (at(11, 14), at(11, 14, 30), True),
+    ]
+
+
+def test_alternatives_separated_by_commas(resolver):
+    assert spans(resolver.resolve("amanhã às 9h, sexta às 16h", now=NOW)) == [
+        (at(12, 9), at(12, 9, 30), True),
+        (at(13, 16), at(13, 16, 30), True),
+    ]
+
+
+def test_time_said_once_applies_to_every_day(resolver):
+    assert spans(resolver.resolve("amanhã ou sexta às 15h", now=NOW)) == [
+        (at(12, 15), at(12, 15, 30), True),
+        (at(13, 15), at(13, 15, 30), True),
+    ]
+
+
+def test_second_time_without_a_day_reuses_the_previous_day(resolver):
+    assert spans(resolver.resolve("amanhã às 10h ou às 15h", now=NOW)) == [
+        (at(12, 10), at(12, 10, 30), True),
+        (at(12, 15), at(12, 15, 30), True),
+    ]
+
+
+def test_next_week_said_once_applies_to_every_weekday(resolver):
+    ranges = resolver.resolve("quinta ou sexta da semana que vem", now=NOW)
+    assert [r.start.date() for r in ranges] == [datetime.date(2025, 6, 19), datetime.date(2025, 6, 20)]
+
+
+def test_invalid_dd_mm_date_is_not_read_as_day_of_month(resolver):
+    assert resolver.resolve("dia 30/02", now=NOW) == []
+
+
+def test_day_of_month_with_dd_mm_date_is_that_date_only(resolver):
+    assert spans(resolver.resolve("dia 17/07 às 10h", now=NOW)) == [(at(17, 10, month=7), at(17, 10, 30, month=7), True)]
@@ -0,0 +1,10 @@
+from tenants import DEFAULT_TENANT, session_key
+
+
+def test_session_keys_are_always_prefixed():
+    assert session_key(DEFAULT_TENANT, "abc") == "default:abc"
+    assert session_key("acme", "abc") == "acme:abc"
+
+
+def test_default_tenant_ids_cannot_name_another_tenants_session():
+    assert session_key(DEFAULT_TENANT, "acme:abc") != session_key("acme", "abc")